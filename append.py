@@ -14,9 +14,23 @@ Created on Fri Oct 17 18:13:18 2025
 
 # ライブラリのインポート
 import os # オペレーティングシステムレベルの機能、特にファイルパス操作のために利用
+import argparse # コマンドライン引数（--force, --from-stage など）の解釈
 import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
-import glob # 指定されたパターンにマッチするファイルパスリストを取得（データ統合に利用）
-from difflib import SequenceMatcher # **文字列類似度計算アルゴリズム (Ratcliff/Obershelpアルゴリズム)** を利用
+import storage # 中間データの列指向形式（Parquet / Arrow IPC）での保存・読み込み
+from utils import rdel, rep # 行の除外・文字列置換の汎用関数
+from ingest import ingest_all # 都道府県単位の下処理（プロセスプールによる並列処理）
+from pipeline import Stage, Context, run # 名前のついた段階の実行と、段階ごとの出力の保存
+from normalize import normalize, SUBJECT, SUBJECT_LIST, SUBJECT_NAME, COUNT, POST, WIDTH # 文字列カラムの値を連結した文字列に対する正規化
+from wareki import parse as parse_wareki # 和暦の日付文字列を西暦の年・月・日に一括変換
+from similarity import subject_dummies # 診療科目の類似度行列を一括計算し、ダミー変数を作成する
+from match_cache import MatchCache # 診療科目の分類結果をディスク上にキャッシュする
+from schema import apply as apply_schema, memory_report, summary as memory_summary # 最終データセットの型の定義とメモリ使用量の報告
+from beds import extract as bed_counts # 病床種別ごとの病床数の抽出
+from municipality import assign as assign_city_code # 住所への市区町村コードの付与
+from cube import update_month as update_cube # 都道府県・市区町村ごとの集計表の作成
+from specialty import CREF, TYPE_FLAGS, TYPE_FLAG_COLUMNS # 診療科区分（63科目）のリファレンス辞書と施設種別フラグ
+from keywords import KeywordMatcher # 理由情報・施設種別のキーワードの一括照合
+from sinks import SINKS, write as write_sinks # 最終データセットの出力形式ごとの分割書き出し
 
 # 外部化された設定変数
 # データパイプラインの再現性と保守性を確保するため、パラメータを一元管理する
@@ -29,283 +43,121 @@ DATA_MONTH = 'r0512'
 # データソースと処理結果の格納場所を絶対パスで定義
 BASE_DIR = f'/Users/tkurihara/Desktop/v.1.0.0/{WORKDIR_NAME}'
 
-# 作業ディレクトリの変更
-try:
-    # 処理中の相対パス参照を確実にするためのカレントディレクトリ設定
-    os.chdir(BASE_DIR)
-    print(f"作業ディレクトリ: {os.getcwd()}")
-except FileNotFoundError:
-    # 処理の続行可能性を判断し、エラーログを出力
-    print(f"エラー: 指定されたディレクトリ '{BASE_DIR}' が見つかりません。パスを確認してください。")
-    # 処理を続行できない場合は exit() などで停止する
-
-# --- 派生パスの定義 ---
-# os.path.joinを使用して、BASE_DIRと後続のディレクトリを安全に結合
-# --------------------------------------------------------------------------------------
-RAW_DIR = os.path.join(DATA_MONTH + 'raw')
-PROC_DIR = DATA_MONTH
-MERGE_DIR = DATA_MONTH + 'merge'
-# 中間および最終的な統合データセットのファイルパス
-TOTAL_FILE = os.path.join(MERGE_DIR, 'total.xlsx')
-TOTAL2_FILE = os.path.join(MERGE_DIR, 'total2.xlsx')
-# ジオコーディング処理に用いる外部連携ファイルのパス
-ADDRESS_CSV = os.path.join(MERGE_DIR, 'address.csv')
-ADDRESS_OUT_CSV = os.path.join(MERGE_DIR, 'address_out.csv')
-# --------------------------------------------------------------------------------------
-
-
-#汎用関数
-# 縦方向のデータ繰り越し処理（特に、ヘッダ行を持たない非定型データ構造からの情報抽出に必須）
-def move(n,x,m,v1,v2,w):
-    # データフレーム内の隣接する行間（row_num: m）で同一の"id"を共有し、
-    # ターゲットカラム（v1）がプレースホルダ（"*"）である場合に、
-    # ソースカラム（v2）のデータを繰り越す処理。
-    for i in range(0,n):
-        if x.at[i+m,"id"] == x.at[i,"id"] and x.at[i,v1] == "*" and w in x.at[i+m,v2]:
-            x.at[i, v1] = x.at[i+m,v2]
-            
-# 特定の条件（w）を満たす行をデータセットから除外
-def rdel(x,v,w):
-    x.drop(x[x[v].str.contains(w)].index, inplace = True)
-
-# 文字列置換の汎用化
-def rep(x,var,w1,w2):
-    x[var] = x[var].str.replace(w1, w2)
-
-
-# --- データ前処理のための初期設定 ---
-# データの読み込み時にスキップする行数（ヘッダ・メタデータ行の排除）
-pre0 = [i for i in range(0,11)]
-# データフレームの初期カラム名（主要属性）
-pre1 = [
-        "id", 
-        "code", 
-        "name", 
-        "address", 
-        "tell", 
-        "establisher", 
-        "owner", 
-        "register", 
-        "category", 
-        "type" 
-        ]
-# 繰り越し処理により値を格納するためのターゲットカラム（補助属性）
-pre2 = [
-        "type1",
-        "type2",
-        "type3",
-        "type4",
-        "n_tenu", 
-        "n_tenu_dr", 
-        "n_tenu_den", 
-        "n_ntenu", 
-        "n_ntenu_dr", 
-        "n_ntenu_den",
-        "reason", 
-        "start",
-        'c1',
-        'c2',
-        'c3',
-        'c4',
-        'c5',
-        'c6',
-        'c7'
-        ]
-
+# 診療科目の類似度判定基準
+# 'ratcliff': SequenceMatcher（Ratcliff/Obershelpアルゴリズム）、'jaccard': 文字単位のJaccard類似度指数
+SIMILARITY_METHOD = 'ratcliff'
+
+# 和暦日付の元号の境界の扱い
+# False: 元号の終了後の日付（例: 平成31年5月1日）も西暦に換算、True: 元号の期間外の日付を欠損値とする
+WAREKI_STRICT = False
+
+# 中間データの保存形式（'parquet' または 'feather'（Arrow IPC））
+# 中間データは型を保持したまま列指向形式で保存し、Excelは最終出力（total2.xlsx）のみとする
+INTERMEDIATE_FORMAT = 'parquet'
+
+# 都道府県データの読み込みに用いるプロセス数（None: CPUコア数、1: 並列化せず逐次処理）
+INGEST_WORKERS = None
+
+# 地方局のエクセルファイルの読み込みエンジン（readers.py）
+# 'auto': 利用可能なもののうち最も速いもの（calamine > openpyxl_stream > openpyxl）
+# 'calamine': python-calamine による読み込み、'openpyxl_stream': openpyxl の read_only モード、'openpyxl': 従来の読み込み
+EXCEL_ENGINE = 'auto'
+
+# 元ファイルの内容と前処理の設定が前回から変わっていない都道府県も再処理するか
+# False の場合、変更のない都道府県は前回の中間ファイルを再利用する（コマンドラインでは --force で True）
+FORCE = False
+
+# 市区町村コード（全国地方公共団体コード）の表（BASE_DIR直下、総務省のExcelファイルまたはCSV、municipality.py を参照）
+# 表がない場合、または None とした場合は市区町村コード（city_code）を付与しない
+MUNICIPALITY_FILE = 'municipality_codes.xlsx'
+
+# 都道府県・市区町村 × 施設の種類ごとの集計表の出力先（BASE_DIR直下、データ月で分割して保存、cube.py を参照）
+# None とすると集計表を作成しない
+CUBE_DIR = 'cube'
+
+# 診療科目の分類結果のキャッシュ（データ月をまたいで共有するため、BASE_DIR直下に置く）
+# None とするとキャッシュを使わずに毎回すべての科目文字列を計算する
+MATCH_CACHE = 'match_cache.sqlite'
+
+# 最終データセット（total2）の出力形式（sinks.py、コマンドラインでは --formats）
+# 'xlsx': Excel（1シートの最大行数を超える場合は次のシートに続ける）、'csv.gz': gzip圧縮CSV、'parquet': Parquet
+# total2.parquet（INTERMEDIATE_FORMAT が 'parquet' の場合）は段階の出力として常に保存される
+TOTAL2_FORMATS = ['xlsx']
+# 最終データセットを変換して書き出す1回あたりの行数
+OUTPUT_CHUNKSIZE = 50_000
+
+# プロファイルを取る段階（例: 'specialties'、None: 取らない、コマンドラインでは --profile）
+# 結果は MERGE_DIR/profile/{段階名}.prof と .txt（PROFILER = 'pyinstrument' の場合は .html、要インストール）
+# 段階ごとの処理時間・最大メモリ使用量・行数・除外した行数は、指定にかかわらず MERGE_DIR/run_report.csv と run_report.jsonl に追記される
+PROFILE_STAGE = None
+PROFILER = 'cprofile'
+
+
+# 段階の関数に渡す設定（pipeline.Context の属性として参照する）
+# スクリプトとして実行した場合のコマンドライン引数による変更も反映するため、呼び出し時の値を返す
+def settings():
+    return {
+        "workers": INGEST_WORKERS,
+        "engine": EXCEL_ENGINE,
+        "force": FORCE,
+        "wareki_strict": WAREKI_STRICT,
+        "similarity_method": SIMILARITY_METHOD,
+        "municipality_file": MUNICIPALITY_FILE,
+        "cube_dir": CUBE_DIR,
+        "match_cache": MATCH_CACHE,
+        "total2_formats": TOTAL2_FORMATS,
+        "output_chunksize": OUTPUT_CHUNKSIZE,
+    }
 
-# --- 各都道府県データの下処理 out df1 ---
-# データ前処理済みファイルを格納するためのディレクトリを再帰的に作成
-os.makedirs(PROC_DIR, exist_ok=True)
 
-
-for m in range(1,49):
-    try:
-        df1 = pd.read_excel(
-        f"{RAW_DIR}/{m}.xlsx", 
-        skiprows = pre0, 
-        header = None,
-        names = pre1
-        )
-    except FileNotFoundError:
-        # ファイルが存在しない場合（例: 存在しない都道府県番号）は処理をスキップ
-        continue
-    k=len(df1)
-    for i in pre2:
-        df1[i] = "*"
-    # 欠損値の補完：同一id内での情報欠落を前方の非欠損値で埋める（FFILL: Forward Fill）
-    df1.fillna(method="ffill", inplace = True)
-    # 総合病院 -> 総合
-    rep(df1,"type","総合病院", "総合")
-    # move関数を用いた縦方向データ繰り越し処理のパラメータ設定
-    move_params = [
-        (k-1, 1, "n_tenu", "tell", "常"), 
-        (k-2, 2, "n_tenu_dr", "tell", "医"),
-        (k-3, 3, "n_tenu_den", "tell", "歯"), 
-        (k-4, 4, "n_ntenu", "tell", "非"),
-        (k-5, 5, "n_ntenu_dr", "tell", "医"), 
-        (k-6, 6, "n_ntenu_den", "tell", "歯"),
-        (k-1, 1, "reason", "register", ""), 
-        (k-1, 1, "start", "reason", ""),
-        (k-1, 1, "type1", "type", ""), 
-        (k-2, 2, "type2", "type", ""),
-        (k-3, 3, "type3", "type", ""), 
-        (k-4, 4, "type4", "type", ""),
-        (k,   0, "c1", "category", ""), 
-        (k-1, 1, "c2", "category", ""),
-        (k-2, 2, "c3", "category", ""), 
-        (k-3, 3, "c4", "category", ""),
-        (k-4, 4, "c5", "category", ""), 
-        (k-5, 5, "c6", "category", ""),
-        (k-6, 6, "c7", "category", "")
-        ]
-    # 定義されたパラメータに基づく繰り越し関数 move() の実行
-    for idx, row_num, target_col, src_col, val in move_params:
-        move(idx, df1, row_num, target_col, src_col, val)
-    # 無効なステータスを持つ行を除外
-    for i in ["現存","休止"]:
-        rdel(df1,"type",i)
-    # 不必要な情報を含む行を除外
-    rdel(df1,"tell","常")
-    # 都道府県コードの整合性確保（コード48は北海道の重複を回避するための暫定措置と推測）
-    df1["pref"] = m if m < 48 else 1
-    # 前処理済みデータセットを中間ファイルとして保存
-    df1.to_excel(f'{PROC_DIR}/{DATA_MONTH}_{m}.xlsx', index=False)
-
-
-# --- データのマージ＆編集 out df2 ---
-# 統合済みデータセットを格納するディレクトリを作成
-os.makedirs(MERGE_DIR, exist_ok=True)
-
-# 全都道府県の前処理済みファイルを収集
-files = glob.glob(f'{PROC_DIR}/*.xlsx')
-data_list = []
-for i in files:
-    data_list.append(pd.read_excel(i))
-
-# 垂直方向へのデータ結合（全都道府県データの統合）
-df2 = pd.concat(data_list, axis=0, sort=False)
-
-
-# 不要なメタデータカラムの削除と、ID及び住所に基づくソーティング
-df2.drop(columns=['Unnamed: 0','id', 'tell'], inplace = True, errors='ignore')
-df2.sort_values(by = ["pref", "address"], inplace = True)
-df2["post"]=df2["address"] # 郵便番号抽出のための住所カラムの複製
-
-
-# 登録理由に関するデータクレンジング：一意なid識別のための不必要な変動要因を除外
-for i in ["その他","移動","新規","交代","移転","組織変更","開設者変","更新"]:
-    rdel(df2,"register",i)
-
-# 複数カラムに分散した診療科情報を単一の複合カラムに結合（データ集約）
-df2['c']=df2['c1'].astype(str)+'/'+df2['c2'].astype(str)+'/'+df2['c3'].astype(str)+'/'+df2['c4'].astype(str)+'/'+df2['c5'].astype(str)+'/'+df2['c6'].astype(str)+'/'+df2['c7'].astype(str)
-df2.drop(columns=['c1','c2', 'c3','c4','c5', 'c6', 'c7'], inplace = True)
-
-# 結合後の文字列処理
-rep_df2=[
-    ('\*', ''),
-    ('/*', ''),
-    ('　', '/'), # 全角スペースをセパレータ（/）に統一
-    ('//', '/'), # 重複するセパレータを単一化
-    (' ', '') # 半角スペースの除去
-    ]
-
-for old, new in rep_df2:
-    rep(df2,'c',old, new)
-
-# 病床数情報（例: :1, :2）を区別するためのフォーマット変換
-for i in range(1,10):
-    rep(df2,'c','/{0}'.format(i),':{0}'.format(i))
-
-# 和暦の日付フィールド（登録日、開設日）の標準化
-for i in ['register','start']:
-    rep(df2,i," ","")
-    rep(df2,i,"　","")
-    rep(df2,i,"\t","")
-    rep(df2,i,' ', '')
-    rep(df2,i,'元', '1') # 和暦元号初年を表す「元」を「1」に置換
-    rep(df2,i,'令', '令.') # 和暦元号の文字と年数の間に区切り文字を挿入
-    rep(df2,i,'平', '平.')
-    rep(df2,i,'昭', '昭.')
-    # 日付のゼロパディング（例: .1. -> .01.）
-    for j in range(1,10):
-        rep(df2,i,'.{0}.'.format(j),'.0{0}.'.format(j))
-        rep(df2,i,'.{0}.'.format(j),'.0{0}.'.format(j))
-    rep(df2,i,'.', '')
-
-# 西暦変換と年月日の分割
-for i in ["register_year", "register_month", "register_day","start_year", "start_month", "start_day"]:
-    df2[i]=0
-
-df2 = df2.reset_index(drop=True)
-
-for i in ['register', 'start']:
-    for k in range(len(df2)):
-        if "昭" in df2[i][k]:
-            df2[f"{i}_year"][k] = 1925 + int(df2[i][k][1:3])
-        elif "平" in df2[i][k]:
-            df2[f"{i}_year"][k] = 1988 + int(df2[i][k][1:3])
-        elif "令" in df2[i][k]:
-            df2[f"{i}_year"][k] = 2018 + int(df2[i][k][1:3])
-        df2[f"{i}_month"][k] = int(df2[i][k][3:5])
-        df2[f"{i}_day"][k] = int(df2[i][k][5:])
-        
-
-# 施設種別情報を単一の複合カラムに結合
-df2["type_status"]=df2["type"].astype(str)+'/'+df2["type1"].astype(str)+'/'+df2["type2"].astype(str)+'/'+df2["type3"].astype(str)+'/'+df2["type4"].astype(str)
-df2.drop(columns=["type","type1","type2","type3", "type4"], inplace = True)
-rep(df2,'type_status','/*', '')
-
-# 和暦（昭, 平, 令）を含む理由フィールドをプレースホルダ（'0'）に設定（日付フィールドとの競合回避）
-wareki = ['昭', '平', '令']
-r_check = df2['reason'].astype(str).str.contains('|'.join(wareki), na=False) 
-df2.loc[r_check, 'reason'] = '0' 
-
-# 理由情報を複数のダミー変数カラムに展開
-r_var = ["r_other","r_move","r_new","r_exch", "r_org", "r_estach","r_update"]
-
-for i in r_var:
-    df2[i]=df2["reason"]
-
-# 新しい一意のエンティティIDを連番で割り当て
-df2['id'] = range(1, len(df2.index) + 1)
-
-# カラム順序の再定義（データセットの構造化）
-df2 = df2[[
-    'id',
-    'pref',
-    'code',
-    'post',
-    'address',
-    "name",
-    "establisher",
-    "owner",
-    "register",
-    "start",
-    "register_year", 
-    "register_month", 
-    "register_day",
-    "start_year", 
-    "start_month", 
-    "start_day",
-    "type_status",
-    "n_tenu",
-    "n_tenu_dr",
-    "n_tenu_den",
-    "n_ntenu",
-    "n_ntenu_dr",
-    "n_ntenu_den",
-    "r_other",
-    "r_move",
-    "r_new",
-    "r_exch",
-    "r_org",
-    "r_estach",
-    "r_update",
-    'c'
-    ]]
-
-# 常勤・非常勤医師/歯科医師数カラムのクレンジングと数値化準備
-cols = [
+# ==============================================================================
+# 2. データ処理の段階（pipeline.py の Stage として実行する）
+# ==============================================================================
+# 各段階は前の段階の出力（df）を受け取り、自身の出力を返す。出力は pipeline.run() が中間ファイルとして保存する
+
+# --- 各都道府県データの下処理（ingest） out df1 ---
+# 都道府県ファイルごとの読み込み・縦方向の繰り越し・不要行の除外をプロセスプールで並列に実行（ingest.py）
+# 下処理済みのデータはファイル番号順に返され、処理に失敗したファイルは報告のうえ除外される
+# 同じデータを再開用の中間ファイル（PROC_DIR/{DATA_MONTH}_{n}.parquet など）としても保存する
+# 元ファイルと設定のハッシュ値を台帳（PROC_DIR/manifest.json）に記録し、変更のない都道府県は中間ファイルを再利用する
+def ingest(ctx, df):
+    data_list = ingest_all(ctx.raw_dir, ctx.proc_dir, ctx.month, workers=ctx.workers, fmt=ctx.fmt, force=ctx.force, engine=ctx.engine)
+    return pd.concat(data_list, axis=0, sort=False, ignore_index=True)
+
+
+# --- データのマージ（merge） out df2 ---
+def merge(ctx, df2):
+    # 統合済みデータセットを格納するディレクトリを作成
+    os.makedirs(ctx.merge_dir, exist_ok=True)
+
+    # 不要なメタデータカラムの削除と、ID及び住所に基づくソーティング
+    df2 = df2.drop(columns=['Unnamed: 0','id', 'tell'], errors='ignore')
+    df2.sort_values(by = ["pref", "address"], inplace = True)
+    # 行の除外は位置に基づいて行う（都道府県ごとのインデックスが重複したままだと、ほかの都道府県の同じ番号の行も除外される）
+    df2.reset_index(drop=True, inplace=True)
+    df2["post"]=df2["address"] # 郵便番号抽出のための住所カラムの複製
+
+    # 登録理由に関するデータクレンジング：一意なid識別のための不必要な変動要因を除外
+    for i in ["その他","移動","新規","交代","移転","組織変更","開設者変","更新"]:
+        rdel(df2,"register",i)
+    df2 = df2.reset_index(drop=True)
+
+    # 複数カラムに分散した診療科情報を単一の複合カラムに結合（データ集約）
+    df2['c']=df2['c1'].astype(str)+'/'+df2['c2'].astype(str)+'/'+df2['c3'].astype(str)+'/'+df2['c4'].astype(str)+'/'+df2['c5'].astype(str)+'/'+df2['c6'].astype(str)+'/'+df2['c7'].astype(str)
+    df2.drop(columns=['c1','c2', 'c3','c4','c5', 'c6', 'c7'], inplace = True)
+
+    # 施設種別情報を単一の複合カラムに結合
+    df2["type_status"]=df2["type"].astype(str)+'/'+df2["type1"].astype(str)+'/'+df2["type2"].astype(str)+'/'+df2["type3"].astype(str)+'/'+df2["type4"].astype(str)
+    df2.drop(columns=["type","type1","type2","type3", "type4"], inplace = True)
+    rep(df2,'type_status','/*', '')
+
+    # 新しい一意のエンティティIDを連番で割り当て
+    df2['id'] = range(1, len(df2.index) + 1)
+    return df2
+
+
+# 常勤・非常勤医師/歯科医師数カラム
+DOCTOR_COLS = [
         "n_tenu", 
         "n_tenu_dr", 
         "n_tenu_den", 
@@ -313,24 +165,48 @@ cols = [
         "n_ntenu_dr", 
         "n_ntenu_den"
         ]
-replace_pairs = [
-    ('　',''), 
-    (' ',''),
-    ('常勤',''), 
-    ('非',''), 
-    ('医',''), 
-    ('歯',''),
-    ('(',''), 
-    (')',''), 
-    (':',''),
-    ('*','0') # 欠損値をゼロ（0）として扱う
-]
 
-for col in cols:
-    for old, new in replace_pairs:
-        rep(df2, col, old, new)
-
-# 理由情報をバイナリダミー変数に変換するためのマッピング辞書
+# --- 文字列の正規化（normalize） ---
+def normalize_text(ctx, df2):
+    # 結合後の文字列処理（normalize.py）
+    # プレースホルダ（*）の除去、全角スペースのセパレータ化、重複セパレータの単一化、半角スペースの除去（以前と同じ順序）、
+    # 全角・半角の統一、病床数情報（例: /52 -> :52）の区別を、カラムの値を連結した1つの文字列に対して行う
+    df2['c'] = normalize(df2['c'], SUBJECT)
+
+    # 常勤・非常勤医師/歯科医師数カラムのクレンジングと数値化
+    # 人数以外の文字を除去し、欠損値（*）をゼロ（0）として扱う（全角数字・全角括弧も統一）
+    for col in DOCTOR_COLS:
+        df2[col] = normalize(df2[col], COUNT)
+        # 医師数/歯科医師数カラムを数値型に変換（分析のためのデータ型最終調整）
+        df2[col] = pd.to_numeric(df2[col], errors='coerce').fillna(0).astype(int)
+
+    # 住所情報の構造化：郵便番号と住所文字列の分離
+    df2['post'] = df2['post'].str[1:9] # 郵便番号部分（9桁目まで）を抽出
+    df2['address'] = df2['address'].str[9:] # 9桁目以降を住所として抽出
+
+    # 郵便番号の区切り文字と全角数字の標準化
+    df2['post'] = normalize(df2['post'], POST)
+
+    # 複合カラム内の各要素を重複のないリストに変換（一意な属性の集合として扱い、列指向形式ではリスト型として保存）
+    df2['c'] = df2['c'].apply(lambda s: list(dict.fromkeys(x.strip() for x in str(s).split('/'))))
+    df2['type_status'] = df2['type_status'].apply(lambda s: list(dict.fromkeys(x.strip() for x in str(s).split('/'))))
+    return df2
+
+
+# --- 和暦の日付の変換（dates） ---
+# 和暦の日付フィールド（登録日、開設日）の西暦変換と年月日の分割（wareki.py）
+# 元号テーブル（大正・昭和・平成・令和、元年を含む）に基づき、正規表現1回で年・月・日を抽出する
+# 解釈できない日付の年・月・日は欠損値（<NA>）となる
+def dates(ctx, df2):
+    for i in ['register', 'start']:
+        parsed = parse_wareki(df2[i], strict=ctx.wareki_strict)
+        df2[i] = parsed['text']
+        for j in ['year', 'month', 'day']:
+            df2[f"{i}_{j}"] = parsed[j]
+    return df2
+
+
+# 理由情報をバイナリダミー変数に変換するためのマッピング辞書（ダミー変数のカラム名: キーワード）
 rep_dict = {
     "r_other":  ["その他"], 
     "r_move":   ["移動","移転","所在地変","所変"],
@@ -341,88 +217,68 @@ rep_dict = {
     "r_update": ["更新"]
 }
 
-# 対象となる理由フラグを「1」に設定
-for col, values in rep_dict.items():
-    for val in values:
-        rep(df2, col, val, "1")
-
-# 理由情報に含まれるすべてのカテゴリリスト（網羅性の確保）
-r_list = [
-    "その他",
-    "移動",
-    "移転",
-    "所在地変",
-    "所変",
-    "新規",
-    "交代",
-    "継承", 
-    "組織変更",
-    "開設者変更",
-    "開設者変",
-    "開変",
-    "開設変更",
-    "更新"
-    ]
-
-# 対象外の理由フラグを「0」に設定（排他的なダミー変数作成）
-rep_settings = {
-    "r_other":  {"除外": ["その他"]}, 
-    "r_move":   {"除外": ["移動","移転","所在地変","所変"]},
-    "r_new":    {"除外": ["新規"]}, 
-    "r_exch":   {"除外": ["交代","継承"]},
-    "r_org":    {"除外": ["組織変更"]}, 
-    "r_estach": {"除外": ["開設者変","開設者変更","開変","開設変更"]},
-    "r_update": {"除外": ["更新"]}
-}
-
-for col, params in rep_settings.items():
-    exclude = set(params["除外"])
-    # r_listから除外リストにない要素を選び出し、'0'に置換
-    for i in sorted(set(r_list) - exclude, key=r_list.index):
-        rep(df2, col, i, "0")
-
-# 理由ダミー変数カラムを最終的に数値型（整数）に変換
-for col, params in rep_settings.items():
-    # 非数値データはNaNに変換し、NaNを0で補完（欠損データの一貫性確保）
-    df2[col] = pd.to_numeric(df2[col], errors='coerce').fillna(0).astype(int)
-
-# 住所情報の構造化：郵便番号と住所文字列の分離
-df2['post'] = df2['post'].str[1:9] # 郵便番号部分（9桁目まで）を抽出
-df2['address'] = df2['address'].str[9:] # 9桁目以降を住所として抽出
-
-# 郵便番号の区切り文字の標準化
-rep(df2,"post","ー", "-")
-
-# 複合カラム内の各要素をセット型（Set）に変換（順序を問わない一意な属性の集合として扱う）
-df2['c'] = df2['c'].apply(lambda s: set(x.strip() for x in str(s).split('/')))
-df2['type_status'] = df2['type_status'].apply(lambda s: set(x.strip() for x in str(s).split('/')))
-
-# 施設種別フラグカラムの初期化
-for i in ["defunct", "yoryo", "clinic","hospital", "sougou", "locsup", "tokutei"]:
-    df2[i]=""
-
-# 施設種別フラグの定義
-flag_dict = {
-    "defunct":  "休止", 
-    "yoryo":    "療養病床", 
-    "clinic":   "診療所",
-    "hospital": "病院", 
-    "sougou":   "総合", 
-    "locsup":   "地域支援",
-    "tokutei":  "特定機能"
-}
-
-# 施設種別フラグの作成（apply()による非効率なループ処理）
-# 各エンティティの type_status がキーワードを含むかを判定し、バイナリフラグを立てる
-for col, keyword in flag_dict.items():
-    df2[col] = df2["type_status"].apply(lambda s: 1 if keyword in s else 0)
-
-# 医師数/歯科医師数カラムを数値型に変換（分析のためのデータ型最終調整）
-for col in cols:
-    df2[col] = pd.to_numeric(df2[col], errors='coerce').fillna(0).astype(int)
+# 理由情報・施設種別のキーワードの照合器（keywords.py）
+# 理由はキーワードを含む場合（複数のキーワードを含む場合はそれぞれのダミー変数）、
+# 施設種別は type_status の要素のいずれかがキーワードと一致する場合に1とする
+REASON_MATCHER = KeywordMatcher(rep_dict)
+TYPE_MATCHER = KeywordMatcher({col: [keyword] for col, keyword in TYPE_FLAGS.items()}, whole=True)
+
+# --- 届出事由・施設種別のフラグ（flags） ---
+# 出力は中間統合データセット（TOTAL_FILE）として保存する
+def flags(ctx, df2):
+    # 和暦（昭, 平, 令）を含む理由フィールドをプレースホルダ（'0'）に設定（日付フィールドとの競合回避）
+    wareki = ['昭', '平', '令']
+    r_check = df2['reason'].astype(str).str.contains('|'.join(wareki), na=False) 
+    df2.loc[r_check, 'reason'] = '0' 
+
+    # 理由情報を複数のダミー変数カラムに展開
+    # 1つの正規表現で理由の重複のない値を1回走査し、7つのダミー変数（0/1）を一括で作成する
+    reasons = REASON_MATCHER.frame(df2["reason"], dtype=int)
+    for col in reasons.columns:
+        df2[col] = reasons[col]
+
+    # 施設種別フラグの作成（施設種別フラグの定義は specialty.py で共有）
+    # 各エンティティの type_status の要素がキーワードと一致するかを、重複のない type_status ごとに1回だけ判定する
+    types = TYPE_MATCHER.frame(df2["type_status"], dtype=int)
+    for col in TYPE_FLAG_COLUMNS:
+        df2[col] = types[col]
+
+    # カラム順序の再定義（データセットの構造化）
+    df2 = df2[[
+        'id',
+        'pref',
+        'code',
+        'post',
+        'address',
+        "name",
+        "establisher",
+        "owner",
+        "register",
+        "start",
+        "register_year", 
+        "register_month", 
+        "register_day",
+        "start_year", 
+        "start_month", 
+        "start_day",
+        "type_status",
+        "n_tenu",
+        "n_tenu_dr",
+        "n_tenu_den",
+        "n_ntenu",
+        "n_ntenu_dr",
+        "n_ntenu_den",
+        "r_other",
+        "r_move",
+        "r_new",
+        "r_exch",
+        "r_org",
+        "r_estach",
+        "r_update",
+        'c'
+        ] + TYPE_FLAG_COLUMNS]
+    return df2
 
-# 中間統合データセットの保存（次の処理ステップへの入力）
-df2.to_excel(TOTAL_FILE, index=False)
 
 # ------------------------------------------------------------------------------
 
@@ -430,189 +286,40 @@ df2.to_excel(TOTAL_FILE, index=False)
 
 # ------------------------------------------------------------------------------
 
-df3 = pd.read_excel(TOTAL_FILE)
-
-# df8の'c'（診療科複合カラム）を明示的に文字列型に変換
-df3['c'] = df3['c'].astype(str)
-
-# 診療科情報文字列のサニタイズ（全角・半角統一、区切り文字統一、不要文字除去）
-replace_pairs = [
-    ('{',''), 
-    ('}',''), 
-    (" ", ""), 
-    ("'", ""),
-    ("、", ","), 
-    ("・", ","), 
-    ("/", ","),
-    ("０","0"), 
-    ("１","1"), 
-    ("２","2"), 
-    ("３","3"), 
-    ("４","4"),
-    ("５","5"), 
-    ("６","6"), 
-    ("７","7"), 
-    ("８","8"), 
-    ("９","9")
-]
+# --- 診療科目の分類（specialties） out df3 ---
+def specialties(ctx, df3):
+    # 'c'（診療科のリスト）をカンマ区切りの文字列に変換
+    df3['c'] = df3['c'].str.join(',')
 
-for old, new in replace_pairs:
-    rep(df3, 'c', old, new)
-    
-# 病床数を含む「科目名:数字」のパターンの抽出
-# 正規表現 r'[^,]+:\d+' により、カンマ区切りでコロンと数字を含む部分（例: 一般:52）を抽出
-df3["bed"] = df3["c"].str.findall(r'[^,]+:\d+')
-# 数字のみの抽出（病床数の集計に利用）
-df3["n_bed"] = df3["c"].str.findall(r'[0-9]+')
-
-# 抽出された病床数リストの合計値を計算するカスタム関数
-def sum_bed(x):
-    try:
-        if x is None:
-            return 0
-        # リスト内包表記とisdigit()による要素検証を経て、リスト内の文字列数字を合計（ロバストな集計）
-        return sum(int(i) for i in x if i.strip().isdigit())
-    except Exception:
-        # エラー発生時はゼロ（0）を返す
-        return 0
-
-# sum_bed関数を適用し、病床数の合計を算出（apply()による非効率なループ処理）
-df3['n_bed_sum'] = df3['n_bed'].apply(sum_bed)
-
-# 診療科名から数字とコロンを削除（純粋な科目名抽出のためのクレンジング）
-reppairs = [
-    (":",""),
-    ("0",""), 
-    ("1",""), 
-    ("2",""), 
-    ("3",""), 
-    ("4",""),
-    ("5",""), 
-    ("6",""), 
-    ("7",""), 
-    ("8",""), 
-    ("9",""),
-]
+    # 診療科情報文字列のサニタイズ（全角・半角統一、区切り文字統一、不要文字除去）
+    df3['c'] = normalize(df3['c'], SUBJECT_LIST)
 
-for old, new in reppairs:
-    rep(df3, 'c', old, new)
-
-# 診療科区分（リファレンス辞書）
-cref = {
-    1: ["internalmedicine", "内科"], 
-    2: ["psychosomaticmedicine", "心療内科"], 
-    3: ["psychiatry", "精神科"], 
-    4: ["neurology", "神経科"], 
-    5: ["pulmonology", "呼吸器科"], 
-    6: ["gastroenterology", "消化器科"], 
-    7: ["cardiology", "循環器科"], 
-    8: ["allergy", "アレルギー科"], 
-    9: ["rheumatology", "リウマチ科"], 
-    10: ["pediatrics", "小児科"], 
-    11: ["surgery", "外科"], 
-    12: ["orthopedicsurgery", "整形外科"], 
-    13: ["plasticsurgery", "形成外科"], 
-    14: ["cosmeticsurgery", "美容外科"], 
-    15: ["neurosurgery", "脳神経外科"], 
-    16: ["thoracicsurgery", "呼吸器外科"], 
-    17: ["cardiovasculursurgery", "心臓血管外科"], 
-    18: ["pediatricsurgery", "小児外科"], 
-    19: ["dermatologyurology", "皮膚泌尿器科"], 
-    20: ["venereology", "性病科"], 
-    21: ["colorectalsurgery", "肛門科"], 
-    22: ["obstetricsgynecology", "産婦人科"], 
-    23: ["ophthalmology", "眼科"], 
-    24: ["otorhinolaryngology", "耳鼻咽喉科"], 
-    25: ["esophagogastricsurgery", "気管食道科"], 
-    26: ["rehabilitation", "ﾘﾊﾋﾞﾘﾃｰｼｮﾝ科"], 
-    27: ["radiology", "放射線科"], 
-    28: ["neurologyinternal", "神経内科"], 
-    29: ["gastroenterologyinternal", "胃腸科"], 
-    30: ["dermatology", "皮膚科"], 
-    31: ["urology", "泌尿器科"], 
-    32: ["obstetrics", "産科"], 
-    33: ["gynecology", "婦人科"], 
-    34: ["pulmonologyinternal", "呼吸器内科"], 
-    35: ["cardiologyinternal", "循環器内科"], 
-    36: ["dentistry", "歯科"], 
-    37: ["orthodontics", "歯科矯正科"], 
-    38: ["pedodontics", "小児歯科"], 
-    39: ["oralmaxillofacialsurgery", "歯科口腔外科"], 
-    40: ["diabetology", "糖尿病科"], 
-    41: ["nephrology", "腎臓内科"], 
-    42: ["renaltransplantation", "腎移植科"], 
-    43: ["hemodialysis", "血液透析科"], 
-    44: ["metabolism", "代謝内科"], 
-    45: ["endocrinology", "内分泌内科"], 
-    46: ["emergencymedicine", "救急医学科"], 
-    47: ["hematology", "血液科"], 
-    48: ["hematologyinternal", "血液内科"], 
-    49: ["anesthesiology", "麻酔科"], 
-    50: ["gastroenterologyinternal2", "消化器内科"], 
-    51: ["gastrointestinalsurgery", "消化器外科"], 
-    52: ["hepatobilipancsurgery", "肝胆膵外科"], 
-    53: ["diabetologyinternal", "糖尿内科"], 
-    54: ["colorectalsurgeryinternal", "大腸肛門科"], 
-    55: ["ophthalmicplasticorbitalsurgery", "眼形成眼窩外科"], 
-    56: ["endocrinologyinfertility", "不妊内分泌科"], 
-    57: ["rheumatologycollagendisease", "膠原病ﾘｳﾏﾁ内科"], 
-    58: ["stroke", "脳卒中科"], 
-    59: ["oncology", "腫瘍治療科"], 
-    60: ["generalmedicine", "総合診療科"], 
-    61: ["breastthyroidsurgery", "乳腺甲状腺外科"], 
-    62: ["neonatology", "新生児科"], 
-    63: ["pediatriccardiology", "小児循環器科"]
-}
+    # 病床種別ごとの病床数と合計の抽出（beds.py）
+    # 「病床種別:病床数」（例: 一般:52）の要素を1回の正規表現の走査で取り出し、病床種別ごとのカラム（bed_ippan など）に集計する
+    # 病床種別のない数字は病床数として数えない
+    df3 = pd.concat([df3, bed_counts(df3['c'])], axis=1)
+
+    # 診療科名から数字とコロンを削除（純粋な科目名抽出のためのクレンジング）
+    df3['c'] = normalize(df3['c'], SUBJECT_NAME)
+
+    # 診療科区分（リファレンス辞書、specialty.py）
+    # リファレンス科目名にも診療科目と同じ全角・半角の統一を適用（例: ﾘﾊﾋﾞﾘﾃｰｼｮﾝ科 -> リハビリテーション科）
+    cref = {k: [v[0], WIDTH(v[1])] for k, v in CREF.items()}
+
+    # 類似度計算による診療科マッチングのメイン処理
+    # 自由回答の科目文字列を重複なく取り出し、63科目との類似度行列を一括で計算する。
+    # 最大スコアと同点の科目（複数可）のダミー変数を1とし、類似度が0の科目はどの科目にも分類しない
+    # キャッシュのキーには類似度判定基準とcrefのハッシュ値が含まれるため、どちらかを変更すると自動的に再計算される
+    cache = MatchCache(ctx.match_cache) if ctx.match_cache else None
+    dummies = subject_dummies(df3['c'], cref, method=ctx.similarity_method, cache=cache)
+    df3 = pd.concat([df3, dummies], axis=1)
+
+    # 診療科目キャッシュのヒット・ミス件数（重複を除いた科目文字列の件数）を報告
+    if cache is not None:
+        print(cache.report())
+        cache.close()
+    return df3
 
-for k, v in cref.items():
-    df3[v[0]] = 0
-
-# 類似度計算関数 SequenceMatcher
-# 文字列間の類似度を浮動小数点数（0.0〜1.0）で定量化する
-def similar(a, b):
-    return SequenceMatcher(None, a, b).ratio()
-
-# 診療科文字列をカンマ区切りで安全に分割する関数（括弧内のカンマを無視するなどの高度な処理を暗示）
-def split_subjects(s):
-    s = str(s).replace('，', ',')
-    # 先頭のダミーカンマを除去してから分割
-    if s.startswith(','):
-        s = s[1:]
-    parts = [p.strip() for p in s.split(',') if p.strip()]
-    return parts
-
-# 類似度計算による診療科マッチングのメイン処理
-for i, row in df3.iterrows():
-    # cカラムからダミーカンマを除去して分割
-    subjects = split_subjects(row['c'])
-    for sub in subjects:
-        # 最大スコアを初期化
-        best_score = 0
-        # 最大スコアと同点だったキー（k）を格納するリスト
-        best_k_list = []
-        
-        for k, v in cref.items():
-            # 入力文字列とリファレンス診療科名との類似度を計算
-            score = similar(sub, v[1])
-            # (1) 新しいスコアが現在の最大スコアより大きい場合
-            if score > best_score:
-                best_score = score
-                # リストをリセットし、新しいベストキーを追加
-                best_k_list = [k]
-            # (2) 新しいスコアが現在の最大スコアと同点の場合（多重マッチの許容）
-            elif score == best_score and score > 0:
-                # リストに同点キーを追加
-                best_k_list.append(k)
-        # (3) 類似度が閾値（>0）を超え、該当するキーがある場合にフラグを立てる
-        if best_score > 0:
-            for best_k in best_k_list:
-                # 該当する診療科のバイナリフラグ（ダミー変数）を1に設定
-                df3.at[i, cref[best_k][0]] = 1
-
-#codeの整理と都道府県番号の付与
-rep(df3, 'code', ",", "")
-rep(df3, 'code', "-", "")
-df3['code'] = df3['pref'].astype(str) + df3['code'].fillna('')
 
 # 都道府県コードから正式名称へのマッピング辞書
 pref_dict = {
@@ -666,15 +373,97 @@ pref_dict = {
     48: "北海道"
 }
 
-# 住所カラムの正規化：都道府県コードを正式名称に変換し、住所文字列と結合
-df3['pref'] = df3['pref'].astype(int)
-df3['address'] = df3['pref'].map(pref_dict) + df3['address'].fillna('')
+# --- 最終データセットの出力（export） ---
+# 出力は gis.py が読み込む列指向形式の中間ファイル（TOTAL2_DATA）として保存する
+def export(ctx, df3):
+    #codeの整理と都道府県番号の付与
+    rep(df3, 'code', ",", "")
+    rep(df3, 'code', "-", "")
+    df3['code'] = df3['pref'].astype(str) + df3['code'].fillna('')
+
+    # 住所カラムの正規化：都道府県コードを正式名称に変換し、住所文字列と結合
+    df3['pref'] = df3['pref'].astype(int)
+    df3['address'] = df3['pref'].map(pref_dict) + df3['address'].fillna('')
+
+    # 市区町村コードの付与：市区町村名のトライ木による住所の先頭からの最長一致（政令指定都市の区・郡名を含む形にも対応）
+    if ctx.municipality_file and os.path.exists(ctx.municipality_file):
+        df3.insert(df3.columns.get_loc('address') + 1, 'city_code', assign_city_code(df3['address'], ctx.municipality_file))
+    elif ctx.municipality_file:
+        print(f"市区町村コードの表（{ctx.municipality_file}）が見つからないため、市区町村コードを付与しません")
+
+    # 出力の型（schema.py）を適用し、カラムごとのメモリ使用量の変化を記録する
+    before = df3
+    df3 = apply_schema(df3)
+    report = memory_report(before, df3)
+    report.to_csv(ctx.memory_report, encoding="utf-8-sig")
+    print(memory_summary(report))
+    del before
+
+    # 最終データセットの保存（TOTAL2_FORMATS の形式で OUTPUT_CHUNKSIZE 行ずつ書き出す、sinks.py）
+    # 列指向形式の中間ファイル（TOTAL2_DATA）は段階の出力として保存されるため、同じ形式は重ねて書き出さない
+    formats = [f for f in ctx.total2_formats if SINKS[f][0] != storage.FORMATS[ctx.fmt]]
+    write_sinks(df3, ctx.total2_data, formats, ctx.output_chunksize)
+
+    # 都道府県・市区町村 × 施設の種類ごとの集計表（医療機関数・診療科目・病床数・医師数の合計）をこのデータ月の分だけ置き換える
+    if ctx.cube_dir:
+        update_cube(ctx.month, df3, ctx.cube_dir)
+
+    #世界測地系の経度・緯度を出力するための準備（外部ジオコーディングAPI連携のインターフェース）
+    # ジオコーディングに必要なID、郵便番号、住所のサブセットを抽出
+    df4=df3[['id','post','address']]
+    # 外部サービスで利用するためのCSV形式で出力（BOM付きUTF-8エンコーディングを指定）
+    df4.to_csv(ctx.address_csv, index=False, header=False, encoding="utf-8-sig")
+    return df3
+
+
+# 段階の順序（それぞれの出力は前の段階の出力から作成する）
+STAGES = [
+    Stage("ingest", ingest, inputs=["raw_dir"]),
+    Stage("merge", merge),
+    Stage("normalize", normalize_text),
+    Stage("dates", dates),
+    Stage("flags", flags, checkpoint="total_file"),
+    Stage("specialties", specialties),
+    Stage("export", export, outputs=["total2_file", "memory_report", "address_csv"], checkpoint="total2_data"),
+]
 
-# 最終データセットを中間ファイルとして保存
-df3.to_excel(TOTAL2_FILE, index=False)
 
-#世界測地系の経度・緯度を出力するための準備（外部ジオコーディングAPI連携のインターフェース）
-# ジオコーディングに必要なID、郵便番号、住所のサブセットを抽出
-df4=df3[['id','post','address']]
-# 外部サービスで利用するためのCSV形式で出力（BOM付きUTF-8エンコーディングを指定）
-df4.to_csv(ADDRESS_CSV, index=False, header=False, encoding="utf-8-sig")
+# ==============================================================================
+# 3. データ処理（スクリプトとして実行された場合のみ）
+# ==============================================================================
+# 並列処理のワーカープロセスが本スクリプトを再読み込みしても、処理が重複して実行されないようにする
+if __name__ == '__main__':
+    # コマンドライン引数（Spyderなどから引数なしで実行した場合は上記の設定値を使用）
+    parser = argparse.ArgumentParser(description="都道府県データの統合と、GIS情報を入手するためのファイルを出力")
+    parser.add_argument("--force", action="store_true", help="変更のない都道府県も含めてすべて再処理する")
+    parser.add_argument("--month", default=None, help="処理対象のデータ月（DATA_MONTH、例: r0603）")
+    parser.add_argument("--base-dir", default=None, help="ベースディレクトリ（BASE_DIR）")
+    parser.add_argument("--workers", type=int, default=None, help="都道府県データの読み込みに用いるプロセス数（INGEST_WORKERS）")
+    parser.add_argument("--from-stage", default=None, help="この段階から実行する（" + ", ".join(s.name for s in STAGES) + "）")
+    parser.add_argument("--to-stage", default=None, help="この段階まで実行する")
+    parser.add_argument("--formats", nargs="+", default=None, choices=list(SINKS), help="最終データセット（total2）の出力形式（TOTAL2_FORMATS）")
+    parser.add_argument("--profile", default=PROFILE_STAGE, help="プロファイルを取る段階（PROFILE_STAGE）")
+    parser.add_argument("--profiler", default=PROFILER, choices=["cprofile", "pyinstrument"], help="プロファイラ（PROFILER）")
+    args, _ = parser.parse_known_args()
+    FORCE = FORCE or args.force
+    # 複数のデータ月を処理する場合（panel.py）は、データ月とベースディレクトリをコマンドラインで指定する
+    DATA_MONTH = args.month or DATA_MONTH
+    BASE_DIR = args.base_dir or BASE_DIR
+    INGEST_WORKERS = args.workers if args.workers is not None else INGEST_WORKERS
+    TOTAL2_FORMATS = args.formats or TOTAL2_FORMATS
+
+    # 作業ディレクトリの変更
+    try:
+        # 処理中の相対パス参照を確実にするためのカレントディレクトリ設定
+        os.chdir(BASE_DIR)
+        print(f"作業ディレクトリ: {os.getcwd()}")
+    except FileNotFoundError:
+        # 処理の続行可能性を判断し、エラーログを出力
+        print(f"エラー: 指定されたディレクトリ '{BASE_DIR}' が見つかりません。パスを確認してください。")
+        # 処理を続行できない場合は exit() などで停止する
+
+    # 派生パス（RAW_DIR = {DATA_MONTH}raw、MERGE_DIR = {DATA_MONTH}merge など）は pipeline.Context が定義する
+    # 各段階の出力を MERGE_DIR/checkpoints（flags は TOTAL_FILE、export は TOTAL2_DATA）に保存し、--from-stage で再開できる
+    # gis.py の段階（geocode, geocode-join）は古くなった total2 から作られたものとなるため、台帳の記録を削除する
+    import gis # 後続の段階（gis.STAGES）
+    run(STAGES, Context(DATA_MONTH, INTERMEDIATE_FORMAT, **settings()), args.from_stage, args.to_stage, args.profile, args.profiler, downstream=gis.STAGES)
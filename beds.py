@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 01:12:40 2026
+
+@author: tkurihara827
+"""
+
+#beds.py
+#診療科目の文字列（c）に含まれる「病床種別:病床数」（例: 一般:52, 療養:30）を抽出し、
+#病床種別ごとの病床数カラムと合計（n_bed_sum）に変換する
+
+# ライブラリのインポート
+import numpy as np # 病床数の行列への一括加算
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+
+# 病床種別（名称に含まれるキーワード: カラム名）
+# 判定はこの順に行う（例: 「精神療養」は精神、「医療療養」「介護療養」は療養）
+WARDS = {
+    "精神":   "bed_seishin",
+    "結核":   "bed_kekkaku",
+    "感染症": "bed_kansen",
+    "療養":   "bed_yoryo",
+    "一般":   "bed_ippan",
+}
+# いずれのキーワードも含まない病床種別（例: 特定病床）
+OTHER = "bed_other"
+
+# 病床種別ごとの病床数のカラム名（total2 のカラム順）
+BED_COLUMNS = ["bed_ippan", "bed_yoryo", "bed_seishin", "bed_kekkaku", "bed_kansen", OTHER]
+
+# カンマ区切りの要素のうち「病床種別:病床数」の形のもの（append.py の SUBJECT_LIST による正規化後）
+TOKEN = r'(?:^|,)(?P<ward>[^,:]+):(?P<n>\d+)'
+
+
+# 病床種別の名称からカラム名へ（一意な名称ごとに1回だけ判定する）
+def ward_column(name):
+    for keyword, col in WARDS.items():
+        if keyword in name:
+            return col
+    return OTHER
+
+# 病床種別ごとの病床数と合計
+# c: 正規化済みの診療科目の文字列（カンマ区切り）
+# 戻り値: c と同じ行の、BED_COLUMNS と n_bed_sum のカラムを持つデータフレーム（該当のない行は0）
+# 同じ病床種別が複数回現れる場合は合計する。数字だけの要素（病床種別のないもの）は数えない
+def extract(c):
+    counts = np.zeros((len(c), len(BED_COLUMNS)), dtype=np.int64)
+    # 病床数を含む行（コロンを含む行）のみを対象とする（病床のない診療所が大半のため）
+    has = np.flatnonzero(c.str.contains(":", regex=False, na=False).to_numpy(dtype=bool))
+    m = c.iloc[has].reset_index(drop=True).str.extractall(TOKEN)
+    if len(m):
+        # 一致した要素の行の位置・病床種別のカラムの位置・病床数
+        rows = has[m.index.get_level_values(0).to_numpy()]
+        codes, names = pd.factorize(m["ward"].str.strip())
+        cols = np.array([BED_COLUMNS.index(ward_column(x)) for x in names], dtype=np.intp)[codes]
+        np.add.at(counts, (rows, cols), m["n"].astype(np.int64).to_numpy())
+    out = pd.DataFrame(counts, index=c.index, columns=BED_COLUMNS)
+    out["n_bed_sum"] = counts.sum(axis=1)
+    return out
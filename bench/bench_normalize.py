@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 08:41:12 2026
+
+@author: tkurihara827
+"""
+
+#bench_normalize.py
+#文字列カラムの正規化の処理時間と結果の比較：以前の rep() の繰り返し（reference.py）と normalize.py の Normalizer
+#合成データ（synth.py）を merge 段階まで処理した診療科目・医師数・郵便番号のカラムに、両方の方法を適用する
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+import sys # リポジトリのモジュールを読み込むためのパスの追加・終了コード
+import time # 処理時間の計測
+import shutil # 一時ディレクトリの削除
+import argparse # コマンドライン引数の処理
+import tempfile # 合成データの一時ディレクトリ
+import pandas as pd # 計測結果の表
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import append # 段階（STAGES）と、その設定
+from pipeline import Context # 段階の関数に渡す設定とパス
+from normalize import normalize # カラムの正規化（重複のない値ごとに1回）
+import reference # 以前の置換規則と rep() の繰り返し
+import synth # 合成データの作成
+
+# 合成データのデータ月（作業ディレクトリ内の {MONTH}raw に作成する）
+MONTH = 'r0512'
+
+
+# --- merge 段階までの処理 ---
+# work: 作業ディレクトリ（{MONTH}raw に合成データがなければ作成する）
+def merged(work, facilities, workers=None):
+    raw = os.path.join(work, MONTH + 'raw')
+    if not os.path.isdir(raw):
+        synth.national(raw, 1, facilities, workers)
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        ctx = Context(MONTH, append.INTERMEDIATE_FORMAT, **{
+            **append.settings(), "workers": workers, "force": True, "match_cache": None, "municipality_file": None,
+        })
+        df = None
+        for stage in append.STAGES:
+            df = stage.func(ctx, df)
+            if stage.name == "merge":
+                return df
+    finally:
+        os.chdir(cwd)
+
+# 正規化する値（Normalizer ごとの入力のカラム）
+# 診療科目のリストの文字列・科目名は、前の正規化の結果から append.py と同じ手順で作る
+def inputs(df):
+    c = normalize(df['c'], reference.NORMALIZERS["subject"][1])
+    subject_list = c.map(lambda s: ",".join(dict.fromkeys(x.strip() for x in str(s).split('/'))))
+    return {
+        "subject": df['c'],
+        "count": pd.concat([df[col] for col in append.DOCTOR_COLS], ignore_index=True),
+        "post": df['post'].str[1:9],
+        "subject_list": subject_list,
+        "subject_name": normalize(subject_list, reference.NORMALIZERS["subject_list"][1]),
+    }
+
+
+# 処理時間の計測（repeat 回のうち最短の時間、数ミリ秒の処理のばらつきを除くため）
+# 戻り値: 最後の結果と処理時間（秒）
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = func()
+        t = time.perf_counter() - t
+        best = t if best is None else min(best, t)
+    return out, best
+
+
+# --- 1つの Normalizer の比較 ---
+# 戻り値: 計測結果（行数・重複のない値の数・処理時間・一致の件数）と、不一致の例
+def compare(name, s, repeat=5):
+    rules, normalizer = reference.NORMALIZERS[name]
+    ref, t_ref = timed(lambda: reference.rep_chain(s, rules), repeat)
+    out, t_out = timed(lambda: normalize(s, normalizer), repeat)
+    same, width, bad = reference.compare_normalized(s, ref, out)
+    examples = [(s.iloc[i], ref.iloc[i], out.iloc[i]) for i in bad[:5]]
+    return {
+        "normalizer": name,
+        "rows": len(s),
+        "unique": s.nunique(),
+        "rules": len(rules),
+        "rep_s": round(t_ref, 3),
+        "normalizer_s": round(t_out, 3),
+        "speedup": round(t_ref / t_out, 1) if t_out else None,
+        "same": same,
+        "width_only": width,
+        "mismatch": len(bad),
+    }, examples
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="rep() の繰り返しと normalize.py の Normalizer の処理時間と結果の比較")
+    parser.add_argument("--facilities", type=int, default=synth.NATIONAL, help="合成データの全国の医療機関数")
+    parser.add_argument("--work", default=None, help="合成データの作業ディレクトリ（指定した場合は次回も再利用）")
+    parser.add_argument("--workers", type=int, default=None, help="合成データの作成と ingest に用いるプロセス数")
+    parser.add_argument("--repeat", type=int, default=5, help="処理時間の計測の繰り返し回数（最短の時間を表示）")
+    args = parser.parse_args()
+
+    work = args.work or tempfile.mkdtemp(prefix="bench_normalize_")
+    os.makedirs(work, exist_ok=True)
+    try:
+        cols = inputs(merged(work, args.facilities, args.workers))
+        results = []
+        failed = False
+        for name, s in cols.items():
+            row, examples = compare(name, s, args.repeat)
+            results.append(row)
+            for x, ref, out in examples:
+                print(f"不一致（{name}）: {x!r} -> rep() {ref!r} / Normalizer {out!r}")
+            failed = failed or bool(row["mismatch"])
+        # width_only: NFKC正規化による全角・半角の統一のみの違い（例: ﾘﾊﾋﾞﾘ -> リハビリ、１ -> 1）
+        print(pd.DataFrame(results).to_string(index=False))
+    finally:
+        if not args.work:
+            shutil.rmtree(work, ignore_errors=True)
+    # 全角・半角の統一以外の違いがある場合は終了コード1
+    sys.exit(1 if failed else 0)
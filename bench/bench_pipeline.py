@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 04:12:36 2026
+
+@author: tkurihara827
+"""
+
+#bench_pipeline.py
+#append.py の段階（ingest 〜 export）ごとの処理時間の計測と、基準の出力（ゴールデン）との一致の確認
+#全国規模の 1倍・5倍・20倍 の合成データ（synth.py）を作成し、段階の出力をゴールデンと比較して、高速化による出力の変化を検出する
+#--reference を指定すると、高速化した段階の出力を、同じ入力に対する高速化前の処理（reference.py）の結果と比較する
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+import sys # リポジトリのモジュールを読み込むためのパスの追加
+import time # 処理時間の計測
+import shutil # 前回の出力の削除
+import argparse # コマンドライン引数の処理
+import tempfile # 合成データと出力の一時ディレクトリ
+import pandas as pd # 計測結果の表・段階の出力の比較
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage # 段階の出力の型の統一と、ゴールデンの保存・読み込み
+import readers # 高速化前の処理で元ファイルを読み込む
+import append # 段階（STAGES）と、その設定
+from ingest import PREFS, pre0, pre1 # 地方局のファイル番号と読み込みの設定
+from pipeline import Context # 段階の関数に渡す設定とパス
+from normalize import WIDTH # リファレンス科目名の全角・半角の統一（append.py と同じ）
+from specialty import CREF # 診療科区分（63科目）のリファレンス辞書
+import reference # 高速化前の処理
+import synth # 合成データの作成
+
+# 合成データのデータ月（作業ディレクトリ内の {MONTH}raw に作成する）
+MONTH = 'r0512'
+
+
+# --- 段階の出力とゴールデンの比較 ---
+# 一致する場合は None、異なる場合は最初の相違の説明を返す
+def compare(df, golden):
+    if list(df.columns) != list(golden.columns):
+        extra = [c for c in df.columns if c not in golden.columns]
+        missing = [c for c in golden.columns if c not in df.columns]
+        return f"カラムが異なります（追加: {extra}、不足: {missing}）" if extra or missing else "カラムの順序が異なります"
+    if len(df) != len(golden):
+        return f"行数が異なります（{len(df)} 行、ゴールデン {len(golden)} 行）"
+    for col in df.columns:
+        try:
+            pd.testing.assert_series_equal(df[col], golden[col], check_names=False)
+        except AssertionError as e:
+            return f"{col}: {str(e).splitlines()[0]}"
+    return None
+
+
+# --- 高速化前の処理との比較 ---
+# 段階ごとの比較の関数 check(ctx, inp, out)（inp: 段階の入力のコピー、out: 段階の出力）
+# 戻り値: 比較ごとの結果（比較名・件数・一致・全角半角の統一のみの違い・以前の処理で解釈できない値・不一致・不一致の例）のリスト
+def result(name, rows, same, width=0, unparsed=0, bad=(), examples=()):
+    return {"check": name, "rows": rows, "same": same, "width_only": width, "unparsed": unparsed,
+            "mismatch": len(bad), "examples": list(examples)[:3]}
+
+# ingest: 元ファイルを読み込み、move() の19回の呼び出しで繰り越した結果と、utils.carry_forward による結果
+def check_ingest(ctx, inp, out):
+    parts = []
+    for m in PREFS:
+        path = f"{ctx.raw_dir}/{m}.xlsx"
+        if os.path.exists(path):
+            parts.append(reference.carry(readers.read(path, skiprows=pre0, names=pre1, engine=ctx.engine), m))
+    ref = storage.typed(pd.concat(parts, axis=0, sort=False, ignore_index=True))
+    diff = compare(out, ref)
+    return [result("carry_forward / move", len(out), len(out) if diff is None else 0,
+                   bad=[] if diff is None else [diff], examples=[] if diff is None else [diff])]
+
+# normalize: 診療科目・医師数・郵便番号の rep() の繰り返しと normalize.py の Normalizer
+def check_normalize(ctx, inp, out):
+    rows = []
+    # 診療科目は append.py と同じ手順で重複のないリストにしてから比較する（全角・半角の統一で同じ科目となる要素は1つにまとまる）
+    split = lambda s: s.map(lambda x: "/".join(dict.fromkeys(v.strip() for v in str(x).split('/'))))
+    checks = [("normalize.SUBJECT", inp['c'], reference.rep_chain(inp['c'], reference.SUBJECT_RULES), out['c'].map("/".join), split)]
+    numeric = lambda s: pd.to_numeric(s, errors='coerce').fillna(0).astype(int)
+    for col in append.DOCTOR_COLS:
+        checks.append((f"normalize.COUNT（{col}）", inp[col], reference.rep_chain(inp[col], reference.COUNT_RULES), out[col], numeric))
+    post = inp['post'].str[1:9]
+    checks.append(("normalize.POST", post, reference.rep_chain(post, reference.POST_RULES), out['post'], None))
+    for name, s, ref, res, convert in checks:
+        same, width, bad = reference.compare_normalized(s, ref, res, convert)
+        rows.append(result(name, len(s), same, width, bad=bad, examples=[(s.iloc[i], ref.iloc[i], res.iloc[i]) for i in bad[:3]]))
+    return rows
+
+# dates: 和暦の日付の行ごとの変換と wareki.py
+# 以前の処理で解釈できた日付は text, year, month, day が一致すること、解釈できなかった日付は件数のみを数える
+def check_dates(ctx, inp, out):
+    rows = []
+    for i in ['register', 'start']:
+        ref = reference.wareki(inp[i])
+        parsed = ref['parsed'].to_numpy()
+        res = pd.DataFrame({'text': out[i], **{j: out[f"{i}_{j}"].astype("Int64") for j in ['year', 'month', 'day']}})
+        equal = pd.Series(True, index=res.index)
+        for j in ['text', 'year', 'month', 'day']:
+            equal &= (ref[j] == res[j]).fillna(False).astype(bool)
+        bad = list(res.index[parsed & ~equal.to_numpy()])
+        rows.append(result(f"wareki（{i}）", len(res), int((parsed & equal.to_numpy()).sum()), unparsed=int((~parsed).sum()),
+                           bad=bad, examples=[(inp.at[k, i], tuple(ref.loc[k, ['year', 'month', 'day']]), tuple(res.loc[k, ['year', 'month', 'day']])) for k in bad[:3]]))
+    return rows
+
+# specialties: 診療科目のリストの文字列化・科目名の rep() の繰り返しと Normalizer、
+# iterrows と SequenceMatcher による分類と similarity.py のダミー変数
+def check_specialties(ctx, inp, out):
+    s = inp['c'].str.join(',')
+    ref = reference.rep_chain(reference.rep_chain(s, reference.SUBJECT_LIST_RULES), reference.SUBJECT_NAME_RULES)
+    same, width, bad = reference.compare_normalized(s, ref, out['c'])
+    rows = [result("normalize.SUBJECT_LIST / SUBJECT_NAME", len(s), same, width, bad=bad,
+                   examples=[(s.iloc[i], ref.iloc[i], out['c'].iloc[i]) for i in bad[:3]])]
+    cref = {k: [v[0], WIDTH(v[1])] for k, v in CREF.items()}
+    names = [v[0] for v in cref.values()]
+    dummies = reference.classify(out['c'], cref)
+    equal = (dummies[names].to_numpy() == out[names].to_numpy()).all(axis=1)
+    bad = list(out.index[~equal])
+    rows.append(result("similarity / SequenceMatcher", len(out), int(equal.sum()), bad=bad,
+                       examples=[(out.at[k, 'c'], [c for c in names if dummies.at[k, c]], [c for c in names if out.at[k, c]]) for k in bad[:3]]))
+    return rows
+
+# 比較する段階（段階名 -> 比較の関数）
+REFERENCE_CHECKS = {
+    "ingest": check_ingest,
+    "normalize": check_normalize,
+    "dates": check_dates,
+    "specialties": check_specialties,
+}
+
+
+# --- 1つの倍率での計測 ---
+# work: 作業ディレクトリ（{MONTH}raw に合成データを作成し、出力も同じディレクトリに書き出す）
+# golden: ゴールデンのディレクトリ（段階ごとの出力 {stage}.parquet、None の場合は比較しない）
+# save: True の場合は、比較せずに段階の出力をゴールデンとして保存する
+# ref: True の場合は、REFERENCE_CHECKS の段階の出力を高速化前の処理の結果と比較する（比較の時間は計測に含めない）
+# 戻り値: 段階ごとの計測結果（段階名・秒・出力の行数・比較結果）のリストと、高速化前の処理との比較結果のリスト
+def run_scale(work, scale, total, golden=None, save=False, workers=None, ref=False):
+    raw = os.path.join(work, MONTH + 'raw')
+    if not os.path.isdir(raw):
+        t = time.perf_counter()
+        synth.national(raw, scale, total, workers)
+        print(f"合成データの作成: {raw}（{time.perf_counter() - t:.1f} 秒）")
+    # 前回の中間ファイルは再利用しない（ingest の再利用、診療科目のキャッシュ、市区町村コードの付与は行わない）
+    for d in [MONTH, MONTH + 'merge', 'cube']:
+        shutil.rmtree(os.path.join(work, d), ignore_errors=True)
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        ctx = Context(MONTH, append.INTERMEDIATE_FORMAT, **{
+            **append.settings(), "workers": workers, "force": True, "match_cache": None, "municipality_file": None,
+        })
+        results = []
+        checks = []
+        df = None
+        for stage in append.STAGES:
+            # 段階の関数は入力のデータフレームを書き換えるため、比較に用いる入力はコピーしておく
+            inp = df.copy() if ref and stage.name in REFERENCE_CHECKS and df is not None else df
+            t = time.perf_counter()
+            # 段階の間の受け渡しは pipeline.run() と同じ（中間ファイルの書き出しは計測に含めない）
+            df = storage.typed(stage.func(ctx, df))
+            dt = time.perf_counter() - t
+            status = ""
+            if golden and save:
+                storage.write(df, os.path.join(golden, stage.name), "parquet")
+                status = "保存"
+            elif golden:
+                base = os.path.join(golden, stage.name)
+                if not storage.exists(base, "parquet"):
+                    status = "ゴールデンなし"
+                else:
+                    # 今回の出力も列指向形式を経由してから比較する（カテゴリ型など、読み込み時に型が変わるカラムをそろえる）
+                    current = storage.write(df, os.path.join(ctx.checkpoint_dir, stage.name), "parquet")
+                    diff = compare(storage.read(os.path.splitext(current)[0], "parquet"), storage.read(base, "parquet"))
+                    status = "一致" if diff is None else f"不一致（{diff}）"
+            results.append({"scale": scale, "stage": stage.name, "seconds": round(dt, 3), "rows": len(df), "golden": status})
+            print(f"  {stage.name:14s} {dt:9.2f} 秒 {len(df):>10,} 行  {status}")
+            if ref and stage.name in REFERENCE_CHECKS:
+                t = time.perf_counter()
+                for row in REFERENCE_CHECKS[stage.name](ctx, inp, df):
+                    checks.append({"scale": scale, "stage": stage.name, **row})
+                    print(f"    高速化前の処理との比較 {row['check']}: 一致 {row['same']:,} / {row['rows']:,} 件"
+                          f"（全角・半角の統一のみ {row['width_only']:,}、以前の処理で解釈できない値 {row['unparsed']:,}、不一致 {row['mismatch']:,}）")
+                    for example in row["examples"]:
+                        print(f"      不一致の例: {example}")
+                print(f"    （比較 {time.perf_counter() - t:.1f} 秒）")
+                del inp
+        return results, checks
+    finally:
+        os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="append.py の段階ごとのベンチマークと、ゴールデンとの一致の確認")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1], help="全国規模に対する倍率（例: 1 5 20）")
+    parser.add_argument("--facilities", type=int, default=synth.NATIONAL, help="倍率 1 の全国の医療機関数")
+    parser.add_argument("--work", default=None, help="合成データと出力の作業ディレクトリ（指定した場合は合成データを次回も再利用）")
+    parser.add_argument("--golden", default=None, help="ゴールデン（段階ごとの出力）のディレクトリ（倍率ごとに x{倍率} に保存）")
+    parser.add_argument("--save-golden", action="store_true", help="比較せずに、今回の出力をゴールデンとして保存する")
+    parser.add_argument("--workers", type=int, default=None, help="合成データの作成と ingest に用いるプロセス数")
+    parser.add_argument("--csv", default=None, help="計測結果のCSVの出力先")
+    parser.add_argument("--reference", action="store_true", help="高速化した段階（ingest, normalize, dates, specialties）の出力を、高速化前の処理（reference.py）の結果と比較する")
+    args = parser.parse_args()
+
+    work = args.work or tempfile.mkdtemp(prefix="bench_pipeline_")
+    results = []
+    checks = []
+    failed = False
+    for scale in args.scale:
+        name = f"x{scale:g}"
+        print(f"倍率 {scale:g}（全国 {round(args.facilities * scale):,} 医療機関）")
+        golden = os.path.join(args.golden, name) if args.golden else None
+        if golden and args.save_golden:
+            os.makedirs(golden, exist_ok=True)
+        rows, scale_checks = run_scale(os.path.join(work, name), scale, args.facilities, golden, args.save_golden, args.workers, args.reference)
+        failed = failed or any(r["golden"].startswith("不一致") for r in rows) or any(c["mismatch"] for c in scale_checks)
+        results += rows
+        checks += scale_checks
+    table = pd.DataFrame(results)
+    print(table.pivot(index="stage", columns="scale", values="seconds").reindex([s.name for s in append.STAGES]).to_string())
+    if checks:
+        print(pd.DataFrame(checks).drop(columns="examples").to_string(index=False))
+    if args.csv:
+        table.to_csv(args.csv, index=False, encoding="utf-8-sig")
+    if not args.work:
+        shutil.rmtree(work, ignore_errors=True)
+    # ゴールデンまたは高速化前の処理と一致しない段階がある場合は終了コード1
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:58:03 2026
+
+@author: tkurihara827
+"""
+
+#bench_readers.py
+#エクセルファイルの読み込みエンジン（readers.py）ごとの読み込み時間の比較
+#合成した地方局形式のエクセルファイルを各エンジンで読み込み、読み込み結果が同じであることも確認する
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+import sys # リポジトリのモジュールを読み込むためのパスの追加
+import time # 読み込み時間の計測
+import tracemalloc # 読み込み中の最大メモリ使用量の計測
+import argparse # コマンドライン引数の処理
+import tempfile # 合成データの一時ディレクトリ
+import pandas as pd # 読み込み結果の比較
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import readers # 読み込みエンジンの切り替え
+from ingest import pre0, pre1 # 読み飛ばす行とカラム名
+import synth # 合成データの作成
+
+
+# 読み込み中の最大メモリ使用量（MB、Python のオブジェクトのみ）
+# tracemalloc は読み込みを遅くするため、時間の計測とは別に1回だけ読み込む
+def peak_memory(path, engine):
+    tracemalloc.start()
+    try:
+        readers.read(path, pre0, pre1, engine)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+# 1つのファイルを各エンジンで読み込み、最短時間（秒）と最大メモリ使用量（MB）を返す
+def bench(path, engines, repeat):
+    times = {}
+    peaks = {}
+    frames = {}
+    for e in engines:
+        peaks[e] = peak_memory(path, e)
+        best = None
+        for _ in range(repeat):
+            t = time.perf_counter()
+            frames[e] = readers.read(path, pre0, pre1, e)
+            dt = time.perf_counter() - t
+            best = dt if best is None else min(best, dt)
+        times[e] = best
+    # 従来の読み込み（または最初のエンジン）の結果と比較
+    ref = frames["openpyxl"] if "openpyxl" in frames else frames[engines[0]]
+    for e in engines:
+        pd.testing.assert_frame_equal(ref, frames[e])
+    return times, peaks, len(ref)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="エクセルファイルの読み込みエンジンのベンチマーク")
+    parser.add_argument("--records", type=int, nargs="+", default=[2000, 20000], help="1ファイルあたりの医療機関数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数（最短時間を採用）")
+    args = parser.parse_args()
+    engines = [e for e in readers.ENGINES if readers.available(e)]
+    print(f"利用可能なエンジン: {', '.join(engines)}（auto: {readers.select('auto')}）")
+    with tempfile.TemporaryDirectory() as d:
+        for n in args.records:
+            path = synth.workbook(os.path.join(d, f"{n}.xlsx"), n, n)
+            times, peaks, rows = bench(path, engines, args.repeat)
+            print(f"医療機関数 {n}（{rows} 行, {os.path.getsize(path) / 1e6:.1f} MB）")
+            for e in engines:
+                print(f"  {e:16s} {times[e]:8.3f} 秒（openpyxl 比 {times.get('openpyxl', times[e]) / times[e]:5.1f} 倍）  最大メモリ {peaks[e]:7.1f} MB")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 08:05:26 2026
+
+@author: tkurihara827
+"""
+
+#check_carry.py
+#縦方向の繰り越しのベクトル化版（utils.carry_forward）が、元の行ごとのループ（utils.move を19回）と同じ結果を返すことの確認
+#プレースホルダ（*）の抜け・条件文字列を含む行・id の境目・直前に埋めた reason を start が参照する場合などを再現した表と、乱数で作成した表で比較する
+
+# ライブラリのインポート
+import os # リポジトリのモジュールを読み込むためのパスの追加
+import sys # 同上・終了コード
+import random # 乱数による表の作成（シードを固定して再現可能とする）
+import argparse # コマンドライン引数の処理
+import pandas as pd # 繰り越し結果の比較
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import move, carry_forward # 元のループとベクトル化版
+from ingest import pre2, carry_params # 繰り越しのターゲットカラムとパラメータ
+
+# 繰り越しのソースカラム
+SOURCES = ["tell", "register", "type", "category"]
+
+
+# --- 元の処理（append.py の move_params と move() の19回の呼び出し） ---
+# move() の繰り返し回数は k-row_num（k: 行数）
+def reference(df, params=carry_params):
+    x = df.copy()
+    k = len(x)
+    for m, v1, v2, w in params:
+        move(k - m, x, m, v1, v2, w)
+    return x
+
+# ベクトル化版（ingest.carry() と同じ呼び出し）
+def vectorized(df, params=carry_params):
+    x = df.copy()
+    carry_forward(x, params)
+    return x
+
+
+# --- 比較する表 ---
+# rows: (id, tell, register, type, category) の組のリスト
+# ターゲットカラムは ingest.carry() と同じくプレースホルダ（*）で初期化する（targets で一部の行の値を指定できる）
+def frame(rows, targets=None):
+    df = pd.DataFrame(rows, columns=["id"] + SOURCES, dtype=object)
+    for c in pre2:
+        df[c] = "*"
+    for (i, c), v in (targets or {}).items():
+        df.at[i, c] = v
+    return df
+
+# 個別の場合を再現した表（名前, 表）
+def crafted():
+    cases = []
+    # 1医療機関（地方局形式の7行）：電話番号欄の常勤/医/歯/非常勤、登録欄の日付/事由、種別欄、診療科目欄
+    one = [
+        (1, "03-1234-5678", "令 5. 4. 1", "病院", "内科"),
+        (1, "常勤: 3", "新規", "現存", "外科"),
+        (1, "(医 2)", "令 5. 4. 1", "一般", "小児科"),
+        (1, "(歯 1)", "", "療養病床", "眼科"),
+        (1, "非常勤: 2", "", "総合", "皮膚科"),
+        (1, "(医 1)", "", "", "歯科"),
+        (1, "(歯 1)", "", "", "一般 52"),
+    ]
+    cases.append(("1医療機関", frame(one)))
+    # プレースホルダの抜け：一部のターゲットカラムが既に値を持つ（上書きしない）
+    cases.append(("*の抜け", frame(one, {(0, "n_tenu"): "既存", (0, "type2"): "既存", (0, "c3"): "既存", (0, "reason"): "既存"})))
+    # 条件文字列を含む行・含まない行（非常勤 は 常 を含む、医 と 歯 の入れ替わり、条件文字列のない行）
+    sub = [
+        (1, "代表", "", "診療所", "内科"),
+        (1, "非常勤医", "", "", ""),
+        (1, "歯", "", "", ""),
+        (1, "医歯", "", "", ""),
+        (1, "常勤", "", "", ""),
+        (1, "医", "", "", ""),
+        (1, "歯科医", "", "", ""),
+        (1, "", "", "", ""),
+    ]
+    cases.append(("条件文字列", frame(sub)))
+    # id の境目：m行下が別の医療機関の行（繰り越さない）
+    edge = [
+        (1, "代表", "令 1. 5. 1", "病院", "内科"),
+        (1, "常勤 1", "新規", "現存", "外科"),
+        (2, "医 9", "平 2. 1. 1", "診療所", "歯科"),
+        (2, "歯 9", "移転", "休止", "眼科"),
+        (3, "非 9", "昭 60. 1. 1", "病院", "皮膚科"),
+        (3, "医 9", "更新", "", ""),
+        (4, "歯 9", "", "", ""),
+    ]
+    cases.append(("idの境目", frame(edge)))
+    # start は直前の組で埋めた reason を参照する（1行下の register -> reason、さらに1行下の reason -> start）
+    chain = [
+        (1, "代表", "令 2. 1. 1", "病院", "内科"),
+        (1, "常勤 1", "交代", "現存", "外科"),
+        (1, "医 1", "平 30. 3. 1", "", ""),
+    ]
+    cases.append(("reason→start", frame(chain)))
+    # 1行下の reason が既に値を持つ場合（埋めた値ではなく元の値を参照する）
+    cases.append(("reason→start（既存のreason）", frame(chain, {(1, "reason"): "既存"})))
+    # 行数が row_num 以下の表・1行・0行
+    cases.append(("3行", frame(one[:3])))
+    cases.append(("1行", frame(one[:1])))
+    cases.append(("0行", frame([])))
+    return cases
+
+# 乱数で作成した表（同じ id の行が連続し、値は条件文字列を含む短い文字列と * から選ぶ）
+def fuzzed(n, seed=0):
+    rng = random.Random(seed)
+    words = ["*", "", "常", "医", "歯", "非", "常勤医", "非常勤歯", "新規", "令 1. 1. 1", "総合", "現存", "内科", "一般 10"]
+    cases = []
+    for t in range(n):
+        rows = []
+        for f in range(rng.randint(1, 6)):
+            for _ in range(rng.randint(1, 9)):
+                rows.append((f, *(rng.choice(words) for _ in SOURCES)))
+        targets = {(rng.randrange(len(rows)), rng.choice(pre2)): rng.choice(words) for _ in range(rng.randint(0, 5))}
+        cases.append((f"乱数{t}", frame(rows, targets)))
+    return cases
+
+
+# 1つの表の比較（一致する場合は None、異なる場合は最初の相違の説明を返す）
+def compare(df):
+    try:
+        pd.testing.assert_frame_equal(vectorized(df), reference(df))
+    except AssertionError as e:
+        return str(e).splitlines()[0] + " " + " ".join(str(e).splitlines()[1:3])
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="utils.carry_forward と utils.move の19回の呼び出しの結果の比較")
+    parser.add_argument("--fuzz", type=int, default=500, help="乱数で作成する表の数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    args = parser.parse_args()
+
+    failed = 0
+    for name, df in crafted() + fuzzed(args.fuzz, args.seed):
+        diff = compare(df)
+        if diff is not None:
+            failed += 1
+            print(f"不一致: {name}（{len(df)} 行）: {diff}")
+        elif not name.startswith("乱数"):
+            print(f"一致: {name}（{len(df)} 行）")
+    print(f"{len(crafted()) + args.fuzz} 件中 不一致 {failed} 件")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:02:18 2026
+
+@author: tkurihara827
+"""
+
+#check_csis.py
+#geocode 段階（csis.py）の中断と再開の確認：混雑（503）を返すローカルのスタブ（csis_stub.py）に対して gis.py の段階を実行する
+#1回目は再送なしで実行して送信の失敗で中断させ（記録の最後の行が途中まで書かれた状態も再現する）、2回目に続きから再開し、
+#address_out.csv のカラムと各行の経度・緯度がスタブの値と一致すること、記録済みの住所を送り直さないこと、geocode-join が結果を結合できることを確かめる
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+import sys # リポジトリのモジュールを読み込むためのパスの追加・終了コード
+import shutil # 一時ディレクトリの削除
+import random # 住所の作成（シードを固定して再現可能とする）
+import argparse # コマンドライン引数の処理
+import tempfile # 作業ディレクトリ
+import pandas as pd # address.csv の作成と address_out.csv の確認
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage # total2 の中間ファイルの作成
+import gis # 段階（geocode, geocode-join）と、その設定
+from pipeline import Context, run # 段階の実行
+import csis_stub # ローカルのスタブ
+
+# 作業ディレクトリ内のデータ月
+MONTH = 'r0512'
+# address_out.csv のカラム（gis.py が読み込む形式）
+COLUMNS = ["id", "post", "address", "LocName", "fX", "fY", "iConf", "iLvl"]
+
+
+# --- 入力の作成 ---
+# address.csv（id, 郵便番号, 住所、ヘッダなし）と total2 の中間ファイル（id のみ）を作成する
+# 住所には番地のある住所・番地のない住所・空の住所・同じ住所の重複・カンマや引用符を含む住所を含める
+def inputs(ctx, n, seed=0):
+    rng = random.Random(seed)
+    towns = ["東京都千代田区丸の内", "大阪府大阪市北区梅田", "北海道札幌市中央区北一条西", "沖縄県那覇市泉崎", "福岡県福岡市博多区博多駅前"]
+    rows = []
+    for i in range(n):
+        r = rng.random()
+        if r < 0.02:
+            address = ""
+        elif r < 0.1 and rows:
+            address = rng.choice(rows)[2]
+        elif r < 0.15:
+            address = rng.choice(towns) + '、"ビル",別館'
+        elif r < 0.3:
+            address = rng.choice(towns)
+        else:
+            address = f"{rng.choice(towns)}{rng.randint(1, 9)}-{rng.randint(1, 30)}-{rng.randint(1, 20)}"
+        rows.append((str(1000000 + i), f"{rng.randint(100, 999)}-{rng.randint(0, 9999):04d}", address))
+    os.makedirs(ctx.merge_dir, exist_ok=True)
+    df4 = pd.DataFrame(rows, columns=["id", "post", "address"])
+    df4.to_csv(ctx.address_csv, index=False, header=False, encoding="utf-8-sig")
+    storage.write(df4[["id"]], ctx.total2_data, ctx.fmt)
+    return df4
+
+
+# --- 結果の確認 ---
+# 問題の説明のリストを返す（問題がない場合は空のリスト）
+def verify(ctx, df4):
+    problems = []
+    out = pd.read_csv(ctx.address_out_csv, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    if list(out.columns) != COLUMNS:
+        return [f"address_out.csv のカラムが異なります: {list(out.columns)}"]
+    if len(out) != len(df4):
+        return [f"address_out.csv の行数が異なります（{len(out)} 行、address.csv {len(df4)} 行）"]
+    for col in ["id", "post", "address"]:
+        n = int((out[col] != df4[col].fillna("")).sum())
+        if n:
+            problems.append(f"{col} が address.csv と異なる行: {n} 行")
+    # 経度・緯度・照合の水準はスタブが住所から決める値と一致すること
+    expected = pd.DataFrame([csis_stub.locate(a) for a in df4["address"].fillna("")], columns=COLUMNS[3:])
+    for col in ["fX", "fY"]:
+        a = pd.to_numeric(out[col], errors="coerce")
+        b = pd.to_numeric(expected[col], errors="coerce")
+        n = int((~((a - b).abs() < 1e-9) & ~(a.isna() & b.isna())).sum())
+        if n:
+            problems.append(f"{col} がスタブの値と異なる行: {n} 行（例: {out.loc[(a - b).abs() >= 1e-9, 'address'].head(3).tolist()}）")
+    for col in ["LocName", "iConf", "iLvl"]:
+        n = int((out[col] != expected[col]).sum())
+        if n:
+            problems.append(f"{col} がスタブの値と異なる行: {n} 行")
+    # geocode-join の出力（total3）の経度・緯度が address_out.csv の値と一致すること
+    total3 = storage.read(ctx.total3_data, ctx.fmt)
+    joined = total3.set_index(total3["id"].astype(str))[["lon", "lat"]].reindex(out["id"])
+    for col, src in [("lon", "fX"), ("lat", "fY")]:
+        a = joined[col].to_numpy()
+        b = pd.to_numeric(out[src], errors="coerce").to_numpy()
+        n = int((~((abs(a - b) < 1e-9) | (pd.isna(a) & pd.isna(b)))).sum())
+        if n:
+            problems.append(f"total3 の {col} が address_out.csv の {src} と異なる行: {n} 行")
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="geocode 段階の中断と再開の確認（ローカルのスタブに対して実行）")
+    parser.add_argument("--rows", type=int, default=6000, help="address.csv の行数")
+    parser.add_argument("--batch", type=int, default=100, help="1回の要求で送る住所の数（GEOCODE_BATCH）")
+    parser.add_argument("--fail-rate", type=float, default=0.3, help="スタブが混雑（503）を返す要求の割合")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード（住所の作成とスタブの混雑）")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="check_csis_")
+    server = csis_stub.serve(fail_rate=args.fail_rate, seed=args.seed, max_batch=args.batch)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/"
+    cwd = os.getcwd()
+    problems = []
+    try:
+        os.chdir(work)
+        config = {**gis.settings(), "geocode_endpoint": endpoint, "geocode_batch": args.batch, "geocode_concurrency": 4, "total3_formats": []}
+        ctx = Context(MONTH, gis.INTERMEDIATE_FORMAT, **{**config, "geocode_retries": 0})
+        df4 = inputs(ctx, args.rows, args.seed)
+        unique = df4["address"].fillna("").nunique()
+
+        # 1回目：再送なしで実行し、混雑で送信に失敗させる（address_out.csv は書き出されない）
+        print("1回目（再送なし）")
+        try:
+            run(gis.STAGES, ctx)
+            problems.append("1回目の実行が失敗しませんでした（--fail-rate を大きくしてください）")
+        except RuntimeError as e:
+            print(f"  中断: {e}")
+        if os.path.exists(ctx.address_out_csv):
+            problems.append("送信に失敗したのに address_out.csv が書き出されました")
+        with open(ctx.geocode_journal, encoding="utf-8") as f:
+            recorded = sum(1 for _ in f) - 1
+        # 記録の最後の行が途中まで書かれた状態（書き込み中の中断）を再現する
+        with open(ctx.geocode_journal, "a", encoding="utf-8") as f:
+            f.write('{"address": "途中まで')
+        print(f"  記録済み {recorded:,} / {unique:,} 件")
+        if not 0 < recorded < unique:
+            problems.append(f"1回目の記録の件数が想定外です（{recorded} / {unique} 件）")
+
+        # 2回目：再送ありで再開し、記録にない住所のみを送る（混雑は再送で乗り越える）
+        print("2回目（再開）")
+        rows_before = csis_stub.Handler.stats["rows"]
+        failed_before = csis_stub.Handler.stats["failed"]
+        ctx = Context(MONTH, gis.INTERMEDIATE_FORMAT, **{**config, "geocode_retries": 20})
+        run(gis.STAGES, ctx)
+        sent = csis_stub.Handler.stats["rows"] - rows_before
+        print(f"  再開後に送信した住所 {sent:,} 件（スタブ: {csis_stub.Handler.stats}）")
+        if sent != unique - recorded:
+            problems.append(f"再開後に送信した住所の数が記録にない住所の数と異なります（{sent} 件、記録にない住所 {unique - recorded} 件）")
+        if csis_stub.Handler.stats["failed"] == failed_before:
+            problems.append("2回目の実行で混雑が起きず、再送を確認できませんでした（--rows または --fail-rate を大きくしてください）")
+        problems += verify(ctx, df4)
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(work, ignore_errors=True)
+
+    for p in problems:
+        print(f"問題: {p}")
+    print("確認の結果: " + ("問題なし" if not problems else f"問題 {len(problems)} 件"))
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:14:07 2026
+
+@author: tkurihara827
+"""
+
+#check_municipality.py
+#市区町村コードの付与（municipality.py）の確認：郡名を含む住所・含まない住所が、郡名を含む表・含まない表のどちらでも正しいコードになること
+#郡名自体が市・区・町・村を含む郡（北村山郡・東村山郡・西村山郡・余市郡・高市郡）と、市名が「郡」を含む市（郡山市・大和郡山市）を含める
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+import sys # リポジトリのモジュールを読み込むためのパスの追加・終了コード
+import shutil # 一時ディレクトリの削除
+import tempfile # 市区町村コードの表の一時ファイル
+import pandas as pd # 表と住所の作成・結果の比較
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import municipality # 市区町村コードの付与
+
+
+# 市区町村コードの表（団体コード, 都道府県名, 郡名, 市区町村名）
+TABLE = [
+    ("13303", "東京都", "西多摩郡", "瑞穂町"),
+    ("06201", "山形県", "", "山形市"),
+    ("06301", "山形県", "東村山郡", "山辺町"),
+    ("06302", "山形県", "東村山郡", "中山町"),
+    ("06321", "山形県", "西村山郡", "河北町"),
+    ("06322", "山形県", "西村山郡", "西川町"),
+    ("06323", "山形県", "西村山郡", "朝日町"),
+    ("06324", "山形県", "西村山郡", "大江町"),
+    ("06341", "山形県", "北村山郡", "大石田町"),
+    ("01100", "北海道", "", "札幌市"),
+    ("01101", "北海道", "", "札幌市中央区"),
+    ("01407", "北海道", "余市郡", "仁木町"),
+    ("01408", "北海道", "余市郡", "余市町"),
+    ("01409", "北海道", "余市郡", "赤井川村"),
+    ("07203", "福島県", "", "郡山市"),
+    ("29211", "奈良県", "", "大和郡山市"),
+    ("29401", "奈良県", "高市郡", "高取町"),
+    ("29402", "奈良県", "高市郡", "明日香村"),
+]
+
+# 住所と、付与されるべき市区町村コード
+ADDRESSES = [
+    ("東京都西多摩郡瑞穂町石畑2008", "13303"),
+    ("東京都瑞穂町石畑2008", "13303"),
+    ("山形県北村山郡大石田町大字大石田乙1", "06341"),
+    ("山形県大石田町大字大石田乙1", "06341"),
+    ("山形県東村山郡山辺町大字山辺1", "06301"),
+    ("山形県東村山郡中山町大字長崎1", "06302"),
+    ("山形県西村山郡河北町谷地1", "06321"),
+    ("山形県西村山郡西川町大字海味1", "06322"),
+    ("山形県山形市旅篭町2-3-25", "06201"),
+    ("北海道余市郡余市町黒川町1-1", "01408"),
+    ("北海道余市郡仁木町西町1-36-1", "01407"),
+    ("北海道余市郡赤井川村赤井川74-2", "01409"),
+    ("北海道余市町黒川町1-1", "01408"),
+    ("北海道札幌市中央区北一条西2", "01101"),
+    ("奈良県高市郡高取町観覚寺990-1", "29401"),
+    ("奈良県高市郡明日香村岡55", "29402"),
+    ("奈良県大和郡山市北郡山町248-4", "29211"),
+    ("福島県郡山市朝日1-23-7", "07203"),
+    ("東京都千代田区丸の内1", None),
+]
+
+
+# 表のCSV（with_county: 市区町村名に郡名を含める（位置参照情報の形）、含めない（全国地方公共団体コードの形））
+def write_table(path, with_county):
+    rows = [(code, pref, (county if with_county else "") + city) for code, pref, county, city in TABLE]
+    pd.DataFrame(rows, columns=["code", "pref", "city"]).to_csv(path, index=False, encoding="utf-8-sig")
+
+
+if __name__ == '__main__':
+    work = tempfile.mkdtemp(prefix="check_municipality_")
+    address = pd.Series([a for a, _ in ADDRESSES])
+    expected = pd.Series([c for _, c in ADDRESSES], dtype="string")
+    failed = 0
+    try:
+        for with_county in [True, False]:
+            print("表の市区町村名: " + ("郡名を含む" if with_county else "郡名を含まない"))
+            path = os.path.join(work, f"codes_{int(with_county)}.csv")
+            write_table(path, with_county)
+            codes = municipality.assign(address, path)
+            same = (codes == expected).fillna(False) | (codes.isna() & expected.isna())
+            for a, c, e in zip(address[~same], codes[~same], expected[~same]):
+                print(f"  不一致: {a} -> {c}（正しいコード {e}）")
+            failed += int((~same).sum())
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    print(f"{2 * len(ADDRESSES)} 件中 不一致 {failed} 件")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:31:40 2026
+
+@author: tkurihara827
+"""
+
+#csis_stub.py
+#CSV Geocoding Service と同じ形式で応答するローカルのスタブ（csis.py と gis.py の geocode 段階の動作確認用）
+#住所のハッシュ値から決まる経度・緯度を返し、一定の割合の混雑（503）・応答の遅延を起こして再送と同時送信の上限を確かめられる
+
+# ライブラリのインポート
+import io # CSVの文字列の読み書き
+import csv # 要求・応答のCSVの解釈と作成
+import time # 応答の遅延
+import random # 混雑（503）を起こす要求の選択（シードを固定して再現可能とする）
+import hashlib # 住所から経度・緯度を決めるハッシュ値
+import argparse # コマンドライン引数の処理
+import threading # 同時に処理中の要求の数の計数
+from email.parser import BytesParser # multipart/form-data の解釈
+from email.policy import HTTP # 同上
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler # 要求ごとにスレッドで応答するHTTPサーバ
+
+
+# 住所の経度・緯度・照合の水準（同じ住所には常に同じ値を返す、日本の範囲内）
+# 数字を含まない住所は町丁目（iLvl 5）、空の住所は照合できず（iLvl 0）、それ以外は街区（iLvl 7）とする
+def locate(address):
+    if not address.strip():
+        return ["", "", "", "0", "0"]
+    h = hashlib.sha256(address.encode("utf-8")).digest()
+    lon = 128 + int.from_bytes(h[:4], "big") / 2**32 * 18
+    lat = 26 + int.from_bytes(h[4:8], "big") / 2**32 * 19
+    level = "7" if any(c.isdigit() for c in address) else "5"
+    return [address, f"{lon:.6f}", f"{lat:.6f}", "5", level]
+
+
+class Handler(BaseHTTPRequestHandler):
+    # サーバの設定と集計（serve() で設定する）
+    fail_rate = 0.0
+    delay = 0.0
+    max_batch = None
+    rng = random.Random(0)
+    lock = threading.Lock()
+    active = 0
+    stats = {"requests": 0, "rows": 0, "failed": 0, "max_active": 0}
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.stats["requests"] += 1
+            cls.stats["max_active"] = max(cls.stats["max_active"], cls.active)
+            fail = cls.rng.random() < cls.fail_rate
+            cls.stats["failed"] += fail
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if fail:
+                return self.reply(503, "busy\n", {"Retry-After": "0"})
+            # multipart/form-data のフィールド（file: CSV、column: 住所のカラムの位置）
+            msg = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body)
+            fields = {p.get_param("name", header="content-disposition"): p.get_payload(decode=True) for p in msg.iter_parts()}
+            if "file" not in fields:
+                return self.reply(400, "file がありません\n")
+            rows = list(csv.reader(io.StringIO(fields["file"].decode("utf-8-sig"))))
+            header = fields.get("header", b"0") == b"1"
+            column = int(fields.get("column", b"1")) - 1
+            data = rows[1:] if header else rows
+            if cls.max_batch and len(data) > cls.max_batch:
+                return self.reply(413, f"1回の要求は {cls.max_batch} 件までです\n")
+            time.sleep(cls.delay)
+            out = io.StringIO()
+            w = csv.writer(out, lineterminator="\r\n")
+            if header:
+                w.writerow(rows[0] + ["LocName", "fX", "fY", "iConf", "iLvl"])
+            for row in data:
+                w.writerow(row + locate(row[column] if column < len(row) else ""))
+            cls.stats["rows"] += len(data)
+            self.reply(200, out.getvalue(), {"Content-Type": "text/csv; charset=utf-8"})
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def reply(self, code, text, headers=None):
+        data = text.encode("utf-8")
+        self.send_response(code)
+        for k, v in {"Content-Length": str(len(data)), **(headers or {})}.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+# スタブの起動（port=0 の場合は空いているポート、戻り値のサーバの server_address で確認する）
+# 別スレッドで応答し、終了は server.shutdown()
+def serve(port=0, fail_rate=0.0, delay=0.0, max_batch=None, seed=0):
+    Handler.fail_rate = fail_rate
+    Handler.delay = delay
+    Handler.max_batch = max_batch
+    Handler.rng = random.Random(seed)
+    Handler.stats = {"requests": 0, "rows": 0, "failed": 0, "max_active": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="CSV Geocoding Service 形式のローカルのスタブ")
+    parser.add_argument("--port", type=int, default=8765, help="待ち受けるポート")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="混雑（503）を返す要求の割合")
+    parser.add_argument("--delay", type=float, default=0.0, help="1回の応答の遅延（秒）")
+    parser.add_argument("--max-batch", type=int, default=None, help="1回の要求の住所の数の上限（超えると413）")
+    args = parser.parse_args()
+    server = serve(args.port, args.fail_rate, args.delay, args.max_batch)
+    print(f"http://127.0.0.1:{server.server_address[1]}/ で待ち受けています（Ctrl+C で終了）")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(Handler.stats)
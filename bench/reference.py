@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 08:26:51 2026
+
+@author: tkurihara827
+"""
+
+#reference.py
+#高速化する前の append.py（rep() の繰り返しによる置換、move() の行ごとの繰り越し、和暦の日付の行ごとの変換、
+#iterrows と SequenceMatcher による診療科目の分類）の処理を、比較の基準（リファレンス）としてそのまま残したもの
+#bench/ のスクリプトが、同じデータに対する高速化後のモジュール（normalize.py, utils.carry_forward, wareki.py, similarity.py）の結果と比較する
+
+# ライブラリのインポート
+import os # リポジトリのモジュールを読み込むためのパスの追加
+import sys # 同上
+import unicodedata # NFKC正規化で変わる値の判定
+from datetime import date # 存在する日付かどうかの確認
+from difflib import SequenceMatcher # 文字列類似度計算アルゴリズム（Ratcliff/Obershelpアルゴリズム）
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import normalize # 高速化後の正規化
+from utils import move, rdel, rep # 行ごとの繰り越し・行の除外・文字列置換
+from ingest import pre2, carry_params # 繰り越しのターゲットカラムとパラメータ
+
+
+# --- 文字列の置換（rep() の繰り返し） ---
+# カラム全体に置換規則を1つずつ順に適用する（以前の append.py の rep(df, col, old, new) の繰り返しと同じ）
+def rep_chain(s, rules):
+    for old, new in rules:
+        s = s.str.replace(old, new)
+    return s
+
+# 以前の append.py の置換規則（規則の順序もそのまま）
+# 診療科目カラム（c1/c2/.../c7 を結合した文字列）
+SUBJECT_RULES = [
+    ('\\*', ''),
+    ('/*', ''),
+    ('　', '/'),
+    ('//', '/'),
+    (' ', ''),
+    ] + [('/{0}'.format(i), ':{0}'.format(i)) for i in range(1,10)]
+# 常勤・非常勤医師/歯科医師数カラム
+COUNT_RULES = [
+    ('　',''),
+    (' ',''),
+    ('常勤',''),
+    ('非',''),
+    ('医',''),
+    ('歯',''),
+    ('(',''),
+    (')',''),
+    (':',''),
+    ('*','0'),
+    ]
+# 郵便番号の区切り文字
+POST_RULES = [("ー", "-")]
+# 診療科目の集合を文字列化したもの
+SUBJECT_LIST_RULES = [
+    ('{',''),
+    ('}',''),
+    (" ", ""),
+    ("'", ""),
+    ("、", ","),
+    ("・", ","),
+    ("/", ","),
+    ] + [(chr(ord("０") + i), str(i)) for i in range(10)]
+# 診療科名から数字とコロンを削除
+SUBJECT_NAME_RULES = [(":", "")] + [(str(i), "") for i in range(10)]
+
+# 置換規則のリストと、それに対応する高速化後の正規化関数（normalize.py）
+NORMALIZERS = {
+    "subject": (SUBJECT_RULES, normalize.SUBJECT),
+    "count": (COUNT_RULES, normalize.COUNT),
+    "post": (POST_RULES, normalize.POST),
+    "subject_list": (SUBJECT_LIST_RULES, normalize.SUBJECT_LIST),
+    "subject_name": (SUBJECT_NAME_RULES, normalize.SUBJECT_NAME),
+    }
+
+
+# rep() の繰り返しの結果（ref）と高速化後の正規化の結果（out）の比較
+# NFKC正規化で変わらない値は完全に一致すること、変わる値（全角英数字・半角カナなど）は
+# rep() の結果を NFKC正規化したものと一致すること（全角・半角の統一のみによる違い）を確認する
+# convert: 比較の前に rep() の結果に適用する変換（例: 医師数の数値化、None の場合はそのまま比較）
+# 戻り値: 一致した件数、全角・半角の統一のみの違いの件数、不一致の行の位置
+def compare_normalized(s, ref, out, convert=None):
+    s, ref, out = s.reset_index(drop=True), ref.reset_index(drop=True), out.reset_index(drop=True)
+    folded = ref.map(lambda x: unicodedata.normalize("NFKC", x) if isinstance(x, str) else x, na_action="ignore")
+    if convert is not None:
+        ref, folded = convert(ref), convert(folded)
+    same = (ref == out) | (ref.isna() & out.isna())
+    changed = s.map(lambda x: isinstance(x, str) and not unicodedata.is_normalized("NFKC", x))
+    width = ~same & changed & (folded == out)
+    return int(same.sum()), int(width.sum()), list(ref.index[~same & ~width])
+
+
+# --- 縦方向の繰り越し（以前の append.py の1都道府県分の処理） ---
+# ingest.carry() と同じ手順で、繰り越しを move() の19回の呼び出し（繰り返し回数は k-row_num）で行う
+def carry(df1, m):
+    df1 = df1.reset_index(drop=True)
+    for i in pre2:
+        df1[i] = "*"
+    df1 = df1.ffill()
+    rep(df1,"type","総合病院", "総合")
+    k = len(df1)
+    for row_num, v1, v2, w in carry_params:
+        move(k - row_num, df1, row_num, v1, v2, w)
+    for i in ["現存","休止"]:
+        rdel(df1,"type",i)
+    rdel(df1,"tell","常")
+    df1["pref"] = m if m < 48 else 1
+    return df1
+
+
+# --- 和暦の日付（以前の append.py の rep() の繰り返しと行ごとの変換） ---
+# 日付文字列の標準化の置換規則（空白の除去、元年、元号と年の区切り、月・日のゼロパディング、区切りの除去）
+WAREKI_RULES = [
+    (" ", ""),
+    ("　", ""),
+    ("\t", ""),
+    (" ", ""),
+    ("元", "1"),
+    ("令", "令."),
+    ("平", "平."),
+    ("昭", "昭."),
+    ] + [(".{0}.".format(j), ".0{0}.".format(j)) for j in range(1,10) for _ in range(2)] + [(".", "")]
+
+# 日付の列を西暦の年・月・日に変換する
+# 以前の処理は解釈できない日付で停止していたため、その行は year, month, day を欠損値とし、parsed を False とする
+# 昭・平・令以外の元号（大正など）は、以前の処理では年が0のままとなるため、同じく解釈できない日付とする
+# 存在しない日付（例: 2月31日）は、以前の処理ではそのまま変換していたが、比較では解釈できない日付とする
+# 戻り値: text（標準化した文字列）, year, month, day, parsed のデータフレーム
+def wareki(s):
+    text = rep_chain(s.astype(str), WAREKI_RULES).reset_index(drop=True)
+    rows = []
+    for x in text:
+        try:
+            if "昭" in x:
+                year = 1925 + int(x[1:3])
+            elif "平" in x:
+                year = 1988 + int(x[1:3])
+            elif "令" in x:
+                year = 2018 + int(x[1:3])
+            else:
+                year = None
+            month = int(x[3:5])
+            day = int(x[5:])
+            if year is not None:
+                date(year, month, day)
+        except ValueError:
+            year = None
+        rows.append((year, month, day) if year is not None else (None, None, None))
+    out = pd.DataFrame(rows, columns=["year", "month", "day"], dtype="Int64")
+    out.insert(0, "text", text)
+    out["parsed"] = out["year"].notna()
+    out.index = s.index
+    return out
+
+
+# --- 診療科目の分類（以前の append.py の iterrows と SequenceMatcher によるループ） ---
+# 文字列間の類似度を浮動小数点数（0.0〜1.0）で定量化する
+def similar(a, b):
+    return SequenceMatcher(None, a, b).ratio()
+
+# 診療科文字列をカンマ区切りで分割する
+def split_subjects(s):
+    s = str(s).replace('，', ',')
+    if s.startswith(','):
+        s = s[1:]
+    parts = [p.strip() for p in s.split(',') if p.strip()]
+    return parts
+
+# c: 施設ごとの診療科文字列（カンマ区切り）、cref: 診療科区分のリファレンス辞書
+# 各科目について最大スコアと同点のリファレンス（複数可）のダミー変数を1とし、類似度が0の科目は分類しない
+# 同じ診療科文字列の施設は同じ結果となるため、重複のない診療科文字列についてのみループを実行する
+def classify(c, cref):
+    uniques = pd.DataFrame({'c': c.drop_duplicates().to_numpy()})
+    for k, v in cref.items():
+        uniques[v[0]] = 0
+    for i, row in uniques.iterrows():
+        subjects = split_subjects(row['c'])
+        for sub in subjects:
+            best_score = 0
+            best_k_list = []
+            for k, v in cref.items():
+                score = similar(sub, v[1])
+                if score > best_score:
+                    best_score = score
+                    best_k_list = [k]
+                elif score == best_score and score > 0:
+                    best_k_list.append(k)
+            if best_score > 0:
+                for best_k in best_k_list:
+                    uniques.at[i, cref[best_k][0]] = 1
+    out = uniques.set_index('c').reindex(c.to_numpy())
+    out.index = c.index
+    return out
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:41:37 2026
+
+@author: tkurihara827
+"""
+
+#synth.py
+#ベンチマーク用の合成データ（地方局形式のエクセルファイル）の作成
+#1つの医療機関が複数行にわたる形式（電話番号欄の常勤/非常勤の人数、登録欄の日付/事由、種別欄の病院/現存など）を再現する
+#都道府県の人口に比例した医療機関数で、全国規模（の N 倍）の地方局ファイル一式も作成できる
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+import random # 乱数による合成データの作成（シードを固定して再現可能とする）
+from concurrent.futures import ProcessPoolExecutor # 都道府県ファイルの並列作成
+import openpyxl # エクセルファイルの書き出し（write_only モードで大きなファイルも一定のメモリで作成）
+
+
+# 合成データに用いる診療科目・元号・登録事由
+SUBJECTS = [
+    "内科", "外科", "小児科", "整形外科", "眼科", "皮膚科", "歯科", "小児歯科",
+    "ﾘﾊﾋﾞﾘﾃｰｼｮﾝ科", "リハビリテーション科", "精神科", "心療内科", "消化器内科",
+    "循環器内科", "呼吸器内科", "放射線科", "麻酔科", "産婦人科", "耳鼻いんこう科",
+    "脳神経外科", "神経内科", "アレルギー科", "形成外科", "人工透析内科", "糖尿病内科",
+    "歯科口腔外科", "矯正歯科", "泌尿器科", "肛門外科", "病理診断科",
+    ]
+ERAS = ["昭", "平", "令"]
+REASONS = ["新規", "移動", "交代", "組織変更", "開設者変更", "更新", "その他", "継承", "所在地変更", "移転", "開変"]
+# 表記ゆれのある自由回答の診療科目（空白の混入・略記・半角カナ・旧称など）
+NOISY_SUBJECTS = [
+    "内　科", "小児 科", "皮ふ科", "呼吸器科", "こう門外科", "ﾋﾌ科", "胃腸科", "性病科",
+    "循環器科", "産科", "婦人科", "気管食道科", "美容外科", "内科（人工透析）", "歯科・小児歯科",
+    ]
+# 病床種別（診療科目欄に「病床種別　病床数」として現れる）
+WARDS = ["一般", "一般", "一般", "療養", "精神", "結核", "感染症"]
+# 先頭のヘッダ・メタデータ行の数（ingest.pre0 と同じ）
+HEADER_ROWS = 11
+
+# 全国の医療機関数（医科・歯科の一覧表の合計のおおよその値、倍率 1 の場合）
+NATIONAL = 180_000
+# 都道府県の人口（千人、2020年国勢調査のおおよその値）。北海道は2つのファイル（1, 48）に等分する
+POPULATION = [
+    5225, 1238, 1211, 2302, 960, 1068, 1833, 2867, 1933, 1939, 7345, 6284, 14048, 9237, 2201, 1035,
+    1133, 767, 810, 2048, 1979, 3633, 7542, 1770, 1414, 2578, 8838, 5465, 1324, 923, 553, 671,
+    1888, 2800, 1342, 720, 950, 1335, 692, 5135, 811, 1312, 1738, 1124, 1070, 1588, 1467,
+    ]
+
+
+# 和暦の日付（例: 平 5. 4. 1）
+def wareki_date(r):
+    y = r.choice(["元"] + [str(i) for i in range(1, 30)])
+    return f"{r.choice(ERAS)}{y:>2}.{r.randint(1,12):>2}.{r.randint(1,28):>2}"
+
+# 1つの医療機関のレコード（複数行、各行10カラム）
+def record(r, i):
+    n = r.randint(4, 9)
+    rows = [[None] * 10 for _ in range(n)]
+    rows[0][0] = i
+    rows[0][1] = f"{r.randint(0,99):02d},{r.randint(1000,9999)},{r.randint(0,9)}"
+    rows[0][2] = f"施設{i}"
+    rows[0][3] = f"〒{r.randint(100,999)}{r.choice(['-','ー'])}{r.randint(1000,9999)}{r.choice(['中央区','北区','南市'])}{r.randint(1,9)}丁目{r.randint(1,30)}"
+    # 電話番号欄：電話番号と常勤・非常勤の医師/歯科医師数
+    tell = [
+        f"0{r.randint(10,99)}-{r.randint(100,999)}-{r.randint(1000,9999)}",
+        f"常　勤:{r.randint(0,20):>4}",
+        f"(医{r.randint(0,9):>4})",
+        f"(歯{r.randint(0,3):>4})",
+        f"非常勤:{r.randint(0,9):>4}",
+        f"(医 {r.randint(0,9)})",
+        f"(歯 {r.randint(0,2)})",
+        ]
+    for k in range(min(n, len(tell))):
+        rows[k][4] = tell[k]
+    rows[0][5] = f"開設者{r.randint(1,50)}"
+    rows[0][6] = f"管理者{r.randint(1,50)}"
+    # 登録欄：登録日、登録事由、開始日
+    register = [wareki_date(r), r.choice(REASONS), wareki_date(r)]
+    for k in range(min(n, len(register))):
+        rows[k][7] = register[k]
+    # 診療科目欄（全角スペース区切り、病床数を含む場合がある）
+    # 空欄の行は繰り越し処理でプレースホルダ（*）となる
+    for k in range(min(n, 7)):
+        if k == 0 or r.random() < 0.7:
+            s = "　".join(r.sample(SUBJECTS, r.randint(1, 3)))
+            if r.random() < 0.1:
+                s += "　" + r.choice(NOISY_SUBJECTS)
+            if r.random() < 0.2:
+                s += f"　{r.choice(WARDS)}　{r.randint(1,200)}"
+            rows[k][8] = s
+    # 種別欄：病院/診療所、タグ、現存/休止
+    hospital = r.random() < 0.3
+    typ = [r.choice(["病院", "総合病院"]) if hospital else "診療所"]
+    if hospital and r.random() < 0.3:
+        typ += [r.choice(["地域支援", "特定機能", "療養病床"])]
+    typ += [r.choice(["現存"] * 8 + ["休止"])]
+    for k in range(min(n, len(typ))):
+        rows[k][9] = typ[k]
+    return rows
+
+# 1つの地方局形式のエクセルファイルの作成（nrec: 医療機関数、seed: 乱数のシード）
+def workbook(path, nrec, seed):
+    r = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for j in range(HEADER_ROWS):
+        ws.append([f"header{j}"])
+    for i in range(1, nrec + 1):
+        for row in record(r, i):
+            ws.append(row)
+    wb.save(path)
+    return path
+
+# 都道府県番号ごとのファイル（{raw_dir}/{m}.xlsx）の作成
+def raw_dir(d, nrec, prefs=range(1,49)):
+    os.makedirs(d, exist_ok=True)
+    return [workbook(f"{d}/{m}.xlsx", nrec, m) for m in prefs]
+
+# ファイル番号ごとの医療機関数（全国で total 件を人口に比例して配分、各ファイル1件以上）
+def national_counts(total=NATIONAL):
+    pop = [POPULATION[0] / 2] + POPULATION[1:] + [POPULATION[0] / 2]
+    s = sum(pop)
+    return {m: max(1, round(total * p / s)) for m, p in zip(range(1, 49), pop)}
+
+# 全国規模の地方局ファイル一式（{d}/{m}.xlsx, m=1,...,48）の作成
+# scale: 全国の医療機関数（total）に対する倍率（例: 1, 5, 20）、workers: 並列に作成するプロセス数
+# 同じ引数からは常に同じファイルが作成される（ファイル番号を乱数のシードとする）
+def national(d, scale=1, total=NATIONAL, workers=None):
+    os.makedirs(d, exist_ok=True)
+    counts = national_counts(round(total * scale))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = [ex.submit(workbook, f"{d}/{m}.xlsx", n, m) for m, n in counts.items()]
+        return [f.result() for f in futures]
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:58:07 2026
+
+@author: tkurihara827
+"""
+
+#bitmap.py
+#診療科目（63科目）と施設種別フラグ（7種）のビットマップ索引と、論理式・都道府県・市区町村による絞り込み
+#（例: "hospital & tokutei & cardiology & pulmonology" を東京都（13）に限定して件数・医療機関のidを求める）
+
+# ==============================================================================
+# 1. 設定の外部化と作業ディレクトリの設定
+# ==============================================================================
+
+# ライブラリのインポート
+import os # オペレーティングシステムレベルの機能、特にファイルパス操作のために利用
+import ast # 絞り込みの論理式の構文解析（eval は使わない）
+import json # 索引のメタ情報（属性名・都道府県と市区町村の行範囲）の保存
+import time # 処理時間の表示
+import argparse # コマンドライン引数（絞り込みの論理式）の解釈
+import unicodedata # 属性名（日本語の科目名）の全角・半角の統一
+from functools import lru_cache # 解析済みの論理式の再利用
+import numpy as np # ビット列（64ビット整数の配列）の論理演算
+import storage # append.pyが出力した列指向形式の中間ファイルの読み込み
+from specialty import CREF, TYPE_FLAGS, SUBJECT_COLUMNS, TYPE_FLAG_COLUMNS # 診療科目のダミー変数・施設種別フラグのカラム名
+
+# 外部化された設定変数
+# 作業ディレクトリ名（例: 'test2'）
+WORKDIR_NAME = 'r512'
+# 処理対象データの時間的コホートを識別するキー（例: 和暦5年12月）
+DATA_MONTH = 'r0512'
+
+# ベースディレクトリ指定
+BASE_DIR = f'/Users/tkurihara/Desktop/v.1.0.0/{WORKDIR_NAME}'
+
+# append.pyの中間データの保存形式（append.pyの INTERMEDIATE_FORMAT と同じものを指定）
+INTERMEDIATE_FORMAT = 'parquet'
+
+# --- 派生パスの定義 ---
+MERGE_DIR = DATA_MONTH + 'merge'
+TOTAL2_DATA = os.path.join(MERGE_DIR, 'total2')
+# ビットマップ索引の保存先（ディレクトリ）
+BITMAP_DIR = os.path.join(MERGE_DIR, 'bitmap')
+
+
+# --- 索引の対象 ---
+# ビットマップを作成する属性（0/1 のカラム、この順に1行ずつビット列を持つ）
+ATTRIBUTES = SUBJECT_COLUMNS + TYPE_FLAG_COLUMNS
+# 論理式で使える日本語の別名（科目名・施設種別のキーワード -> カラム名、全角・半角は統一して照合）
+ALIASES = {**{unicodedata.normalize("NFKC", v[1]): v[0] for v in CREF.values()}, **{v: k for k, v in TYPE_FLAGS.items()}}
+# 市区町村コードのカラム（存在しない場合は市区町村による絞り込みはできない）
+CITY_COLUMN = 'city_code'
+
+
+# ==============================================================================
+# 2. ビット列の操作
+# ==============================================================================
+
+# 真偽値の配列を64ビット整数のビット列に詰める（行 r はワード r // 64 の下位から r % 64 番目のビット）
+def pack(b):
+    bytes_ = np.packbits(np.asarray(b, dtype=bool), bitorder="little")
+    return np.pad(bytes_, (0, -len(bytes_) % 8)).view("<u8")
+
+
+# ビット列の立っているビットの位置（行の位置）
+def unpack(words, offset=0):
+    return np.flatnonzero(np.unpackbits(np.ascontiguousarray(words).view(np.uint8), bitorder="little")) + offset
+
+
+# 8ビットの値ごとの立っているビットの数（np.bitwise_count のない NumPy 2.0 未満で利用）
+POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# ビット列の立っているビットの数
+def popcount(words):
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(words).sum())
+    return int(POPCOUNT8[np.ascontiguousarray(words).view(np.uint8)].sum(dtype=np.int64))
+
+
+# 行の範囲 [lo, hi) のビットだけを立てたビット列（ワード lo // 64 から始まる部分）
+def span(lo, hi):
+    w0 = lo // 64
+    bits = np.zeros((-(-hi // 64) - w0) * 64, dtype=bool)
+    bits[lo - w0 * 64:hi - w0 * 64] = True
+    return pack(bits)
+
+
+# ==============================================================================
+# 3. 絞り込みの論理式
+# ==============================================================================
+
+# 論理式の属性名をカラム名に変換（カラム名、または日本語の科目名・施設種別のキーワード）
+def attribute(name):
+    if name in ATTRIBUTES:
+        return name
+    key = unicodedata.normalize("NFKC", name)
+    if key in ALIASES:
+        return ALIASES[key]
+    raise KeyError(f"未知の属性です: {name}")
+
+
+# 論理式を解析し、属性名 -> ビット列の関数を受け取ってビット列を返す関数に変換する
+# 使える演算子: & | ^ ~（and / or / not も可）と括弧。属性名は Python の識別子として解析される
+@lru_cache(maxsize=256)
+def compile_expr(expr):
+    def build(node):
+        if isinstance(node, ast.Expression):
+            return build(node.body)
+        if isinstance(node, ast.Name):
+            col = attribute(node.id)
+            return lambda get, mask: get(col)
+        if isinstance(node, ast.BinOp) and type(node.op) in (ast.BitAnd, ast.BitOr, ast.BitXor):
+            op = {ast.BitAnd: np.bitwise_and, ast.BitOr: np.bitwise_or, ast.BitXor: np.bitwise_xor}[type(node.op)]
+            left, right = build(node.left), build(node.right)
+            return lambda get, mask: op(left(get, mask), right(get, mask))
+        if isinstance(node, ast.BoolOp):
+            op = np.bitwise_and if isinstance(node.op, ast.And) else np.bitwise_or
+            terms = [build(v) for v in node.values]
+            return lambda get, mask: op.reduce([t(get, mask) for t in terms])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Invert, ast.Not)):
+            # 否定は範囲外のビットを立てないよう、範囲のビット列との論理積をとる
+            operand = build(node.operand)
+            return lambda get, mask: ~operand(get, mask) & mask
+        raise ValueError(f"論理式に使えない要素です: {ast.dump(node)}")
+
+    try:
+        tree = ast.parse(expr.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"論理式を解釈できません: {expr}") from e
+    return build(tree)
+
+
+# ==============================================================================
+# 4. 医療機関のビットマップ索引
+# ==============================================================================
+
+class FacilityBitmap:
+    # bits: 属性ごとのビット列（属性の数 x ワード数、uint64）
+    # ids: 行の位置 -> 医療機関の id
+    # meta: 属性名、行数、都道府県・市区町村ごとの行範囲 [開始, 終了)
+    # 行は都道府県・市区町村の順に並べ替えてあるため、地域による絞り込みは連続する行範囲（ワード範囲）の切り出しになる
+    def __init__(self, bits, ids, meta):
+        self.bits = bits
+        self.ids = ids
+        self.meta = meta
+        self.row = {name: i for i, name in enumerate(meta["attributes"])}
+
+    # 最終データセット（total2 / total3）から作成
+    @classmethod
+    def build(cls, df):
+        city = df[CITY_COLUMN].astype(object).where(df[CITY_COLUMN].notna(), "").astype(str).to_numpy() if CITY_COLUMN in df else np.full(len(df), "")
+        pref = df["pref"].astype(int).to_numpy()
+        order = np.lexsort((city, pref))
+        pref, city = pref[order], city[order]
+
+        # 属性ごとのビット列
+        bits = np.stack([pack(df[c].to_numpy()[order] == 1) for c in ATTRIBUTES]) if len(df) else np.zeros((len(ATTRIBUTES), 0), dtype="<u8")
+
+        # 都道府県・市区町村ごとの行範囲（並べ替え済みのため、値が変わる位置で区切る）
+        def ranges(keys):
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=int)
+            ends = np.r_[starts[1:], len(keys)]
+            return {str(keys[s]): [int(s), int(e)] for s, e in zip(starts, ends) if str(keys[s])}
+
+        meta = {
+            "n": int(len(df)),
+            "attributes": ATTRIBUTES,
+            "pref": ranges(pref),
+            "city": ranges(city) if CITY_COLUMN in df else {},
+        }
+        return cls(bits, df["id"].to_numpy()[order], meta)
+
+    # 保存（ディレクトリに bits.npy, ids.npy, meta.json）
+    def save(self, base):
+        os.makedirs(base, exist_ok=True)
+        np.save(os.path.join(base, "bits.npy"), np.ascontiguousarray(self.bits))
+        np.save(os.path.join(base, "ids.npy"), self.ids)
+        with open(os.path.join(base, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+
+    # 読み込み（mmap=True の場合はメモリマップし、参照したワードだけが読み込まれる）
+    @classmethod
+    def load(cls, base, mmap=True):
+        mode = "r" if mmap else None
+        bits = np.load(os.path.join(base, "bits.npy"), mmap_mode=mode)
+        ids = np.load(os.path.join(base, "ids.npy"), mmap_mode=mode, allow_pickle=False)
+        with open(os.path.join(base, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(bits, ids, meta)
+
+    def __len__(self):
+        return self.meta["n"]
+
+    # 絞り込みの行範囲（pref / city: 1つの値または値のリスト、None は全国）
+    def _ranges(self, pref=None, city=None):
+        if city is not None:
+            if not self.meta["city"]:
+                raise KeyError(f"索引に市区町村コード（{CITY_COLUMN}）が含まれていません")
+            keys, table = city, self.meta["city"]
+        elif pref is not None:
+            keys, table = pref, self.meta["pref"]
+        else:
+            return [(0, self.meta["n"])] if self.meta["n"] else []
+        keys = [keys] if isinstance(keys, (str, int, np.integer)) else keys
+        out = [tuple(table[str(k)]) for k in keys if str(k) in table]
+        # 市区町村と都道府県の両方が指定された場合は、その都道府県に属する市区町村に限る
+        if city is not None and pref is not None:
+            prefs = [tuple(self.meta["pref"][str(p)]) for p in ([pref] if isinstance(pref, (str, int, np.integer)) else pref) if str(p) in self.meta["pref"]]
+            out = [(lo, hi) for lo, hi in out if any(plo <= lo and hi <= phi for plo, phi in prefs)]
+        return sorted(out)
+
+    # 行範囲ごとの論理式の評価結果（ワードの開始位置とビット列）
+    def _eval(self, expr, pref=None, city=None):
+        fn = compile_expr(expr)
+        for lo, hi in self._ranges(pref, city):
+            w0, w1 = lo // 64, -(-hi // 64)
+            mask = span(lo, hi)
+            # 範囲の端のワードに含まれる範囲外の行は、範囲のビット列との論理積で除く
+            yield w0, fn(lambda col: self.bits[self.row[col], w0:w1], mask) & mask
+
+    # 条件に合う医療機関の件数
+    def count(self, expr, pref=None, city=None):
+        return sum(popcount(words) for _, words in self._eval(expr, pref, city))
+
+    # 条件に合う行の位置（索引内の行の位置）
+    def rows(self, expr, pref=None, city=None):
+        parts = [unpack(words, w0 * 64) for w0, words in self._eval(expr, pref, city)]
+        return np.concatenate(parts) if parts else np.array([], dtype=np.int64)
+
+    # 条件に合う医療機関の id
+    def query(self, expr, pref=None, city=None):
+        return np.asarray(self.ids[self.rows(expr, pref, city)])
+
+    # 都道府県ごとの件数（集計表示用）
+    def count_by_pref(self, expr):
+        return {int(p): self.count(expr, pref=p) for p in self.meta["pref"]}
+
+
+if __name__ == '__main__':
+    # コマンドライン引数（論理式を指定した場合は、作成・読み込み後に件数を表示する）
+    parser = argparse.ArgumentParser(description="診療科目・施設種別フラグのビットマップ索引の作成と検索")
+    parser.add_argument("expr", nargs="?", help="絞り込みの論理式（例: 'hospital & tokutei & cardiology'）")
+    parser.add_argument("--pref", type=int, nargs="*", help="都道府県番号（複数可）")
+    parser.add_argument("--city", nargs="*", help="市区町村コード（複数可）")
+    parser.add_argument("--rebuild", action="store_true", help="索引を作り直す")
+    args, _ = parser.parse_known_args()
+
+    # 作業ディレクトリの変更
+    try:
+        os.chdir(BASE_DIR)
+        print(f"作業ディレクトリ: {os.getcwd()}")
+    except FileNotFoundError:
+        print(f"エラー: 指定されたディレクトリ '{BASE_DIR}' が見つかりません。パスを確認してください。")
+
+    t = time.perf_counter()
+    if args.rebuild or not os.path.exists(os.path.join(BITMAP_DIR, "meta.json")):
+        # 索引に用いるカラム（id・都道府県・診療科目・施設種別・市区町村コード）のみを読み込む
+        columns = ["id", "pref"] + ATTRIBUTES
+        if CITY_COLUMN in storage.columns(TOTAL2_DATA, INTERMEDIATE_FORMAT):
+            columns.append(CITY_COLUMN)
+        index = FacilityBitmap.build(storage.read(TOTAL2_DATA, INTERMEDIATE_FORMAT, columns=columns))
+        index.save(BITMAP_DIR)
+        print(f"ビットマップ索引を作成しました: {BITMAP_DIR}（{len(index)} 件、{len(ATTRIBUTES)} 属性）")
+    else:
+        index = FacilityBitmap.load(BITMAP_DIR)
+    if args.expr:
+        print(f"{args.expr}: {index.count(args.expr, args.pref, args.city)} 件")
+    print(f"処理時間: {time.perf_counter() - t:.2f} 秒")
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 07:02:15 2026
+
+@author: tkurihara827
+"""
+
+#csis.py
+#CSV Geocoding Service（東京大学空間情報科学研究センター）と同じ形式のCSVの送受信を行うジオコーディングサービスのクライアント
+#address.csv の住所を一定の件数ずつまとめて並行して送信し、結果を記録（ジャーナル）に追記しながら address_out.csv（経度 fX、緯度 fY）を作成する
+
+#########
+# 要求: multipart/form-data で、CSVファイル（file、UTF-8）と、住所のカラムの位置（column、1始まり）・
+#       検索対象（series）・測地系（geosys）・文字コード（charset）を送る
+# 応答: 送ったCSVの各行の後ろに LocName（照合した地名）, fX（経度）, fY（緯度）, iConf（信頼度）, iLvl（照合の水準）を加えたCSV
+# 同じ形式で応答するサービスであれば、ほかのエンドポイントでもよい（動作確認用のスタブは bench/csis_stub.py）
+# 完了したまとまりは記録（GEOCODE_JOURNAL）に追記するため、中断した場合も再実行すると続きから送信する
+#########
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+import io # CSVの文字列の読み書き
+import csv # 要求・応答のCSVの作成と解釈
+import json # 記録（JSON Lines）の読み書き
+import time # 処理時間の表示
+import uuid # multipart/form-data の境界文字列
+import random # 再送の待ち時間のゆらぎ
+import socket # 応答の読み込みの待ち時間切れ（Python 3.9 以前は TimeoutError の派生クラスではない）
+import asyncio # 複数の要求の並行実行と、同時に送る要求の数の制限
+import urllib.error # HTTPのエラー（再送するかの判定）
+import urllib.request # HTTPの要求（標準ライブラリ、別スレッドで実行する）
+import pandas as pd # address.csv の読み込みと address_out.csv の書き出し
+from manifest import config_hash # 記録が同じ設定（エンドポイント・検索対象・測地系）のものかの判定
+
+# 応答のCSVで送ったカラムの後ろに加わるカラム
+RESULT_COLUMNS = ["LocName", "fX", "fY", "iConf", "iLvl"]
+
+# 既定の検索対象（ADDRESS: 街区レベル位置参照情報などの住所）・測地系（world: 世界測地系）・文字コード
+SERIES = 'ADDRESS'
+GEOSYS = 'world'
+CHARSET = 'UTF8'
+
+# 再送する HTTP のステータスコード（混雑・一時的な障害）
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+# --- 要求と応答 ---
+# 1つのまとまりの要求の本文（multipart/form-data）
+# 送るCSVは「まとまり内の行番号, 住所」（応答の行を行番号で対応づけ、行の欠落・並べ替えがあってもずれないようにする）
+def encode(addresses, series=SERIES, geosys=GEOSYS):
+    f = io.StringIO()
+    w = csv.writer(f, lineterminator="\r\n")
+    w.writerow(["no", "address"])
+    w.writerows(enumerate(addresses))
+    boundary = uuid.uuid4().hex
+    fields = {"column": "2", "series": series, "geosys": geosys, "charset": CHARSET, "header": "1"}
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n' for k, v in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="address.csv"\r\n'
+                 f'Content-Type: text/csv; charset=utf-8\r\n\r\n{f.getvalue()}\r\n--{boundary}--\r\n')
+    return "".join(parts).encode("utf-8"), f"multipart/form-data; boundary={boundary}"
+
+# 応答のCSVから、まとまり内の行番号ごとの結果（LocName, fX, fY, iConf, iLvl）を取り出す
+# 戻り値: 結果のリスト（送った住所の順、n 件）。行が足りない場合はエラー
+def decode(text, n):
+    out = [None] * n
+    for row in csv.reader(io.StringIO(text.lstrip("\ufeff"))):
+        if not row or not row[0].strip().isdigit():
+            continue  # 見出し行・空行
+        i = int(row[0])
+        if i < n and out[i] is None:
+            out[i] = row[-len(RESULT_COLUMNS):]
+    missing = sum(r is None for r in out)
+    if missing:
+        raise ValueError(f"応答に {missing} / {n} 件の結果がありません")
+    return out
+
+
+# --- 記録（ジャーナル） ---
+class Journal:
+    # 住所ごとの結果の記録（JSON Lines、1行目は設定のハッシュ値、以降は1行1住所）
+    # 設定が異なる記録は破棄して作り直す
+    def __init__(self, path, config):
+        self.path = path
+        self.config = config_hash(config)
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8", newline="") as f:
+                text = f.read()
+            lines = text.split("\n")
+            # 最後の改行より後ろ（中断で途中まで書かれた行）は切り詰め、続きを次の行から追記する
+            tail = lines.pop()
+            if tail:
+                os.truncate(path, len(text[:-len(tail)].encode("utf-8")))
+            try:
+                same = bool(lines) and json.loads(lines[0]).get("config") == self.config
+            except json.JSONDecodeError:
+                same = False
+            if same:
+                for line in lines[1:]:
+                    r = json.loads(line)
+                    self.done[r["address"]] = r["result"]
+        if not self.done:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(json.dumps({"config": self.config}) + "\n")
+        self.f = open(path, "a", encoding="utf-8", newline="")
+
+    # 1つのまとまりの結果の追記（書き込みを確定させてから完了とする）
+    def add(self, addresses, results):
+        self.f.write("".join(json.dumps({"address": a, "result": r}, ensure_ascii=False) + "\n" for a, r in zip(addresses, results)))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.done.update(zip(addresses, results))
+
+    def close(self):
+        self.f.close()
+
+
+# --- クライアント ---
+class Client:
+    # endpoint: ジオコーディングサービスのURL
+    # batch_size: 1回の要求で送る住所の数、concurrency: 同時に送る要求の数の上限
+    # retries: 再送の回数の上限、backoff: 最初の再送までの待ち時間（秒、再送のたびに2倍）、timeout: 1回の要求の待ち時間（秒）
+    def __init__(self, endpoint, batch_size=1000, concurrency=4, retries=5, backoff=1.0, timeout=120, series=SERIES, geosys=GEOSYS):
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.series = series
+        self.geosys = geosys
+        self.requests = 0
+        self.retried = 0
+
+    # 記録の設定（この設定が変わった場合は、記録を破棄して送り直す）
+    def config(self):
+        return {"endpoint": self.endpoint, "series": self.series, "geosys": self.geosys}
+
+    # 1回の要求（別スレッドで実行する）
+    def post(self, body, content_type):
+        req = urllib.request.Request(self.endpoint, data=body, headers={"Content-Type": content_type}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.timeout) as res:
+            return res.read().decode("utf-8")
+
+    # 1つのまとまりの送信（混雑・一時的な障害・接続の失敗は待ち時間を倍にしながら再送する）
+    async def send(self, addresses, limit):
+        body, content_type = encode(addresses, self.series, self.geosys)
+        for attempt in range(self.retries + 1):
+            async with limit:
+                try:
+                    self.requests += 1
+                    text = await asyncio.get_running_loop().run_in_executor(None, self.post, body, content_type)
+                    return decode(text, len(addresses))
+                except urllib.error.HTTPError as e:
+                    if e.code not in RETRY_STATUS or attempt == self.retries:
+                        raise
+                    # Retry-After（秒）があればそれに従う
+                    after = e.headers.get("Retry-After", "")
+                    wait = float(after) if after.isdigit() else None
+                except (urllib.error.URLError, socket.timeout, TimeoutError, ConnectionError):
+                    if attempt == self.retries:
+                        raise
+                    wait = None
+            # 待っている間はほかのまとまりに同時送信の枠を譲る
+            self.retried += 1
+            await asyncio.sleep(wait if wait is not None else self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+    # 住所のリストのジオコーディング（記録にない住所のみを送り、結果を記録に追記する）
+    # 戻り値: 失敗したまとまりの数と、最初のエラー
+    async def run(self, addresses, journal):
+        todo = list(dict.fromkeys(a for a in addresses if a not in journal.done))
+        batches = [todo[i:i + self.batch_size] for i in range(0, len(todo), self.batch_size)]
+        limit = asyncio.Semaphore(self.concurrency)
+        errors = []
+        t = time.perf_counter()
+        done = []
+
+        async def one(batch):
+            try:
+                journal.add(batch, await self.send(batch, limit))
+            except Exception as e:
+                errors.append(e)
+                return
+            # 10回ごとに進捗を表示
+            done.append(len(batch))
+            if len(done) % 10 == 0 or len(done) == len(batches):
+                print(f"  {sum(done):,} / {len(todo):,} 件（{time.perf_counter() - t:.0f} 秒）")
+
+        if batches:
+            print(f"ジオコーディング: {len(todo):,} 件を {len(batches)} 回に分けて送信します（記録済み {len(journal.done):,} 件、同時 {self.concurrency} 件）")
+        await asyncio.gather(*(one(b) for b in batches))
+        return len(errors), (errors[0] if errors else None)
+
+
+# --- address.csv から address_out.csv の作成 ---
+# address_csv: append.py が出力したジオコーディング用のファイル（ID、郵便番号、住所、ヘッダなし）
+# address_out_csv: gis.py が読み込む結果ファイル（id, post, address, LocName, fX, fY, iConf, iLvl）
+# journal: 結果の記録のパス（中断後の再実行では、記録済みの住所は送信しない）
+# 送信に失敗した住所がある場合は、記録を残したまま address_out.csv を書き出さずにエラーとする
+def geocode(address_csv, address_out_csv, journal, endpoint, **options):
+    client = Client(endpoint, **options)
+    df4 = pd.read_csv(address_csv, header=None, names=['id', 'post', 'address'], dtype=str, encoding="utf-8-sig")
+    addresses = df4['address'].fillna('').tolist()
+    j = Journal(journal, client.config())
+    try:
+        failed, error = asyncio.run(client.run(addresses, j))
+    finally:
+        j.close()
+    print(f"  要求 {client.requests} 回（再送 {client.retried} 回）")
+    if failed:
+        raise RuntimeError(f"{failed} 回分の住所の送信に失敗しました（{error!r}）。再実行すると、記録（{journal}）の続きから送信します。")
+    results = pd.DataFrame([j.done[a] for a in addresses], columns=RESULT_COLUMNS)
+    results['fX'] = pd.to_numeric(results['fX'], errors='coerce')
+    results['fY'] = pd.to_numeric(results['fY'], errors='coerce')
+    out = pd.concat([df4, results], axis=1)
+    # 経度（fX）・緯度（fY）・照合の水準（iLvl）を持つ address_out.csv を出力（gis.pyの入力）
+    out.to_csv(address_out_csv, index=False, encoding="utf-8-sig")
+    counts = out['iLvl'].value_counts()
+    print(f"ジオコーディング: {len(out)} 件（照合の水準 " + " / ".join(f"{k}: {v}" for k, v in counts.sort_index().items()) + "）")
+    return out
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 02:26:05 2026
+
+@author: tkurihara827
+"""
+
+#cube.py
+#最終データセット（total2）を都道府県（・市区町村）× 施設の種類ごとに集計した集計表（キューブ）の作成
+#医療機関数・診療科目ごとの医療機関数・施設種別フラグ・病床数・医師数の合計を、データ月で分割して保存する
+
+# ==============================================================================
+# 1. 設定の外部化と作業ディレクトリの設定
+# ==============================================================================
+
+# ライブラリのインポート
+import os # オペレーティングシステムレベルの機能、特にファイルパス操作のために利用
+import argparse # コマンドライン引数（データ月のリスト）の解釈
+import numpy as np # 施設の種類の判定
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+import pyarrow as pa # 列指向形式のテーブルへの変換
+import pyarrow.dataset as ds # データ月で分割したデータセットの書き出し
+import pyarrow.parquet as pq # 読み込み時の絞り込み条件の変換
+import storage # append.pyが出力した列指向形式の中間ファイルの読み込み
+from specialty import SUBJECT_COLUMNS, TYPE_FLAG_COLUMNS # 診療科目のダミー変数・施設種別フラグのカラム名
+from beds import BED_COLUMNS # 病床種別ごとの病床数のカラム名
+from schema import DOCTOR_COLUMNS # 常勤・非常勤医師/歯科医師数のカラム名
+
+# 外部化された設定変数
+# 作業ディレクトリ名（例: 'r512'）
+WORKDIR_NAME = 'r512'
+# 集計するデータ月（コマンドライン引数で指定しない場合）
+MONTHS = ['r0512']
+
+# ベースディレクトリ指定
+BASE_DIR = f'/Users/tkurihara/Desktop/v.1.0.0/{WORKDIR_NAME}'
+
+# append.pyの中間データの保存形式（append.pyの INTERMEDIATE_FORMAT と同じものを指定）
+INTERMEDIATE_FORMAT = 'parquet'
+
+# 集計表の出力先（BASE_DIR直下）
+# CUBE_DIR/month=r0512/part-0.parquet のように、データ月で分割して保存する（データ月ごとに置き換え可能）
+CUBE_DIR = 'cube'
+
+
+# --- 集計の軸と集計する値 ---
+# 市区町村コードのカラム（最終データセットにある場合のみ軸に加える）
+CITY_COLUMN = 'city_code'
+# 施設の種類（病院・診療所・その他、施設種別フラグから排他的に判定）
+KIND_COLUMN = 'kind'
+# 合計する値（施設種別フラグ・診療科目は該当する医療機関数、病床数・医師数は合計）
+MEASURES = TYPE_FLAG_COLUMNS + SUBJECT_COLUMNS + BED_COLUMNS + ['n_bed_sum'] + DOCTOR_COLUMNS
+
+
+# --- 集計表の作成 ---
+# 施設の種類（病院フラグを優先し、どちらのフラグもない場合は 'other'）
+def facility_kind(df):
+    kind = np.select([df['hospital'].to_numpy() == 1, df['clinic'].to_numpy() == 1], ['hospital', 'clinic'], 'other')
+    return pd.Categorical(kind, categories=['hospital', 'clinic', 'other'])
+
+# 1つのデータ月の集計表
+# 都道府県（・市区町村）× 施設の種類ごとに、医療機関数（n_facilities）と MEASURES の合計を1回の groupby で求める
+# 最終データセットにないカラム（以前の版の出力の病床種別など）は集計しない
+def build(df):
+    keys = ['pref'] + ([CITY_COLUMN] if CITY_COLUMN in df else []) + [KIND_COLUMN]
+    measures = [c for c in MEASURES if c in df]
+    frame = pd.DataFrame({
+        'pref': df['pref'].astype(int).to_numpy(),
+        **({CITY_COLUMN: df[CITY_COLUMN].astype('string').to_numpy()} if CITY_COLUMN in df else {}),
+        KIND_COLUMN: facility_kind(df),
+        'n_facilities': np.ones(len(df), dtype=np.int32),
+        # 欠損値は0として合計する
+        **{c: df[c].fillna(0).to_numpy(dtype=np.int32) for c in measures},
+    })
+    cube = frame.groupby(keys, observed=True, dropna=False, sort=True).sum().reset_index()
+    cube[KIND_COLUMN] = cube[KIND_COLUMN].astype(str)
+    return cube
+
+# 1つのデータ月の集計表の保存（同じデータ月の既存の分割ファイルは置き換える）
+def write_month(cube, month, base=CUBE_DIR):
+    cube = cube.assign(month=month)
+    ds.write_dataset(
+        pa.Table.from_pandas(cube, preserve_index=False),
+        base,
+        format='parquet',
+        partitioning=['month'],
+        partitioning_flavor='hive',
+        existing_data_behavior='delete_matching',
+        basename_template='part-{i}.parquet',
+    )
+
+# 集計表の読み込み（filters: 例 [('month', '=', 'r0512'), ('pref', '=', 13)]）
+# データ月によってカラムが異なる場合（市区町村コードの有無など）は、すべてのデータ月のカラムをそろえて読み込む（ないものは欠損値）
+def read_cube(columns=None, filters=None, base=CUBE_DIR):
+    dataset = ds.dataset(base, format='parquet', partitioning='hive')
+    schema = pa.unify_schemas([f.physical_schema for f in dataset.get_fragments()] + [dataset.partitioning.schema])
+    dataset = ds.dataset(base, schema=schema, format='parquet', partitioning='hive')
+    expr = pq.filters_to_expression(filters) if filters else None
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+# 最終データセット（{month}merge/total2）からの集計表の作成と保存
+# df: 最終データセット（append.py から呼び出す場合、None の場合は中間ファイルから読み込む）
+def update_month(month, df=None, base=CUBE_DIR, fmt=INTERMEDIATE_FORMAT):
+    if df is None:
+        df = storage.read(os.path.join(month + 'merge', 'total2'), fmt)
+    cube = build(df)
+    write_month(cube, month, base)
+    print(f"集計表: {month} {len(cube)} 行（{base}/month={month}）")
+    return cube
+
+
+# ==============================================================================
+# 2. データ処理（スクリプトとして実行された場合のみ）
+# ==============================================================================
+if __name__ == '__main__':
+    # コマンドライン引数（Spyderなどから引数なしで実行した場合は上記の設定値を使用）
+    parser = argparse.ArgumentParser(description="都道府県・市区町村 × 施設の種類ごとの集計表をデータ月ごとに作成")
+    parser.add_argument("months", nargs="*", default=MONTHS, help="集計するデータ月（例: r0512 r0603）")
+    args, _ = parser.parse_known_args()
+
+    # 作業ディレクトリの変更
+    try:
+        os.chdir(BASE_DIR)
+        print(f"作業ディレクトリ: {os.getcwd()}")
+    except FileNotFoundError:
+        print(f"エラー: 指定されたディレクトリ '{BASE_DIR}' が見つかりません。パスを確認してください。")
+
+    for m in args.months:
+        update_month(m)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:52:19 2026
+
+@author: tkurihara827
+"""
+
+#delta.py
+#2つのデータ月の最終データセット（total2）を医療機関コードで突き合わせ、
+#新規（added）・廃止（removed）・変更（changed）の医療機関を出力
+
+# ==============================================================================
+# 1. 設定の外部化と作業ディレクトリの設定
+# ==============================================================================
+
+# ライブラリのインポート
+import os # オペレーティングシステムレベルの機能、特にファイルパス操作のために利用
+import time # 処理時間の表示
+import argparse # コマンドライン引数（比較するデータ月）の解釈
+import numpy as np # 変更箇所のマスクの一括計算
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+import storage # append.pyが出力した列指向形式の中間ファイルの読み込み
+from normalize import normalize, CODE # 医療機関コードの正規化
+from specialty import SUBJECT_COLUMNS # 診療科目のダミー変数カラム名（63科目）
+from beds import BED_COLUMNS # 病床種別ごとの病床数のカラム名
+
+# 外部化された設定変数
+# 作業ディレクトリ名（例: 'r512'）
+WORKDIR_NAME = 'r512'
+# 比較するデータ月（OLD_MONTH -> NEW_MONTH の変化を出力）
+OLD_MONTH = 'r0512'
+NEW_MONTH = 'r0603'
+
+# ベースディレクトリ指定（各データ月の {DATA_MONTH}merge ディレクトリを含むもの）
+BASE_DIR = f'/Users/tkurihara/Desktop/v.1.0.0/{WORKDIR_NAME}'
+
+# append.pyの中間データの保存形式（append.pyの INTERMEDIATE_FORMAT と同じものを指定）
+INTERMEDIATE_FORMAT = 'parquet'
+
+# 差分の出力先（BASE_DIR直下）
+DELTA_DIR = 'delta'
+
+
+# --- 突き合わせと比較の対象 ---
+# 突き合わせのキー（都道府県番号 + 医療機関コード）
+KEY = 'code'
+# 出力に含める識別情報（新しいデータ月の値）
+INFO_COLUMNS = ['pref', 'name']
+# 変更の判定に用いるカラムのグループ
+GROUPS = {
+    "address":     ['post', 'address'],
+    "type_status": ['type_status'],
+    "beds":        BED_COLUMNS + ['n_bed_sum'],
+    "doctors":     ['n_tenu', 'n_tenu_dr', 'n_tenu_den', 'n_ntenu', 'n_ntenu_dr', 'n_ntenu_den'],
+    "subjects":    SUBJECT_COLUMNS,
+}
+COMPARE_COLUMNS = [c for cols in GROUPS.values() for c in cols]
+
+
+# --- 1つのデータ月の読み込み ---
+# 比較に必要なカラムのみを列指向形式の中間ファイルから読み込む（メモリ使用量を抑える）
+# 診療科目のダミー変数（0/1）は int8 に縮小する
+def load(month, fmt="parquet"):
+    df = storage.read(os.path.join(month + 'merge', 'total2'), fmt, columns=[KEY] + INFO_COLUMNS + COMPARE_COLUMNS)
+    df[KEY] = normalize(df[KEY].map(str, na_action="ignore"), CODE)
+    for c in GROUPS["subjects"]:
+        df[c] = df[c].astype("int8")
+    return df
+
+# 突き合わせに用いる行の位置（コードのない行と重複するコードを除外し、重複するコードは最初の行を採用）
+# 除外した行数も返す
+def key_rows(df):
+    keep = (df[KEY].notna() & (df[KEY] != '') & ~df[KEY].duplicated(keep='first')).to_numpy()
+    return np.flatnonzero(keep), int((~keep).sum())
+
+# 新旧のカラムが異なるか（行は同じ順序にそろえたもの）
+# 新旧ともに欠損値の場合は変更なしとし、リスト型のカラム（type_status）は要素ごとに比較する
+def changed(a, b):
+    a = a.reset_index(drop=True)
+    b = b.reset_index(drop=True)
+    ne = a.ne(b).fillna(True)
+    both_na = a.isna() & b.isna()
+    return (ne & ~both_na).to_numpy(dtype=bool)
+
+
+# --- 2つのデータ月の差分 ---
+# 医療機関コードのハッシュによる突き合わせ（旧データのコードの索引から新データの各行の位置を引く）
+# データフレーム全体の複製は作らず、突き合わせた行の位置によってカラムごとに比較する
+# 戻り値: {"added": 新規, "removed": 廃止, "changed": 変更（カラムごとの変更マスク d_* を含む）}
+def diff(old, new):
+    old_rows, old_dup = key_rows(old)
+    new_rows, new_dup = key_rows(new)
+    if old_dup or new_dup:
+        print(f"注意: コードが欠損または重複している行を除外しました（旧 {old_dup} 行 / 新 {new_dup} 行）")
+    pos = pd.Index(old[KEY].to_numpy()[old_rows]).get_indexer(new[KEY].to_numpy()[new_rows])
+    matched = pos >= 0
+    # 新旧で対応する行の位置（o: 旧データ、n: 新データ）
+    o = old_rows[pos[matched]]
+    n = new_rows[matched]
+    added = new.iloc[new_rows[~matched]].reset_index(drop=True)
+    removed = old.iloc[np.setdiff1d(old_rows, o)].reset_index(drop=True)
+
+    masks = {}
+    # 診療科目のダミー変数は整数の行列として一括で比較
+    subjects = GROUPS["subjects"]
+    diff_subjects = old[subjects].to_numpy()[o] != new[subjects].to_numpy()[n]
+    for j, c in enumerate(subjects):
+        masks[c] = diff_subjects[:, j]
+    for group, cols in GROUPS.items():
+        if group == "subjects":
+            continue
+        for c in cols:
+            masks[c] = changed(old[c].iloc[o], new[c].iloc[n])
+
+    # 変更のグループ（いずれかのカラムが変わったか）
+    flags = {f"changed_{g}": np.logical_or.reduce([masks[c] for c in cols]) for g, cols in GROUPS.items()}
+    any_change = np.logical_or.reduce(list(flags.values()))
+
+    # 変更のあった医療機関：識別情報、変更のグループ、カラムごとの変更マスク、
+    # 診療科目以外のカラムの新旧の値（old_*: 旧データの値）
+    rows = np.flatnonzero(any_change)
+    out = {c: new[c].to_numpy()[n[rows]] for c in [KEY] + INFO_COLUMNS}
+    for g, f in flags.items():
+        out[g] = f[rows]
+    for c, m in masks.items():
+        out[f"d_{c}"] = m[rows]
+    for group, cols in GROUPS.items():
+        if group == "subjects":
+            continue
+        for c in cols:
+            out[c] = new[c].iloc[n[rows]].reset_index(drop=True)
+            out[f"old_{c}"] = old[c].iloc[o[rows]].reset_index(drop=True)
+    return {
+        "added": added,
+        "removed": removed,
+        "changed": pd.DataFrame(out),
+    }
+
+# 差分の件数の要約
+def summary(result):
+    ch = result["changed"]
+    lines = [f"新規 {len(result['added'])} 件 / 廃止 {len(result['removed'])} 件 / 変更 {len(ch)} 件"]
+    for g in GROUPS:
+        lines.append(f"  {g}: {int(ch[f'changed_{g}'].sum())} 件")
+    return "\n".join(lines)
+
+
+# ==============================================================================
+# 2. データ処理（スクリプトとして実行された場合のみ）
+# ==============================================================================
+if __name__ == '__main__':
+    # コマンドライン引数（Spyderなどから引数なしで実行した場合は上記の設定値を使用）
+    parser = argparse.ArgumentParser(description="2つのデータ月の医療機関の新規・廃止・変更を出力")
+    parser.add_argument("old", nargs="?", default=OLD_MONTH, help="比較元のデータ月（例: r0512）")
+    parser.add_argument("new", nargs="?", default=NEW_MONTH, help="比較先のデータ月（例: r0603）")
+    args, _ = parser.parse_known_args()
+
+    # 作業ディレクトリの変更
+    try:
+        os.chdir(BASE_DIR)
+        print(f"作業ディレクトリ: {os.getcwd()}")
+    except FileNotFoundError:
+        print(f"エラー: 指定されたディレクトリ '{BASE_DIR}' が見つかりません。パスを確認してください。")
+
+    t = time.perf_counter()
+    result = diff(load(args.old, INTERMEDIATE_FORMAT), load(args.new, INTERMEDIATE_FORMAT))
+    # 差分の保存（{DELTA_DIR}/{old}_{new}_added.parquet など）
+    for kind, df in result.items():
+        storage.write(df, os.path.join(DELTA_DIR, f"{args.old}_{args.new}_{kind}"), INTERMEDIATE_FORMAT)
+    print(f"{args.old} -> {args.new}: " + summary(result))
+    print(f"処理時間: {time.perf_counter() - t:.1f} 秒")
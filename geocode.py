@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:36:08 2026
+
+@author: tkurihara827
+"""
+
+#geocode.py
+#ローカルの位置参照情報（国土交通省 位置参照情報の街区レベル・大字町丁目レベルのCSV）による住所のジオコーディング
+#外部のGISサービスを使わずに address.csv から address_out.csv（経度 fX、緯度 fY）を作成する
+
+#########
+# 位置参照情報は https://nlftp.mlit.go.jp/isj/ から都道府県ごとのCSVをダウンロードし、GAZETTEER_DIR に置く
+# （同じカラム名を持つCSVであれば、ほかのデータでもよい）
+# 初回の実行時に照合用の索引（GAZETTEER_DIR/gazetteer_index.parquet）を作成し、2回目以降はそれを読み込む
+#########
+
+# ==============================================================================
+# 1. 設定の外部化と作業ディレクトリの設定
+# ==============================================================================
+
+# ライブラリのインポート
+import os # オペレーティングシステムレベルの機能、特にファイルパス操作のために利用
+import re # 丁目の漢数字と番地の数字の抽出
+import glob # 位置参照情報のCSVファイルの列挙
+import time # 処理時間の表示
+from bisect import bisect_right # 整列済みの索引の二分探索（最長一致する住所の検索）
+import numpy as np # 経度・緯度の配列
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+import storage # 照合用の索引の保存・読み込み
+from manifest import Manifest, file_hash, config_hash # 位置参照情報のCSVの変更の検出
+from normalize import normalize, ADDRESS # 住所の照合キーの正規化
+
+# 外部化された設定変数
+# 作業ディレクトリ名（例: 'r512'）
+WORKDIR_NAME = 'r512'
+# 処理対象データの時間的コホートを識別するキー（例: 和暦5年12月）
+DATA_MONTH = 'r0512'
+
+# ベースディレクトリ指定
+BASE_DIR = f'/Users/tkurihara/Desktop/v.1.0.0/{WORKDIR_NAME}'
+
+# 位置参照情報のCSVを置くディレクトリ（BASE_DIRからの相対パスまたは絶対パス）
+GAZETTEER_DIR = 'gazetteer'
+
+
+# --- 位置参照情報のCSVのカラム ---
+# 大字・町丁目レベル（町丁目の代表点）
+TOWN_COLUMNS = {
+    "都道府県名": "pref",
+    "市区町村名": "city",
+    "大字町丁目名": "town",
+    "緯度": "lat",
+    "経度": "lon",
+    }
+# 街区レベル（街区・地番の代表点）
+BLOCK_COLUMNS = {
+    "都道府県名": "pref",
+    "市区町村名": "city",
+    "大字・丁目名": "town",
+    "小字・通称名": "koaza",
+    "街区符号・地番": "block",
+    "緯度": "lat",
+    "経度": "lon",
+    }
+
+# 照合の水準（数値が大きいほど詳細）
+LEVELS = {
+    1: "市区町村",
+    2: "町丁目",
+    3: "番地",
+    }
+
+# 照合用の索引のファイル名（拡張子なし）と、索引の作成方法の版（変更すると索引を作り直す）
+INDEX_NAME = 'gazetteer_index'
+INDEX_VERSION = 1
+
+
+# --- 住所の照合キー ---
+# 漢数字（一〜九十九）を数字に変換
+KANJI_DIGITS = {c: i for i, c in enumerate("〇一二三四五六七八九")}
+
+def kanji_number(s):
+    if "十" not in s:
+        return int("".join(str(KANJI_DIGITS[c]) for c in s))
+    tens, _, ones = s.partition("十")
+    return (KANJI_DIGITS[tens] if tens else 1) * 10 + (KANJI_DIGITS[ones] if ones else 0)
+
+CHOME = re.compile(r"([〇一二三四五六七八九十]+)丁目")
+
+# 住所の照合キー（1つの値）：ADDRESS の正規化のあと、丁目の漢数字を数字にそろえる（例: 本町一丁目 -> 本町1丁目）
+def address_key(x):
+    x = ADDRESS(x)
+    if isinstance(x, str) and "丁目" in x:
+        x = CHOME.sub(lambda m: f"{kanji_number(m.group(1))}丁目", x)
+    return x
+
+
+# --- 位置参照情報のCSVの読み込み ---
+# 文字コードは位置参照情報の Shift_JIS（cp932）を優先し、読めない場合は UTF-8 とする
+def read_csv(path, usecols):
+    for enc in ("cp932", "utf-8-sig"):
+        try:
+            return pd.read_csv(path, usecols=list(usecols), dtype=str, encoding=enc).rename(columns=usecols)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"文字コードを判定できません: {path}")
+
+# CSVの種類（'town' / 'block'）の判定（先頭行のカラム名による）
+def csv_kind(path):
+    for enc in ("cp932", "utf-8-sig"):
+        try:
+            header = pd.read_csv(path, nrows=0, encoding=enc).columns
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        return None
+    if set(BLOCK_COLUMNS) <= set(header):
+        return "block"
+    if set(TOWN_COLUMNS) <= set(header):
+        return "town"
+    return None
+
+
+# --- 照合用の索引の作成 ---
+# 索引: 照合キー（key）、経度（lon）、緯度（lat）、水準（level）をキーの順に整列したもの
+# 市区町村・町丁目のキーは住所の先頭からの最長一致で、番地のキーは「町丁目のキー#番地」の完全一致で検索する
+def build_index(paths):
+    towns = []
+    blocks = []
+    for p in paths:
+        kind = csv_kind(p)
+        if kind == "town":
+            towns.append(read_csv(p, TOWN_COLUMNS))
+        elif kind == "block":
+            blocks.append(read_csv(p, BLOCK_COLUMNS))
+    parts = []
+    town_pts = []
+    if blocks:
+        b = pd.concat(blocks, ignore_index=True)
+        b[["lat", "lon"]] = b[["lat", "lon"]].astype(float)
+        b["town_key"] = normalize(b["pref"] + b["city"] + b["town"].fillna("") + b["koaza"].fillna(""), address_key)
+        b["key"] = b["town_key"] + "#" + normalize(b["block"], ADDRESS)
+        # 同じ街区・地番に複数の点がある場合は平均
+        parts.append(b.groupby("key", sort=False)[["lon", "lat"]].mean().reset_index().assign(level=3))
+        # 町丁目レベルのCSVがない町丁目は、街区の点の平均を代表点とする
+        t = b.groupby("town_key", sort=False).agg(pref=("pref", "first"), city=("city", "first"), lon=("lon", "mean"), lat=("lat", "mean"))
+        town_pts.append(t.reset_index().rename(columns={"town_key": "key"}).assign(priority=1))
+    if towns:
+        t = pd.concat(towns, ignore_index=True)
+        t[["lat", "lon"]] = t[["lat", "lon"]].astype(float)
+        t["key"] = normalize(t["pref"] + t["city"] + t["town"].fillna(""), address_key)
+        town_pts.append(t[["key", "pref", "city", "lon", "lat"]].assign(priority=0))
+    if town_pts:
+        t = pd.concat(town_pts, ignore_index=True).sort_values("priority", kind="stable").drop_duplicates("key")
+        parts.append(t[["key", "lon", "lat"]].assign(level=2))
+        # 市区町村の代表点は、町丁目の代表点の平均
+        t["city_key"] = normalize(t["pref"] + t["city"], address_key)
+        parts.append(t.groupby("city_key")[["lon", "lat"]].mean().reset_index().rename(columns={"city_key": "key"}).assign(level=1))
+    if not parts:
+        return pd.DataFrame({"key": pd.Series(dtype=object), "lon": pd.Series(dtype=float), "lat": pd.Series(dtype=float), "level": pd.Series(dtype=np.int8)})
+    # 同じキーが複数の水準に現れる場合（例: 町丁目名のない市区町村）は詳細な水準を残す
+    index = pd.concat(parts, ignore_index=True).sort_values("level", ascending=False, kind="stable").drop_duplicates("key")
+    index["level"] = index["level"].astype(np.int8)
+    return index.sort_values("key").reset_index(drop=True)
+
+
+class Gazetteer:
+    # 照合用の索引による住所のジオコーディング
+    def __init__(self, index):
+        prefix = index[index["level"] < 3]
+        block = index[index["level"] == 3]
+        # 市区町村・町丁目：整列済みのキーのリスト（二分探索による最長一致）
+        self.keys = prefix["key"].tolist()
+        self.points = prefix[["lon", "lat", "level"]].to_numpy()
+        # 番地：キーから経度・緯度への辞書（完全一致）
+        self.blocks = dict(zip(block["key"], zip(block["lon"], block["lat"])))
+
+    # 位置参照情報のディレクトリから索引を読み込む
+    # CSVの内容と索引の作成方法が前回から変わっていなければ保存済みの索引を使い、変わっていれば作り直す
+    @classmethod
+    def load(cls, gazetteer_dir, fmt="parquet"):
+        paths = sorted(glob.glob(os.path.join(gazetteer_dir, "**", "*.csv"), recursive=True))
+        if not paths:
+            raise FileNotFoundError(f"位置参照情報のCSVが見つかりません: {gazetteer_dir}")
+        base = os.path.join(gazetteer_dir, INDEX_NAME)
+        manifest = Manifest(base + ".json")
+        config = config_hash({"version": INDEX_VERSION, "fmt": fmt})
+        digests = {os.path.relpath(p, gazetteer_dir): file_hash(p) for p in paths}
+        if manifest.config == config and manifest.entries == digests and storage.exists(base, fmt):
+            return cls(storage.read(base, fmt))
+        print(f"位置参照情報の索引を作成します（CSV {len(paths)} 件）")
+        index = build_index(paths)
+        storage.write(index, base, fmt)
+        manifest.entries = {}
+        for k, v in digests.items():
+            manifest.record(k, v)
+        manifest.save(config)
+        return cls(index)
+
+    # 照合キーの先頭から最長一致する市区町村・町丁目のキーの位置（見つからない場合は -1）
+    # 整列済みのキーのうち q 以下で最大のものが q の先頭部分でなければ、共通部分まで q を縮めて探索を繰り返す
+    # 数字で終わるキー（例: 1丁目 ではなく 南1）の直後に数字が続く場合は、数字の途中での一致として除外する
+    def longest_prefix(self, q):
+        keys = self.keys
+        while q:
+            i = bisect_right(keys, q) - 1
+            if i < 0:
+                return -1
+            k = keys[i]
+            if q.startswith(k):
+                if k[-1].isdigit() and len(q) > len(k) and q[len(k)].isdigit():
+                    q = k[:-1]
+                    continue
+                return i
+            n = 0
+            while n < len(k) and n < len(q) and q[n] == k[n]:
+                n += 1
+            q = q[:n]
+        return -1
+
+    # 1つの照合キーの経度・緯度・水準
+    def locate(self, q):
+        if not isinstance(q, str):
+            return (np.nan, np.nan, 0)
+        i = self.longest_prefix(q)
+        if i < 0:
+            return (np.nan, np.nan, 0)
+        lon, lat, level = self.points[i]
+        if level == 2:
+            # 町丁目に続く番地（先頭の数字）が索引にあれば番地の水準とする
+            m = re.match(r"-?(\d+)", q[len(self.keys[i]):])
+            if m:
+                hit = self.blocks.get(self.keys[i] + "#" + m.group(1))
+                if hit is not None:
+                    return (hit[0], hit[1], 3)
+        return (lon, lat, int(level))
+
+    # 住所のカラムの一括ジオコーディング（同じ住所は1回だけ照合する）
+    # 戻り値: 経度（fX）、緯度（fY）、照合の水準（level: 番地 / 町丁目 / 市区町村、照合できない場合は空文字列）
+    def geocode(self, addresses):
+        codes, uniques = pd.factorize(normalize(pd.Series(addresses).reset_index(drop=True), address_key))
+        located = np.array([self.locate(q) for q in uniques] + [(np.nan, np.nan, 0)], dtype=float).reshape(-1, 3)[codes]
+        return pd.DataFrame({
+            "fX": located[:, 0],
+            "fY": located[:, 1],
+            "level": pd.Series(located[:, 2].astype(int)).map(LEVELS).fillna(""),
+        })
+
+
+# ==============================================================================
+# 2. データ処理（スクリプトとして実行された場合のみ）
+# ==============================================================================
+if __name__ == '__main__':
+    # 作業ディレクトリの変更
+    try:
+        os.chdir(BASE_DIR)
+        print(f"作業ディレクトリ: {os.getcwd()}")
+    except FileNotFoundError:
+        print(f"エラー: 指定されたディレクトリ '{BASE_DIR}' が見つかりません。パスを確認してください。")
+
+    MERGE_DIR = DATA_MONTH + 'merge'
+    ADDRESS_CSV = os.path.join(MERGE_DIR, 'address.csv')
+    ADDRESS_OUT_CSV = os.path.join(MERGE_DIR, 'address_out.csv')
+
+    t = time.perf_counter()
+    gazetteer = Gazetteer.load(GAZETTEER_DIR)
+    # append.pyが出力したジオコーディング用のファイル（ID、郵便番号、住所、ヘッダなし）
+    df4 = pd.read_csv(ADDRESS_CSV, header=None, names=['id', 'post', 'address'], dtype=str, encoding="utf-8-sig")
+    out = pd.concat([df4, gazetteer.geocode(df4['address'])], axis=1)
+    # 外部のGISサービスの結果ファイルと同じく、経度（fX）・緯度（fY）のカラムを持つ address_out.csv を出力（gis.pyの入力）
+    out.to_csv(ADDRESS_OUT_CSV, index=False, encoding="utf-8-sig")
+    counts = out['level'].value_counts()
+    print(f"ジオコーディング: {len(out)} 件（" + " / ".join(f"{v} {counts.get(v, 0)}" for v in LEVELS.values()) + f" / 照合できず {counts.get('', 0)}）")
+    print(f"処理時間: {time.perf_counter() - t:.1f} 秒")
@@ -14,6 +14,9 @@ Created on Mon Oct 20 14:42:53 2025
 # 国土交通省の基盤地図情報または東京大学空間情報科学研究センターのCSV Geocoding Service等の
 # 公的な空間情報サービスを利用し、address.csvを用いて世界測地系（WGS84またはJGD2011）の経度・緯度データを取得する。
 # 得られた結果は address_out.csvというファイル名とし、MERGE_DIRに「分析者自身が」格納すること。
+# CSV Geocoding Service と同じ形式で応答するサービスを用いる場合は、GEOCODE_ENDPOINT を指定すると
+# geocode 段階（csis.py）が address.csv を送信して address_out.csv を作成する。
+# ローカルの位置参照情報を用いる場合は、geocode.py が同じ形式（fX, fY）の address_out.csv を出力する。
 #########
 
 # ==============================================================================
@@ -22,8 +25,14 @@ Created on Mon Oct 20 14:42:53 2025
 
 # ライブラリのインポート
 import os # オペレーティングシステムレベルの機能、特にファイルパス操作のために利用
+import argparse # コマンドライン引数（データ月・ベースディレクトリ）の解釈
 import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
 import numpy as np # 大規模な数値計算と配列操作の最適化（ベクトル化演算の基盤）
+import storage # append.pyが出力した列指向形式の中間ファイルの読み込み
+import schema # 最終データセットのカラムの型の定義
+import csis # CSV Geocoding Service 形式のジオコーディングサービスへの送信
+from pipeline import Stage, Context, run # 名前のついた段階の実行と、段階ごとの出力の保存
+from sinks import SINKS, write as write_sinks # 最終データセットの出力形式ごとの分割書き出し
 
 # 外部化された設定変数
 # データパイプラインの再現性と保守性を確保するため、パラメータを一元管理する
@@ -32,57 +41,199 @@ WORKDIR_NAME = 'r512'
 # 処理対象データの時間的コホートを識別するキー（例: 和暦5年12月）
 DATA_MONTH = 'r0512'
 
-# ベースディレクトリ指定
+# ベースディレクトリ指定（append.py の BASE_DIR と同じものを指定）
 # データソースと処理結果の格納場所を絶対パスで定義
-BASE_DIR = f'/Users/tkurihara/Desktop/{WORKDIR_NAME}'
-
-# 作業ディレクトリの変更
-try:
-    # 処理中の相対パス参照を確実にするためのカレントディレクトリ設定
-    os.chdir(BASE_DIR)
-    print(f"作業ディレクトリ: {os.getcwd()}")
-except FileNotFoundError:
-    # 処理の続行可能性を判断し、エラーログを出力
-    print(f"エラー: 指定されたディレクトリ '{BASE_DIR}' が見つかりません。パスを確認してください。")
-    # 処理を続行できない場合は exit() などで停止する
-
-# --- 派生パスの定義 ---
-# os.path.joinを使用して、BASE_DIRと後続のディレクトリを安全に結合
-# --------------------------------------------------------------------------------------
-PROC_DIR = DATA_MONTH
-MERGE_DIR = DATA_MONTH + 'merge'
-# 中間および最終的な統合データセットのファイルパス
-TOTAL2_FILE = os.path.join(MERGE_DIR, 'total2.xlsx')
-TOTAL3_FILE = os.path.join(MERGE_DIR, 'total3.xlsx')
-# ジオコーディング処理に用いる外部連携ファイルのパス
-ADDRESS_CSV = os.path.join(MERGE_DIR, 'address.csv')
-ADDRESS_OUT_CSV = os.path.join(MERGE_DIR, 'address_out.csv')
-# --------------------------------------------------------------------------------------
-
-
-
-df5 = pd.read_excel(TOTAL2_FILE)
-
-
-# 経度・緯度を入手後、改めてADDRESS_OUT_CSV を使用
-try:
-    # ジオコーディング結果のCSVファイルを読み込み
-    df6=pd.read_csv(ADDRESS_OUT_CSV) 
-    # データフレームのインデックスをリセットし、整合性を確保
-    df5 = df5.reset_index(drop=True)
-    df6 = df6.reset_index(drop=True)
-    # 空間情報（経度: fX, 緯度: fY）を元のデータセットに結合
-    df5['lon'] = df6['fX']
-    df5['lat'] = df6['fY']
-    
-except FileNotFoundError:
-    # 外部処理の失敗やファイル欠損時のデータ完全性を確保
-    print("緯度経度ファイルが見つかりません。緯度経度カラムはNaNになります。")
-    df5['lon'] = np.nan
-    df5['lat'] = np.nan
-
-# 最終処理済みデータセットの保存
-df5.to_excel(TOTAL3_FILE, index=False)
+BASE_DIR = f'/Users/tkurihara/Desktop/v.1.0.0/{WORKDIR_NAME}'
+
+# append.pyの中間データの保存形式（append.pyの INTERMEDIATE_FORMAT と同じものを指定）
+INTERMEDIATE_FORMAT = 'parquet'
+
+# ジオコーディング結果ファイルを分割して読み込む際の1回あたりの行数
+GEOCODE_CHUNKSIZE = 500_000
+
+# ジオコーディングサービス（CSV Geocoding Service と同じ形式で応答するもの）のURL（コマンドラインでは --endpoint）
+# None の場合は送信せず、分析者が格納した address_out.csv を用いる
+GEOCODE_ENDPOINT = None
+# 1回の要求で送る住所の数、同時に送る要求の数の上限
+GEOCODE_BATCH = 1000
+GEOCODE_CONCURRENCY = 4
+# 混雑・一時的な障害の際の再送の回数の上限と、1回の要求の待ち時間（秒）
+GEOCODE_RETRIES = 5
+GEOCODE_TIMEOUT = 120
+
+# 最終データセット（total3）の出力形式（sinks.py、コマンドラインでは --formats）
+# 'xlsx'・'csv.gz'・'parquet' に加え、'geojson'・'gpkg'（GeoPackage）で経度・緯度の点として出力できる
+# total3.parquet（INTERMEDIATE_FORMAT が 'parquet' の場合）は段階の出力として常に保存される
+TOTAL3_FORMATS = ['xlsx']
+# 最終データセットを変換して書き出す1回あたりの行数
+OUTPUT_CHUNKSIZE = 50_000
+
+# 派生パス（MERGE_DIR = {DATA_MONTH}merge、TOTAL2_DATA、ADDRESS_OUT_CSV など）は pipeline.Context が定義する
+
+
+# 段階の関数に渡す設定（pipeline.Context の属性として参照する）
+def settings():
+    return {
+        "geocode_chunksize": GEOCODE_CHUNKSIZE,
+        "geocode_endpoint": GEOCODE_ENDPOINT,
+        "geocode_batch": GEOCODE_BATCH,
+        "geocode_concurrency": GEOCODE_CONCURRENCY,
+        "geocode_retries": GEOCODE_RETRIES,
+        "geocode_timeout": GEOCODE_TIMEOUT,
+        "total3_formats": TOTAL3_FORMATS,
+        "output_chunksize": OUTPUT_CHUNKSIZE,
+    }
 
 
+# ==============================================================================
+# 2. データ処理の段階（pipeline.py の Stage として実行する）
+# ==============================================================================
+
+# append.py の最終データセット（total2）の読み込み
+# 型を保持した列指向形式の中間ファイルを優先し、存在しない場合（以前のバージョンの出力）はExcelを読み込む
+def read_total2(ctx):
+    if storage.exists(ctx.total2_data, ctx.fmt):
+        return storage.read(ctx.total2_data, ctx.fmt)
+    return pd.read_excel(ctx.total2_file)
+
+
+# --- 住所のジオコーディング（geocode） ---
+# GEOCODE_ENDPOINT が指定されている場合のみ、address.csv を送信して address_out.csv を作成する（csis.py）
+# 出力データフレームは、受け取った total2（この段階から実行する場合は読み込んだもの）をそのまま次の段階に渡す
+def geocode(ctx, df):
+    if ctx.geocode_endpoint:
+        csis.geocode(
+            ctx.address_csv, ctx.address_out_csv, ctx.geocode_journal, ctx.geocode_endpoint,
+            batch_size=ctx.geocode_batch, concurrency=ctx.geocode_concurrency,
+            retries=ctx.geocode_retries, timeout=ctx.geocode_timeout,
+        )
+    else:
+        print("GEOCODE_ENDPOINT が指定されていないため、格納済みの address_out.csv を用います")
+    return df if df is not None else read_total2(ctx)
+
+
+# --- 経度・緯度の結合（geocode-join） ---
+# df5: 前の段階（geocode）の出力（この段階だけを実行する場合は None）
+# 出力は空間索引（spatial.py）が読み込む列指向形式の中間ファイル（TOTAL3_DATA）として保存する
+def join(ctx, df5):
+    # 前の段階から続けて実行した場合は、その出力をそのまま用いる
+    if df5 is None:
+        df5 = read_total2(ctx)
+
+
+    # 経度・緯度を入手後、改めて ADDRESS_OUT_CSV を使用
+    # 行の順序ではなく、address.csv の1列目に出力した id をキーとして結合する
+    # （結果ファイルの行の欠落・並べ替えがあっても、ほかの行の経度・緯度がずれないようにする）
+    try:
+        # 結果ファイルのカラム名の確認（id は 'id' というカラム名がなければ1列目とする）
+        header = pd.read_csv(ctx.address_out_csv, nrows=0, encoding="utf-8-sig").columns
+        id_col = 'id' if 'id' in header else header[0]
+        # 照合の水準（geocode.py: level、CSV Geocoding Service: iLvl）
+        level_col = next((c for c in ['level', 'iLvl'] if c in header), None)
+        usecols = [id_col, 'fX', 'fY'] + ([level_col] if level_col else [])
+
+        # df5 の id から行の位置への索引（id は文字列として照合する）
+        df5 = df5.reset_index(drop=True)
+        rows = pd.Index(df5['id'].astype(str))
+        lon = np.full(len(df5), np.nan)
+        lat = np.full(len(df5), np.nan)
+        level = np.full(len(df5), None, dtype=object)
+        found = np.zeros(len(df5), dtype=bool)
+        unmatched = []
+        n_unmatched = 0
+        n_dup = 0
+
+        # 必要なカラムのみを型を指定して分割して読み込む（大きな結果ファイルでもメモリ使用量を一定に保つ）
+        for chunk in pd.read_csv(
+            ctx.address_out_csv,
+            usecols=usecols,
+            dtype={id_col: str, 'fX': 'float64', 'fY': 'float64', **({level_col: str} if level_col else {})},
+            encoding="utf-8-sig",
+            chunksize=ctx.geocode_chunksize,
+        ):
+            pos = rows.get_indexer(chunk[id_col].str.strip())
+            # df5 に存在しない id
+            miss = pos < 0
+            n_unmatched += int(miss.sum())
+            if len(unmatched) < 10:
+                unmatched += chunk.loc[miss, id_col].head(10 - len(unmatched)).tolist()
+            # 同じ id が複数回現れる場合は最初の行を採用
+            pos_ok = pos[~miss]
+            first = ~found[pos_ok] & ~pd.Series(pos_ok).duplicated().to_numpy()
+            n_dup += int((~first).sum())
+            take = pos_ok[first]
+            lon[take] = chunk['fX'].to_numpy()[~miss][first]
+            lat[take] = chunk['fY'].to_numpy()[~miss][first]
+            if level_col:
+                level[take] = chunk[level_col].to_numpy()[~miss][first]
+            found[take] = True
+
+        # 空間情報（経度: fX, 緯度: fY）を元のデータセットに結合
+        df5['lon'] = lon
+        df5['lat'] = lat
+        if level_col:
+            df5['geo_level'] = level
+
+        # 結合結果の報告
+        print(f"経度・緯度の結合: {int(found.sum())} / {len(df5)} 件")
+        if (~found).any():
+            print(f"  結果ファイルにない id: {int((~found).sum())} 件（例: {', '.join(df5.loc[~found, 'id'].astype(str).head(10))}）。経度・緯度はNaNになります。")
+        if n_unmatched:
+            print(f"  total2にない id: {n_unmatched} 件（例: {', '.join(map(str, unmatched))}）")
+        if n_dup:
+            print(f"  重複する id: {n_dup} 件（最初の行を採用）")
+        if level_col:
+            counts = pd.Series(level[found]).value_counts(dropna=False)
+            print("  照合の水準: " + " / ".join(f"{k} {v}" for k, v in counts.items()))
+
+    except FileNotFoundError:
+        # 外部処理の失敗やファイル欠損時のデータ完全性を確保
+        print("緯度経度ファイルが見つかりません。緯度経度カラムはNaNになります。")
+        df5['lon'] = np.nan
+        df5['lat'] = np.nan
+
+    # 最終処理済みデータセットの保存（Excelから読み込んだ場合も、出力の型をそろえる）
+    df5 = schema.apply(df5)
+    # TOTAL3_FORMATS の形式で OUTPUT_CHUNKSIZE 行ずつ書き出す（sinks.py）
+    # 列指向形式の中間ファイル（TOTAL3_DATA）は段階の出力として保存されるため、同じ形式は重ねて書き出さない
+    formats = [f for f in ctx.total3_formats if SINKS[f][0] != storage.FORMATS[ctx.fmt]]
+    write_sinks(df5, ctx.total3_data, formats, ctx.output_chunksize)
+    # 空間索引（spatial.py）から読み込むための列指向形式の中間ファイル（TOTAL3_DATA）は段階の出力として保存される
+    return df5
+
+
+# 段階の順序（append.py の STAGES に続く）
+STAGES = [
+    Stage("geocode", geocode, inputs=["merge_dir"], outputs=["address_out_csv"]),
+    Stage("geocode-join", join, inputs=["merge_dir"], outputs=["total3_file"], checkpoint="total3_data"),
+]
 
+
+# ==============================================================================
+# 3. データ処理（スクリプトとして実行された場合のみ）
+# ==============================================================================
+if __name__ == '__main__':
+    # コマンドライン引数（Spyderなどから引数なしで実行した場合は上記の設定値を使用）
+    parser = argparse.ArgumentParser(description="gis情報を追加したファイルを出力")
+    parser.add_argument("--month", default=None, help="処理対象のデータ月（DATA_MONTH、例: r0603）")
+    parser.add_argument("--base-dir", default=None, help="ベースディレクトリ（BASE_DIR）")
+    parser.add_argument("--formats", nargs="+", default=None, choices=list(SINKS), help="最終データセット（total3）の出力形式（TOTAL3_FORMATS）")
+    parser.add_argument("--endpoint", default=None, help="ジオコーディングサービスのURL（GEOCODE_ENDPOINT、bench/csis_stub.py で動作確認できる）")
+    parser.add_argument("--profile", action="store_true", help="プロファイルを取る（結果は MERGE_DIR/profile/geocode-join.prof と .txt）")
+    args, _ = parser.parse_known_args()
+    DATA_MONTH = args.month or DATA_MONTH
+    BASE_DIR = args.base_dir or BASE_DIR
+    TOTAL3_FORMATS = args.formats or TOTAL3_FORMATS
+    GEOCODE_ENDPOINT = args.endpoint or GEOCODE_ENDPOINT
+
+    # 作業ディレクトリの変更
+    try:
+        # 処理中の相対パス参照を確実にするためのカレントディレクトリ設定
+        os.chdir(BASE_DIR)
+        print(f"作業ディレクトリ: {os.getcwd()}")
+    except FileNotFoundError:
+        # 処理の続行可能性を判断し、エラーログを出力
+        print(f"エラー: 指定されたディレクトリ '{BASE_DIR}' が見つかりません。パスを確認してください。")
+        # 処理を続行できない場合は exit() などで停止する
+
+    run(STAGES, Context(DATA_MONTH, INTERMEDIATE_FORMAT, **settings()), profile="geocode-join" if args.profile else None)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:12:40 2026
+
+@author: tkurihara827
+"""
+
+#ingest.py
+#各都道府県データの下処理（読み込み・縦方向の繰り越し・不要行の除外）を都道府県単位で実行
+#都道府県どうしは統合まで互いに独立であるため、読み込みと縦方向の繰り越しを都道府県ファイルごとにプロセスプールで並列に処理し、
+#繰り越し後のデータを中間ファイルとして保存する（変更のない都道府県は次回以降も再利用する）
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+from concurrent.futures import ProcessPoolExecutor # 都道府県ファイル単位の並列処理
+import storage # 前処理済みデータを列指向形式の中間ファイルとして保存
+import readers # 地方局のエクセルファイルの読み込みエンジンの切り替え
+from manifest import Manifest, file_hash, config_hash # 元ファイルと設定のハッシュ値による再処理の判定
+import utils # rdel() で除外した行数の記録（ワーカープロセスで除外した行数を本プロセスの記録に加える）
+from utils import carry_forward, rdel, rep # 縦方向の繰り越し・行の除外・文字列置換の汎用関数
+
+
+# --- データ前処理のための初期設定 ---
+# データの読み込み時にスキップする行数（ヘッダ・メタデータ行の排除）
+pre0 = [i for i in range(0,11)]
+# データフレームの初期カラム名（主要属性）
+pre1 = [
+        "id", 
+        "code", 
+        "name", 
+        "address", 
+        "tell", 
+        "establisher", 
+        "owner", 
+        "register", 
+        "category", 
+        "type" 
+        ]
+# 繰り越し処理により値を格納するためのターゲットカラム（補助属性）
+pre2 = [
+        "type1",
+        "type2",
+        "type3",
+        "type4",
+        "n_tenu", 
+        "n_tenu_dr", 
+        "n_tenu_den", 
+        "n_ntenu", 
+        "n_ntenu_dr", 
+        "n_ntenu_den",
+        "reason", 
+        "start",
+        'c1',
+        'c2',
+        'c3',
+        'c4',
+        'c5',
+        'c6',
+        'c7'
+        ]
+# 縦方向データ繰り越し処理のパラメータ（row_num, ターゲットカラム, ソースカラム, 条件文字列）
+# utils.move() の move_params から繰り返し回数（k-row_num）を除いたもの
+# startは直前に埋めたreasonを参照するため、組の順序を入れ替えてはならない
+carry_params = [
+        (1, "n_tenu", "tell", "常"), 
+        (2, "n_tenu_dr", "tell", "医"),
+        (3, "n_tenu_den", "tell", "歯"), 
+        (4, "n_ntenu", "tell", "非"),
+        (5, "n_ntenu_dr", "tell", "医"), 
+        (6, "n_ntenu_den", "tell", "歯"),
+        (1, "reason", "register", ""), 
+        (1, "start", "reason", ""),
+        (1, "type1", "type", ""), 
+        (2, "type2", "type", ""),
+        (3, "type3", "type", ""), 
+        (4, "type4", "type", ""),
+        (0, "c1", "category", ""), 
+        (1, "c2", "category", ""),
+        (2, "c3", "category", ""), 
+        (3, "c4", "category", ""),
+        (4, "c5", "category", ""), 
+        (5, "c6", "category", ""),
+        (6, "c7", "category", "")
+        ]
+# 地方局のファイル番号（1〜47: 都道府県番号、48: 北海道の2つ目のファイル）
+PREFS = range(1,49)
+
+
+# --- 1都道府県分のデータの下処理 out df1 ---
+# 読み込みと縦方向の繰り越しを行ったデータフレームを返す（元ファイルが存在しない場合は None）
+# fmt: 中間ファイルの形式（storage.FORMATS）、engine: エクセルファイルの読み込みエンジン（readers.ENGINES または 'auto'）
+def prefecture(m, raw_dir, proc_dir, data_month, fmt="parquet", engine="auto"):
+    try:
+        df1 = readers.read(
+        f"{raw_dir}/{m}.xlsx", 
+        skiprows = pre0, 
+        names = pre1,
+        engine = engine
+        )
+    except FileNotFoundError:
+        # ファイルが存在しない場合（例: 存在しない都道府県番号）は処理をスキップ
+        return None
+    df1 = carry(df1, m)
+    # 前処理済みデータセットを列指向形式の中間ファイルとして保存（変更のない都道府県の再利用に利用）
+    df1 = storage.typed(df1)
+    storage.write(df1, f'{proc_dir}/{data_month}_{m}', fmt)
+    return df1
+
+# プロセスプールのワーカーで実行する prefecture()
+# ワーカープロセスで rdel() が除外した行数の記録（utils.DROPPED）も返し、本プロセスの記録に加えられるようにする
+def prefecture_task(*args):
+    n = len(utils.DROPPED)
+    df1 = prefecture(*args)
+    return df1, utils.DROPPED[n:]
+
+
+# --- 1都道府県分のデータの縦方向の繰り越し out df1 ---
+# df1: 読み込んだ1ファイル分のデータ（位置インデックス）、m: ファイル番号
+def carry(df1, m):
+    df1 = df1.reset_index(drop=True)
+    for i in pre2:
+        df1[i] = "*"
+    # 欠損値の補完：同一id内での情報欠落を前方の非欠損値で埋める（FFILL: Forward Fill）
+    df1 = df1.ffill()
+    # 総合病院 -> 総合
+    rep(df1,"type","総合病院", "総合")
+    # 縦方向データ繰り越し処理（19のターゲットカラムをパラメータの順にカラム単位で一括処理）
+    carry_forward(df1, carry_params)
+    # 無効なステータスを持つ行を除外
+    for i in ["現存","休止"]:
+        rdel(df1,"type",i)
+    # 不必要な情報を含む行を除外
+    rdel(df1,"tell","常")
+    # 都道府県コードの整合性確保（コード48は北海道の重複を回避するための暫定措置と推測）
+    df1["pref"] = m if m < 48 else 1
+    return df1
+
+
+# --- 前処理の設定のハッシュ値 ---
+# 読み込み・繰り越しの規則と、それを実装するソースコード（ingest.py, utils.py, readers.py）が変わると値が変わる
+# 読み込みエンジンはどれも同じデータフレームを返すため、エンジンを切り替えても再処理の対象とはしない
+def ingest_config(fmt="parquet"):
+    sources = {}
+    for mod in ["ingest.py", "utils.py", "readers.py"]:
+        sources[mod] = file_hash(os.path.join(os.path.dirname(os.path.abspath(__file__)), mod))
+    return config_hash({
+        "pre0": pre0,
+        "pre1": pre1,
+        "pre2": pre2,
+        "carry_params": carry_params,
+        "fmt": fmt,
+        "sources": sources,
+    })
+
+
+# --- 全都道府県データの下処理 ---
+# workers: 並列処理のプロセス数（None: CPUコア数、1: プロセスプールを使わず逐次処理）
+# 下処理済みのデータフレームをファイル番号順に返す。読み込みに失敗したファイルは報告し、残りの処理を続行する
+# 元ファイルの内容と前処理の設定が前回から変わっていない都道府県は、前回の中間ファイルを再利用する
+# force=True の場合は、台帳（PROC_DIR/manifest.json）にかかわらずすべての都道府県を再処理する
+# engine: エクセルファイルの読み込みエンジン（'auto' の場合は利用可能なもののうち最も速いもの）
+def ingest_all(raw_dir, proc_dir, data_month, workers=None, prefs=PREFS, fmt="parquet", force=False, engine="auto"):
+    # データ前処理済みファイルを格納するためのディレクトリを再帰的に作成
+    os.makedirs(proc_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(proc_dir, "manifest.json"))
+    config = ingest_config(fmt)
+    digests = {}
+    todo = []
+    reuse = []
+    for m in prefs:
+        raw = f"{raw_dir}/{m}.xlsx"
+        if not os.path.exists(raw):
+            # ファイルが存在しない場合（例: 存在しない都道府県番号）は処理をスキップ
+            manifest.record(m, None)
+            continue
+        digests[m] = file_hash(raw)
+        if not force and manifest.is_current(m, digests[m], config) and storage.exists(f'{proc_dir}/{data_month}_{m}', fmt):
+            reuse.append(m)
+        else:
+            todo.append(m)
+    results = {}
+    errors = {}
+    if todo:
+        # エンジンは1回だけ決定し、すべての都道府県（ワーカープロセス）で同じものを使う
+        engine = readers.select(engine)
+        print(f"エクセルファイルの読み込みエンジン: {engine}")
+    if workers == 1 or not todo:
+        for m in todo:
+            try:
+                results[m] = prefecture(m, raw_dir, proc_dir, data_month, fmt, engine)
+            except Exception as e:
+                errors[m] = e
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futures = {m: ex.submit(prefecture_task, m, raw_dir, proc_dir, data_month, fmt, engine) for m in todo}
+            # 完了順ではなく都道府県番号順に結果を受け取る
+            for m, f in futures.items():
+                try:
+                    results[m], dropped = f.result()
+                    utils.DROPPED.extend(dropped)
+                except Exception as e:
+                    errors[m] = e
+    # 変更のなかった都道府県は前回の中間ファイルを読み込む
+    for m in reuse:
+        results[m] = storage.read(f'{proc_dir}/{data_month}_{m}', fmt)
+    for m in todo:
+        manifest.record(m, digests[m] if m in results else None)
+    manifest.save(config)
+    for m, e in errors.items():
+        print(f"エラー: {raw_dir}/{m}.xlsx の処理に失敗しました（{type(e).__name__}: {e}）。このファイルを除いて処理を続行します。")
+    print(f"都道府県データの下処理: 再処理 {len(todo) - len(errors)} 件 / 変更なしのため再利用 {len(reuse)} 件 / 失敗 {len(errors)} 件")
+    if reuse:
+        print(f"  再利用したファイル番号: {', '.join(str(m) for m in reuse)}")
+    return [results[m] for m in prefs if results.get(m) is not None]
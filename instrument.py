@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 04:51:09 2026
+
+@author: tkurihara827
+"""
+
+#instrument.py
+#段階ごとの処理時間（経過時間・CPU時間）・最大メモリ使用量・入出力の行数・rdel() で除外した行数の計測と、実行記録の出力
+#計測はシステムの計数値を段階の前後で読むだけなので、本番の実行でも常に有効にしておける
+
+# ライブラリのインポート
+import os # 子プロセス（ingest のプロセスプール）のCPU時間の取得
+import sys # 実行環境（Pythonのバージョン）の記録
+import csv # 実行記録のCSVへの追記
+import json # 実行記録のJSON Lines への追記
+import time # 経過時間・CPU時間の計測
+import cProfile # 指定した段階のプロファイル
+import pstats # プロファイル結果の要約
+from datetime import datetime # 実行開始時刻
+import utils # rdel() で除外した行数の記録（utils.DROPPED）
+
+try:
+    import resource # 最大メモリ使用量（/proc のない環境、Windows にはない）
+except ImportError:
+    resource = None
+
+try:
+    import pyinstrument # 統計的プロファイラ（任意）
+except ImportError:
+    pyinstrument = None
+
+# 実行記録のカラム（CSV、1行1段階）
+FIELDS = [
+    "run", "month", "stage", "status", "wall_s", "cpu_s", "cpu_children_s", "checkpoint_s",
+    "peak_rss_mb", "peak_rss_children_mb", "rows_in", "rows_out", "rows_dropped", "dropped",
+]
+
+
+# --- メモリ使用量 ---
+# 最大メモリ使用量（VmHWM）を現在の使用量に戻す（Linux のみ、できない場合は False）
+# 段階の開始時に戻すことで、段階ごとの最大メモリ使用量を計測する（戻せない環境ではプロセス開始以降の最大値）
+def reset_peak():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+# 最大メモリ使用量（MB）
+def peak_rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss は Linux では KB、macOS ではバイト
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 1024
+
+# 終了した子プロセスのうち最大のメモリ使用量（MB）
+def peak_rss_children():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 1024
+
+
+# --- 段階の計測 ---
+# 段階の開始時の計数値
+def start():
+    reset_peak()
+    t = os.times()
+    return {
+        "wall": time.perf_counter(),
+        "cpu": time.process_time(),
+        "children": t.children_user + t.children_system,
+        "dropped": len(utils.DROPPED),
+    }
+
+# 段階の開始時からの差分
+# 戻り値: 経過時間・CPU時間（本プロセス、終了した子プロセス）・最大メモリ使用量・rdel() で除外した行数（カラム:条件 ごと）
+def stop(s):
+    t = os.times()
+    dropped = {}
+    for v, w, n in utils.DROPPED[s["dropped"]:]:
+        dropped[f"{v}:{w}"] = dropped.get(f"{v}:{w}", 0) + n
+    peak = peak_rss()
+    children = peak_rss_children()
+    return {
+        "wall_s": round(time.perf_counter() - s["wall"], 3),
+        "cpu_s": round(time.process_time() - s["cpu"], 3),
+        "cpu_children_s": round(t.children_user + t.children_system - s["children"], 3),
+        "peak_rss_mb": None if peak is None else round(peak, 1),
+        "peak_rss_children_mb": None if children is None else round(children, 1),
+        "rows_dropped": sum(dropped.values()),
+        "dropped": dropped,
+    }
+
+
+# --- プロファイル ---
+# func(*args) を実行し、プロファイル結果を path（拡張子を除いたパス）に保存する
+# tool: 'cprofile'（{path}.prof と、累積時間の上位の要約 {path}.txt）または 'pyinstrument'（{path}.html、要インストール）
+def profile(func, args, path, tool="cprofile"):
+    if tool == "pyinstrument":
+        if pyinstrument is None:
+            raise ImportError("pyinstrument がインストールされていません（pip install pyinstrument）")
+        p = pyinstrument.Profiler()
+        p.start()
+        try:
+            return func(*args)
+        finally:
+            p.stop()
+            with open(path + ".html", "w", encoding="utf-8") as f:
+                f.write(p.output_html())
+    p = cProfile.Profile()
+    try:
+        return p.runcall(func, *args)
+    finally:
+        p.dump_stats(path + ".prof")
+        with open(path + ".txt", "w", encoding="utf-8") as f:
+            pstats.Stats(p, stream=f).sort_stats("cumulative").print_stats(40)
+
+
+# --- 実行記録 ---
+class RunReport:
+    # base: 実行記録の保存先（拡張子を除いたパス、{base}.jsonl と {base}.csv に実行ごとに追記する）
+    def __init__(self, base, month, stages):
+        self.base = base
+        self.run = datetime.now().isoformat(timespec="seconds")
+        self.meta = {
+            "run": self.run,
+            "month": month,
+            "stages": stages,
+            "python": sys.version.split()[0],
+            "pid": os.getpid(),
+        }
+        self.records = []
+        self.t = time.perf_counter()
+
+    # 段階の計測結果の追加
+    def add(self, stage, measures, rows_in, rows_out, status="ok", checkpoint_s=None):
+        self.records.append({
+            "run": self.run,
+            "month": self.meta["month"],
+            "stage": stage,
+            "status": status,
+            **measures,
+            "checkpoint_s": checkpoint_s,
+            "rows_in": rows_in,
+            "rows_out": rows_out,
+        })
+
+    # 実行記録の追記（JSON Lines は1行1実行、CSV は1行1段階）
+    def save(self):
+        os.makedirs(os.path.dirname(self.base) or ".", exist_ok=True)
+        with open(self.base + ".jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps({**self.meta, "wall_s": round(time.perf_counter() - self.t, 3), "records": self.records}, ensure_ascii=False) + "\n")
+        new = not os.path.exists(self.base + ".csv")
+        with open(self.base + ".csv", "a", encoding="utf-8-sig" if new else "utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=FIELDS)
+            if new:
+                w.writeheader()
+            for r in self.records:
+                w.writerow({**r, "dropped": "; ".join(f"{k}={v}" for k, v in r["dropped"].items())})
+
+    # 段階ごとの要約（表示用）
+    def summary(self):
+        lines = []
+        for r in self.records:
+            drop = f"、除外 {r['rows_dropped']:,} 行" if r["rows_dropped"] else ""
+            mem = f"、最大メモリ {r['peak_rss_mb']:,.0f} MB" if r["peak_rss_mb"] is not None else ""
+            lines.append(f"  {r['stage']:14s} {r['wall_s']:8.2f} 秒（CPU {r['cpu_s'] + r['cpu_children_s']:.2f} 秒{mem}{drop}） {r['status']}")
+        return "\n".join(lines)
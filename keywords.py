@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 05:34:18 2026
+
+@author: tkurihara827
+"""
+
+#keywords.py
+#キーワードの辞書（カラム名: キーワードのリスト）から1つの正規表現を作成し、
+#文字列のカラムを1回走査して、すべてのカラムのフラグを真偽値の行列として求める
+
+# ライブラリのインポート
+import re # キーワードの選択（|）による1つの正規表現
+import numpy as np # フラグの行列
+import pandas as pd # 重複のない値の取り出し
+
+# リストの要素を1つの文字列に結合する際の区切り文字（要素の文字列には現れない制御文字）
+SEP = "\x1f"
+
+
+class KeywordMatcher:
+    # groups: カラム名: キーワードのリスト（例: {"r_new": ["新規"], "r_move": ["移動", "移転"]}）
+    # whole=False: 文字列がキーワードを含めばフラグを立てる
+    # whole=True: リストの要素のいずれかがキーワードと一致すればフラグを立てる（例: type_status の "病院" は "療養病床" に含まれない）
+    def __init__(self, groups, whole=False):
+        self.columns = list(groups)
+        self.whole = whole
+        words = sorted({w for ws in groups.values() for w in ws}, key=len, reverse=True)
+        alt = "|".join(map(re.escape, words))
+        if whole:
+            # 区切り文字（または先頭・末尾）に囲まれた要素全体との一致
+            self.pattern = re.compile(f"(?:^|{SEP})({alt})(?={SEP}|$)")
+        else:
+            # 先読みによりすべての開始位置で照合する（同じ位置では長いキーワードを優先し、重なり合うキーワードも見落とさない）
+            self.pattern = re.compile(f"(?=({alt}))")
+        # 一致したキーワードから立てるカラムの位置
+        # 部分一致の場合は、一致したキーワードに含まれる短いキーワード（例: 開設者変更 の 開設者変）のカラムも立てる
+        self.implied = {}
+        for w in words:
+            cols = {j for j, ws in enumerate(groups.values()) for k in ws if (k in w if not whole else k == w)}
+            self.implied[w] = sorted(cols)
+
+    # 1つの文字列で立つフラグ（カラムの位置の集合）
+    def flags(self, s):
+        cols = set()
+        for w in self.pattern.findall(s):
+            cols.update(self.implied[w])
+        return cols
+
+    # 文字列（whole=True の場合はリスト）のカラムのフラグ
+    # 重複のない値ごとに1回だけ照合し、行ごとの結果に展開する。欠損値の行はすべて False
+    # 戻り値: 真偽値の行列（行数 × カラム数、カラムの順序は groups と同じ）
+    def match(self, s):
+        if self.whole:
+            s = s.map(lambda v: SEP.join(map(str, v)), na_action="ignore")
+        codes, uniques = pd.factorize(s)
+        table = np.zeros((len(uniques) + 1, len(self.columns)), dtype=bool)
+        for i, u in enumerate(uniques):
+            table[i, sorted(self.flags(str(u)))] = True
+        # 欠損値（codes = -1）は最後の行（すべて False）を参照する
+        return table[codes]
+
+    # フラグのデータフレーム（カラムは groups のカラム名、行は s と同じ）
+    def frame(self, s, dtype=bool):
+        return pd.DataFrame(self.match(s).astype(dtype), index=s.index, columns=self.columns)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 18:40:55 2026
+
+@author: tkurihara827
+"""
+
+#manifest.py
+#入力ファイルと処理設定のハッシュ値を記録し、変更のあったものだけを再処理するための台帳
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+import json # 台帳をJSON形式で保存
+import hashlib # ファイル内容と処理設定のハッシュ値（SHA-256）を計算
+
+
+# ファイル内容のハッシュ値（大きなファイルも一定のメモリで計算できるよう分割して読み込む）
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# 処理設定のハッシュ値
+# config は JSON に変換できる値（文字列・数値・リスト・辞書）からなる辞書
+def config_hash(config):
+    s = json.dumps(config, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    # 台帳の内容：処理設定のハッシュ値と、キー（例: 都道府県番号）ごとの入力ファイルのハッシュ値
+    # 処理設定のハッシュ値が変わった場合は、すべてのキーが再処理の対象となる
+    def __init__(self, path):
+        self.path = path
+        self.config = None
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.config = data.get("config")
+            self.entries = data.get("entries", {})
+
+    # 前回の処理から入力ファイルと処理設定がどちらも変わっていないか
+    def is_current(self, key, digest, config):
+        return self.config == config and self.entries.get(str(key)) == digest
+
+    # 処理結果の記録（digest が None の場合は記録を削除）
+    def record(self, key, digest):
+        if digest is None:
+            self.entries.pop(str(key), None)
+        else:
+            self.entries[str(key)] = digest
+
+    # 台帳の保存（書き込み途中で中断しても既存の台帳が壊れないよう、一時ファイルから置き換える）
+    def save(self, config):
+        self.config = config
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"config": self.config, "entries": self.entries}, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:20:05 2026
+
+@author: tkurihara827
+"""
+
+#match_cache.py
+#診療科目の分類結果（科目文字列 -> 63科目のキー）をSQLiteに保存し、再実行時に再利用する
+
+# ライブラリのインポート
+import json # 類似度判定基準のパラメータとリファレンス辞書を正規化された文字列に変換
+import hashlib # リファレンス辞書（cref）のハッシュ値を計算
+import sqlite3 # 標準ライブラリのみで利用できるディスク上のキャッシュ
+
+
+# リファレンス辞書（cref）のハッシュ値
+# 科目名や番号が1つでも変われば値が変わり、過去のキャッシュは参照されなくなる
+def cref_hash(cref):
+    s = json.dumps({str(k): v for k, v in cref.items()}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+
+class MatchCache:
+    # キャッシュのキーは（科目文字列, 類似度判定基準, パラメータ, crefのハッシュ値）の組であり、
+    # 判定基準やリファレンス辞書を変更すると、変更前の分類結果は自動的に使われなくなる
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        # 複数のデータ月を並列に処理する場合（panel.py）は同じキャッシュに複数のプロセスが書き込むため、ロックの待ち時間を長めにとる
+        self.con = sqlite3.connect(path, timeout=60)
+        self.con.execute(
+            """CREATE TABLE IF NOT EXISTS matches (
+                subject TEXT NOT NULL,
+                method TEXT NOT NULL,
+                params TEXT NOT NULL,
+                cref_hash TEXT NOT NULL,
+                matched TEXT NOT NULL,
+                PRIMARY KEY (subject, method, params, cref_hash)
+            )"""
+        )
+
+    # パラメータ辞書をキー用の文字列に変換
+    @staticmethod
+    def params_key(params):
+        return json.dumps(params or {}, sort_keys=True)
+
+    # 科目文字列のリストについて、キャッシュ済みの分類結果（crefのキーのリスト）を返す
+    # 見つからなかった文字列は辞書に含めない
+    def lookup(self, subjects, method, params, crefhash):
+        rows = self.con.execute(
+            "SELECT subject, matched FROM matches WHERE method = ? AND params = ? AND cref_hash = ?",
+            (method, self.params_key(params), crefhash),
+        )
+        cached = {s: m for s, m in rows}
+        found = {}
+        for s in subjects:
+            if s in cached:
+                found[s] = [int(k) for k in cached[s].split(",") if k]
+        self.hits += len(found)
+        self.misses += len(subjects) - len(found)
+        return found
+
+    # 新たに計算した分類結果（科目文字列 -> crefのキーのリスト）を保存
+    def store(self, results, method, params, crefhash):
+        p = self.params_key(params)
+        self.con.executemany(
+            "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?)",
+            [(s, method, p, crefhash, ",".join(str(k) for k in keys)) for s, keys in results.items()],
+        )
+        self.con.commit()
+
+    # ヒット・ミス件数の要約
+    def report(self):
+        return f"診療科目キャッシュ: ヒット {self.hits} 件 / ミス {self.misses} 件（{self.path}）"
+
+    def close(self):
+        self.con.close()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 01:48:22 2026
+
+@author: tkurihara827
+"""
+
+#municipality.py
+#住所文字列への市区町村コード（5桁、全国地方公共団体コードの検査数字を除いたもの）の付与
+#総務省の全国地方公共団体コードの表から市区町村名の最長一致のトライ木を作成し、住所の先頭から1回の走査で照合する
+
+#########
+# 市区町村コードの表は、総務省の「全国地方公共団体コード」のExcelファイル
+# （https://www.soumu.go.jp/denshijiti/code.html、政令指定都市の区のシートを含む）をそのまま用いるか、
+# 団体コード・都道府県名・市区町村名のカラムを持つCSVを用いる（国土交通省の位置参照情報のように郡名を含む市区町村名でもよい）
+#########
+
+# ライブラリのインポート
+import re # 郡名の判定
+import time # 照合の処理速度の表示
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+from normalize import normalize, ADDRESS # 住所の照合キーの正規化
+
+
+# --- 市区町村コードの表のカラム ---
+# カラム名の候補（表によってカラム名が異なるため、先に見つかったものを用いる）
+CODE_HEADERS = ["団体コード", "市区町村コード", "全国地方公共団体コード", "code"]
+PREF_HEADERS = ["都道府県名（漢字）", "都道府県名\n（漢字）", "都道府県名", "pref"]
+CITY_HEADERS = ["市区町村名（漢字）", "市区町村名\n（漢字）", "市区町村名", "city"]
+
+# 郡名（例: 西多摩郡瑞穂町 -> 西多摩郡 / 瑞穂町、北村山郡大石田町 -> 北村山郡 / 大石田町）
+# 郡名自体が市・区・町・村を含む場合（北村山郡・余市郡・高市郡など）があるため、郡の前の文字は限定しない
+COUNTY = re.compile(r"^(?P<county>.{1,6}?郡)(?P<town>.+[町村])$")
+# 住所の先頭の都道府県名（郡名を省いた照合のやり直しに用いる）
+PREF = re.compile(r"^(?P<pref>北海道|東京都|京都府|大阪府|.{2,3}県)")
+# 都道府県名に続く郡名の最大の文字数（郡を除く）
+COUNTY_LEN = 6
+
+
+# --- 市区町村コードの表の読み込み ---
+# Excelファイルの場合はすべてのシート（政令指定都市の区のシートを含む）を読み込む
+# 戻り値: code（5桁の文字列）、pref（都道府県名）、city（市区町村名）のデータフレーム（都道府県の行は除く）
+def read_table(path):
+    if path.lower().endswith((".xlsx", ".xls")):
+        sheets = list(pd.read_excel(path, sheet_name=None, dtype=str).values())
+    else:
+        for enc in ("cp932", "utf-8-sig"):
+            try:
+                sheets = [pd.read_csv(path, dtype=str, encoding=enc)]
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            raise ValueError(f"文字コードを判定できません: {path}")
+    parts = []
+    for df in sheets:
+        cols = {}
+        for name, headers in (("code", CODE_HEADERS), ("pref", PREF_HEADERS), ("city", CITY_HEADERS)):
+            found = next((h for h in headers if h in df.columns), None)
+            if found is None:
+                break
+            cols[found] = name
+        else:
+            parts.append(df[list(cols)].rename(columns=cols))
+    if not parts:
+        raise ValueError(f"団体コード・都道府県名・市区町村名のカラムが見つかりません: {path}")
+    table = pd.concat(parts, ignore_index=True).dropna(subset=["code", "city"])
+    # 6桁の団体コードは末尾の検査数字を除き、5桁にそろえる
+    table["code"] = table["code"].str.strip().str[:5].str.zfill(5)
+    table["pref"] = table["pref"].str.strip()
+    table["city"] = table["city"].str.strip()
+    return table[table["city"] != ""].drop_duplicates(["code", "city"]).reset_index(drop=True)
+
+
+# --- トライ木 ---
+class Trie:
+    # 1文字ごとの辞書の入れ子。キーの終端には END に値を置く
+    END = ""
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    # キーと値の追加（同じキーが既にある場合は上書きしない）
+    # 戻り値: 追加したか
+    def insert(self, key, value):
+        node = self.root
+        for ch in key:
+            node = node.setdefault(ch, {})
+        if self.END in node:
+            return False
+        node[self.END] = value
+        self.size += 1
+        return True
+
+    # s[start:] の先頭に最長一致するキーの値と、一致した末尾の位置（一致しない場合は (None, start)）
+    def longest(self, s, start=0):
+        node = self.root
+        value, end = None, start
+        for i in range(start, len(s)):
+            node = node.get(s[i])
+            if node is None:
+                break
+            if self.END in node:
+                value, end = node[self.END], i + 1
+        return value, end
+
+
+# --- 市区町村コードの付与 ---
+class MunicipalityCoder:
+    # table: read_table() の戻り値
+    # 照合キーは「都道府県名 + 市区町村名」を住所と同じ規則（ADDRESS）で正規化したもの
+    # 政令指定都市の区（例: 札幌市中央区）と市（例: 札幌市）の両方を登録し、区まで一致すれば区のコードとする
+    # 郡名を含む市区町村名（例: 西多摩郡瑞穂町）は郡名を省いた形も登録する
+    def __init__(self, table):
+        self.table = table
+        self.names = dict(zip(table["code"], table["city"]))
+        self.trie = Trie()
+        # 同じ照合キーに異なるコードが登録されようとした場合（郡名を省いた形の重複など）、そのキーは使わない
+        seen = {}
+        for code, pref, city in zip(table["code"], table["pref"], table["city"]):
+            forms = [city]
+            m = COUNTY.match(city)
+            if m:
+                forms.append(m.group("town"))
+            for form in forms:
+                key = ADDRESS(pref + form)
+                seen.setdefault(key, set()).add(code)
+        for key, codes in seen.items():
+            if len(codes) == 1:
+                self.trie.insert(key, next(iter(codes)))
+        self.ambiguous = sorted(k for k, v in seen.items() if len(v) > 1)
+
+    # 表のファイルから作成
+    @classmethod
+    def load(cls, path):
+        return cls(read_table(path))
+
+    # 1つの住所の照合（正規化済みの住所の先頭からの最長一致）
+    # 一致しない場合は、都道府県名に続く郡名を省いて照合し直す（表の市区町村名が郡名を含まない場合）
+    # 郡名の終わりは、都道府県名の後の COUNTY_LEN 文字以内にある「郡」の位置を近い順に試す
+    def lookup(self, key):
+        if not isinstance(key, str):
+            return None
+        code, _ = self.trie.longest(key)
+        if code is None:
+            m = PREF.match(key)
+            if m:
+                start = m.end()
+                pos = key.find("郡", start + 1, start + COUNTY_LEN + 1)
+                while code is None and pos >= 0:
+                    code, _ = self.trie.longest(key[:start] + key[pos + 1:])
+                    pos = key.find("郡", pos + 1, start + COUNTY_LEN + 1)
+        return code
+
+    # 住所のカラムへの市区町村コードの付与（一意な住所ごとに1回だけ照合する）
+    # 戻り値: 住所と同じ行の市区町村コード（一致しない住所は欠損値）
+    def assign(self, address):
+        key = normalize(address, ADDRESS)
+        codes, uniques = pd.factorize(key)
+        found = pd.array([self.lookup(k) for k in uniques], dtype="string")
+        out = pd.Series(pd.NA, index=address.index, dtype="string")
+        valid = codes >= 0
+        out[valid] = found[codes[valid]]
+        return out
+
+
+# 市区町村コードの付与と結果の報告
+# 戻り値: 市区町村コードのカラム（address と同じ行）
+def assign(address, path):
+    t = time.perf_counter()
+    coder = MunicipalityCoder.load(path)
+    t_build = time.perf_counter() - t
+    t = time.perf_counter()
+    codes = coder.assign(address)
+    t_match = time.perf_counter() - t
+    miss = codes.isna() & address.notna()
+    print(f"市区町村コードの付与: {int(codes.notna().sum())} / {len(codes)} 件"
+          f"（表 {len(coder.table)} 件・照合キー {coder.trie.size} 件の作成 {t_build:.2f} 秒、照合 {t_match:.2f} 秒・{len(codes) / max(t_match, 1e-9):,.0f} 件/秒）")
+    if coder.ambiguous:
+        print(f"  複数のコードに対応するため使わない照合キー: {len(coder.ambiguous)} 件（例: {', '.join(coder.ambiguous[:5])}）")
+    if miss.any():
+        print(f"  一致しない住所: {int(miss.sum())} 件（例: {', '.join(address[miss].astype(str).head(10))}）")
+    return codes
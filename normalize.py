@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:48:09 2026
+
+@author: tkurihara827
+"""
+
+#normalize.py
+#文字列カラムの正規化（置換規則・全角半角の統一）を、カラムの値を連結した1つの文字列に対して規則ごとに1回の str.replace で行う
+
+# ライブラリのインポート
+import functools # 文字ごとの判定の結果の保存
+import unicodedata # NFKC正規化による全角・半角の統一（ﾘﾊﾋﾞﾘ -> リハビリ、１ -> 1）
+import numpy as np # 正規化済みの一意な値をもとの行に展開するために利用
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+
+
+# 複数の値を1つの文字列に連結する際の区切り文字（置換規則に含まれず、NFKC正規化でも変わらず前後の文字と結びつかない文字）
+SEP = "\x00"
+# 重複を除いてから正規化するかを判定する標本の行数と、標本の重複のない値の割合の上限
+# （重複のほとんどないカラムでは、重複の除去の方が連結した文字列の置換より時間がかかる）
+DEDUPE_SAMPLE = 1000
+DEDUPE_RATIO = 0.5
+
+
+# NFKC正規化で変わらず、前の文字と結びつかない文字（この文字の直前で文字列を区切って正規化しても結果が変わらない）
+# 結合文字（濁点など）・ハングルの母音と終声の字母は、単独では変わらなくても前の文字と結びつくため含めない
+@functools.lru_cache(maxsize=None)
+def boundary(c):
+    return (unicodedata.is_normalized("NFKC", c) and not unicodedata.combining(c)
+            and not unicodedata.category(c).startswith("M") and not "\u1160" <= c <= "\u11ff")
+
+# 文字列（SEP で連結した複数の値でもよい）のNFKC正規化（unicodedata.normalize("NFKC", text) と同じ結果）
+# 長い文字列全体の正規化は遅いため、変わる文字（全角英数字・半角カナなど）を文字ごとに str.replace で置き換える
+# （1文字をそのNFKC正規化の結果に置き換えても、文字列全体のNFKC正規化の結果は変わらない）
+# 文字列に含まれる文字の種類は、コードポイントの配列の bincount で求める
+# 置き換えで生じた結合文字（例: 半角の濁点 ﾞ -> U+3099）は、直前の文字との組ごとに正規化して結びつける
+def nfkc(text):
+    if text.isascii():
+        return text
+    points = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    combining = set()
+    for c in map(chr, np.flatnonzero(np.bincount(points)[0x80:]) + 0x80):
+        if boundary(c):
+            continue
+        n = unicodedata.normalize("NFKC", c)
+        if n != c:
+            text = text.replace(c, n)
+        combining.update(x for x in n if not boundary(x))
+    if not combining:
+        return text
+    # 結合文字が連続する場合（並べ替えが起こりうる）は、結合文字を含む値ごとに正規化する
+    if any(a + b in text for a in combining for b in combining):
+        return SEP.join(unicodedata.normalize("NFKC", x) if any(c in x for c in combining) else x for x in text.split(SEP))
+    for c in combining:
+        parts = text.split(c)
+        for p in {x[-1] for x in parts[:-1] if x}:
+            n = unicodedata.normalize("NFKC", p + c)
+            if n != p + c:
+                text = text.replace(p + c, n)
+    return text
+
+
+class Normalizer:
+    # 置換規則のリストをまとめた正規化関数
+    # pre の置換 -> NFKC正規化 -> pairs の置換 をこの順に適用する
+    # カラムは値を区切り文字（SEP）で連結した1つの文字列として処理し、各規則を str.replace で連結した文字列全体に1回ずつ適用する
+    # （値ごとの Python のループや、カラム全体を規則の数だけ走査する rep() の繰り返しに代わるもの）
+    # 置換はリテラル文字列として、pre、pairs それぞれの規則の順に行う
+    # NFKC正規化で変わらない値（大半の値）については、pre と pairs の規則を rep() でこの順に適用した場合と同じ結果になる
+    # NFKC正規化で変わる値（全角英数字・半角カナなど）は、pre の適用後に全角・半角が統一されてから pairs が適用される
+    # NFKCより前に適用する規則（pre）では、全角スペースと半角スペースを区別できる
+    def __init__(self, pairs=(), pre=(), nfkc=True):
+        self.pre = list(pre)
+        self.pairs = list(pairs)
+        self.nfkc = nfkc
+        # 区切り文字を含む規則は、連結した文字列の値の境界を変えてしまうため使えない
+        if any(SEP in old or SEP in new for old, new in self.pre + self.pairs):
+            raise ValueError("置換規則に区切り文字（SEP）は使えません")
+
+    # 1つの文字列（SEP で連結した複数の値でもよい）の正規化
+    # SEP は置換規則に含まれず、NFKC正規化でも前後の文字と結びつかないため、連結した文字列の正規化は値ごとの正規化を連結したものと同じになる
+    def apply(self, text):
+        for old, new in self.pre:
+            text = text.replace(old, new)
+        if self.nfkc:
+            text = nfkc(text)
+        for old, new in self.pairs:
+            text = text.replace(old, new)
+        return text
+
+    # 1つの値の正規化（文字列以外の値、欠損値はそのまま返す）
+    def __call__(self, x):
+        if not isinstance(x, str):
+            return x
+        return self.apply(x)
+
+
+# 値の配列の正規化
+# すべて文字列（欠損値を含まない）で区切り文字を含まない場合は、SEP で連結して正規化関数を1回だけ適用してから分割する
+def apply_values(values, normalizer):
+    if pd.api.types.infer_dtype(values, skipna=False) == "string":
+        text = SEP.join(values.tolist())
+        if text.count(SEP) == len(values) - 1:
+            return normalizer.apply(text).split(SEP)
+    return [normalizer(v) for v in values]
+
+# カラムの正規化（欠損値は NaN とする）
+# 重複の多いカラム（標本の重複のない値の割合が DEDUPE_RATIO 以下）は、重複を除いた値のみを正規化してもとの行に展開する
+def normalize(s, normalizer):
+    s = s.astype(object, copy=False)
+    values = s.to_numpy()
+    sample = values[::max(1, len(values) // DEDUPE_SAMPLE)].tolist()
+    if len(set(sample)) <= DEDUPE_RATIO * len(sample):
+        codes, uniques = pd.factorize(s)
+        # 欠損値（codes = -1）は末尾に加えた NaN を参照する
+        out = np.array(apply_values(uniques, normalizer) + [np.nan], dtype=object)
+        return pd.Series(out[codes], index=s.index, dtype=object)
+    # 欠損値を含まない文字列のカラムは、欠損値の判定を省く
+    if pd.api.types.infer_dtype(values, skipna=False) == "string":
+        out = np.array(apply_values(values, normalizer), dtype=object)
+    else:
+        valid = pd.notna(values)
+        out = np.full(len(values), np.nan, dtype=object)
+        out[valid] = apply_values(values[valid], normalizer)
+    return pd.Series(out, index=s.index, dtype=object)
+
+
+# --- 診療科目カラム（c1/c2/.../c7 を結合した文字列）の正規化 ---
+# NFKC正規化の前に、以前の append.py と同じ順序で、プレースホルダ（*）の除去、全角スペースのセパレータ（/）への統一、
+# 重複するセパレータの単一化、半角スペースの除去を行う（例: '内科　*' -> '内科/*'）
+subject_pre = [
+    ('/*', ''),
+    ('　', '/'),
+    ('//', '/'),
+    (' ', ''),
+    ]
+# 病床数情報（例: /52 -> :52）の区別
+subject_pairs = [('/{0}'.format(i), ':{0}'.format(i)) for i in range(1,10)]
+
+SUBJECT = Normalizer(subject_pairs, pre=subject_pre)
+
+# --- 診療科目の集合を文字列化したもの（例: {'内科', '一般:52'}）の正規化 ---
+# 括弧・引用符・空白を除去し、区切り文字をカンマに統一（全角数字はNFKC正規化で半角になる）
+subject_list_pairs = [
+    ('{',''),
+    ('}',''),
+    (" ", ""),
+    ("'", ""),
+    ("、", ","),
+    ("・", ","),
+    ("/", ","),
+    ]
+
+SUBJECT_LIST = Normalizer(subject_list_pairs)
+
+# --- 診療科名から数字とコロンを削除（純粋な科目名抽出のためのクレンジング） ---
+subject_name_pairs = [(":", "")] + [(str(i), "") for i in range(10)]
+
+SUBJECT_NAME = Normalizer(subject_name_pairs, nfkc=False)
+
+# --- 常勤・非常勤医師/歯科医師数カラムの正規化 ---
+# 人数以外の文字を除去し、欠損値のプレースホルダ（*）をゼロ（0）とする
+# 全角の数字・括弧・コロンはNFKC正規化で半角になるため、半角の規則で除去される
+count_pairs = [
+    (' ',''),
+    ('常勤',''),
+    ('非',''),
+    ('医',''),
+    ('歯',''),
+    ('(',''),
+    (')',''),
+    (':',''),
+    ('*','0'),
+    ]
+
+COUNT = Normalizer(count_pairs)
+
+# --- 郵便番号の区切り文字の標準化 ---
+post_pairs = [
+    ('ー', '-'),
+    ('‐', '-'),
+    ('−', '-'),
+    ('―', '-'),
+    ]
+
+POST = Normalizer(post_pairs)
+
+# --- 全角・半角の統一のみ（リファレンス科目名などに利用） ---
+WIDTH = Normalizer()
+
+# --- 医療機関コードの正規化（区切り文字・空白の除去、全角数字の半角化） ---
+# append.py の出力では区切り文字は除去済みだが、以前のバージョンの出力や手作業で修正したデータの照合にも用いる
+code_pairs = [
+    (',', ''),
+    ('-', ''),
+    (' ', ''),
+    ]
+
+CODE = Normalizer(code_pairs)
+
+# --- 医療機関名・住所の照合キー（全角・半角の統一と空白の除去） ---
+# データ月をまたいで医療機関を対応づける際に、コードが変わった医療機関を名称と住所で照合するために用いる
+NAME_KEY = Normalizer([(' ', '')])
+
+# --- 住所の照合キー（ジオコーディング、geocode.py） ---
+# 全角・半角の統一、空白の除去、ハイフン類・「ヶ」の表記ゆれの統一、「大字」の除去
+# 長音記号（ー）は町名（例: センター）に含まれるため置換しない
+address_pairs = [
+    (' ', ''),
+    ('‐', '-'),
+    ('−', '-'),
+    ('―', '-'),
+    ('–', '-'),
+    ('ヶ', 'ケ'),
+    ('ヵ', 'ケ'),
+    ('大字', ''),
+    ]
+
+ADDRESS = Normalizer(address_pairs)
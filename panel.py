@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:47:30 2026
+
+@author: tkurihara827
+"""
+
+#panel.py
+#複数のデータ月（r0512, r0603, ...）の最終データセットを、医療機関 × データ月のパネルデータとして出力
+#各データ月の append.py を独立したプロセスとして並列に実行し、医療機関をデータ月をまたいで対応づけたうえで、
+#データ月・都道府県で分割した列指向形式のデータセットに追記する
+
+# ==============================================================================
+# 1. 設定の外部化と作業ディレクトリの設定
+# ==============================================================================
+
+# ライブラリのインポート
+import os # オペレーティングシステムレベルの機能、特にファイルパス操作のために利用
+import re # データ月の文字列（例: r0512）の解釈
+import sys # append.py を実行する Python の実行ファイルの取得
+import shutil # パネルデータの作り直し時のディレクトリ削除
+import argparse # コマンドライン引数（データ月のリスト）の解釈
+import subprocess # データ月ごとの append.py の実行（独立したプロセス）
+from concurrent.futures import ThreadPoolExecutor # 複数のデータ月の append.py の同時実行
+import numpy as np # 医療機関IDの割り当て
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+import pyarrow as pa # 列指向形式のテーブルへの変換
+import pyarrow.dataset as ds # データ月・都道府県で分割したデータセットの書き出し
+import storage # append.pyが出力した列指向形式の中間ファイルの読み込み
+from manifest import Manifest, file_hash, config_hash # パネルに追加済みのデータ月の台帳
+from normalize import normalize, CODE, NAME_KEY # 医療機関コードと名称・住所の照合キーの正規化
+from wareki import ERA_ALIASES, ERA_BASE # データ月の元号の略記（r, h など）から西暦への換算
+
+# 外部化された設定変数
+# 作業ディレクトリ名（例: 'r512'）
+WORKDIR_NAME = 'r512'
+# パネルデータに含めるデータ月（各データ月の {DATA_MONTH}raw ディレクトリを BASE_DIR 直下に置く）
+MONTHS = ['r0512', 'r0603']
+
+# ベースディレクトリ指定
+BASE_DIR = f'/Users/tkurihara/Desktop/v.1.0.0/{WORKDIR_NAME}'
+
+# append.pyの中間データの保存形式（append.pyの INTERMEDIATE_FORMAT と同じものを指定）
+INTERMEDIATE_FORMAT = 'parquet'
+
+# 同時に処理するデータ月の数（None: CPUコア数とデータ月の数の小さい方）
+# 各データ月の都道府県データの下処理には、CPUコア数をこの数で割ったプロセス数を用いる
+MONTH_WORKERS = None
+
+# パネルデータの出力先（BASE_DIR直下）
+# PANEL_DIR/data/month=r0512/pref=13/part-0.parquet のように、データ月・都道府県で分割して保存する
+PANEL_DIR = 'panel'
+
+# append.py のパス（panel.py と同じディレクトリ）
+APPEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'append.py')
+
+
+# --- データ月の順序 ---
+# データ月の文字列（元号の略記 + 和暦年2桁 + 月2桁、例: r0512 -> 2023年12月）を西暦の年月（yyyymm）に換算
+def month_key(month):
+    m = re.fullmatch(r"([A-Za-z])(\d{2})(\d{2})", month)
+    if m is None or m.group(1) not in ERA_ALIASES:
+        raise ValueError(f"データ月の形式が正しくありません: {month}（例: r0512）")
+    return (ERA_BASE[ERA_ALIASES[m.group(1)]] + int(m.group(2))) * 100 + int(m.group(3))
+
+
+# --- データ月ごとの append.py の実行 ---
+# 1つのデータ月の append.py を独立したプロセスとして実行し、ログを PANEL_DIR/logs/{month}.log に保存
+# 戻り値: 終了コード（0: 成功）
+def run_month(month, base_dir, workers, force=False):
+    os.makedirs(os.path.join(PANEL_DIR, 'logs'), exist_ok=True)
+    cmd = [sys.executable, APPEND, '--month', month, '--base-dir', base_dir, '--workers', str(workers)]
+    if force:
+        cmd.append('--force')
+    with open(os.path.join(PANEL_DIR, 'logs', f'{month}.log'), 'w', encoding='utf-8') as log:
+        return subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT).returncode
+
+# 複数のデータ月の append.py を並列に実行（各プロセスは互いに独立）
+# 戻り値: 処理に失敗したデータ月のリスト
+def run_months(months, base_dir, month_workers=None, force=False):
+    if not months:
+        return []
+    cpus = os.cpu_count() or 1
+    month_workers = month_workers or min(len(months), cpus)
+    workers = max(1, cpus // month_workers)
+    with ThreadPoolExecutor(max_workers=month_workers) as ex:
+        codes = dict(zip(months, ex.map(lambda m: run_month(m, base_dir, workers, force), months)))
+    for m, code in codes.items():
+        print(f"  {m}: " + ("完了" if code == 0 else f"失敗（終了コード {code}、{PANEL_DIR}/logs/{m}.log を参照）"))
+    return [m for m, code in codes.items() if code != 0]
+
+
+# --- 医療機関のデータ月をまたいだ対応づけ ---
+# 対応表（PANEL_DIR/facilities）：医療機関ID、最新のコードと名称・住所の照合キー、最初と最後に現れたデータ月
+LINK_COLUMNS = ['facility_id', 'code', 'name_key', 'first_month', 'last_month']
+
+# 1つのデータ月の医療機関に医療機関IDを割り当てる
+# 1. コード（都道府県番号 + 医療機関コード）が一致する既存の医療機関
+# 2. コードが再発行された場合に備え、名称と住所が一致する既存の医療機関（同じデータ月で未対応のものに限る）
+# 3. いずれにも一致しない場合は新しい医療機関ID
+# 戻り値: (医療機関ID, 対応づけの方法（'code' / 'name_address' / 'new'）, 更新後の対応表)
+def link(df, links, month):
+    key = month_key(month)
+    code = normalize(df['code'].map(str, na_action='ignore'), CODE).reset_index(drop=True)
+    name_key = (normalize(df['name'], NAME_KEY).fillna('') + '|' + normalize(df['address'], NAME_KEY).fillna('')).reset_index(drop=True)
+    fid = np.full(len(df), -1, dtype=np.int64)
+    how = np.full(len(df), 'new', dtype=object)
+
+    # 1. コードによる対応づけ（同じデータ月でコードが重複する場合は最初の行のみ）
+    by_code = links.sort_values('last_month').drop_duplicates('code', keep='last').set_index('code')['facility_id']
+    hit = code.map(by_code).where(code.notna() & ~code.duplicated()).to_numpy()
+    ok = ~pd.isna(hit)
+    fid[ok] = hit[ok].astype(np.int64)
+    how[ok] = 'code'
+
+    # 2. 名称と住所による対応づけ（このデータ月でまだ対応づけられていない医療機関が対象）
+    rest = links[~links['facility_id'].isin(fid[ok])]
+    by_name = rest.sort_values('last_month').drop_duplicates('name_key', keep='last').set_index('name_key')['facility_id']
+    todo = (fid < 0) & ~name_key.where(fid < 0).duplicated(keep='first').to_numpy() & (name_key != '|').to_numpy()
+    hit = name_key.map(by_name).where(todo).to_numpy()
+    ok = ~pd.isna(hit)
+    fid[ok] = hit[ok].astype(np.int64)
+    how[ok] = 'name_address'
+
+    # 3. 新しい医療機関ID
+    new = fid < 0
+    start = int(links['facility_id'].max()) + 1 if len(links) else 1
+    fid[new] = np.arange(start, start + new.sum())
+
+    # 対応表の更新（既存の医療機関は最新のコード・照合キー・データ月に置き換え、新しい医療機関は追加）
+    cur = pd.DataFrame({'facility_id': fid, 'code': code, 'name_key': name_key}).drop_duplicates('facility_id')
+    links = links.set_index('facility_id')
+    first = links['first_month'].reindex(cur['facility_id']).fillna(key).astype(np.int64).to_numpy()
+    cur['first_month'] = first
+    cur['last_month'] = key
+    links = pd.concat([links[~links.index.isin(cur['facility_id'])].reset_index(), cur], ignore_index=True)
+    return fid, how, links[LINK_COLUMNS].sort_values('facility_id').reset_index(drop=True)
+
+
+# --- パネルデータの読み書き ---
+# 対応表の読み込み（存在しない場合は空の対応表）
+def load_links():
+    base = os.path.join(PANEL_DIR, 'facilities')
+    if storage.exists(base, INTERMEDIATE_FORMAT):
+        return storage.read(base, INTERMEDIATE_FORMAT)
+    return pd.DataFrame({
+        'facility_id': pd.Series(dtype=np.int64),
+        'code': pd.Series(dtype=object),
+        'name_key': pd.Series(dtype=object),
+        'first_month': pd.Series(dtype=np.int64),
+        'last_month': pd.Series(dtype=np.int64),
+    })
+
+# 1つのデータ月のパネルデータの書き出し（データ月・都道府県で分割）
+# 同じデータ月の既存の分割ファイルのみを置き換え、ほかのデータ月の分割ファイルには触れない
+def write_month(df, month):
+    df = storage.typed(df).reset_index(drop=True)
+    df['month'] = month
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        os.path.join(PANEL_DIR, 'data'),
+        format='parquet',
+        partitioning=['month', 'pref'],
+        partitioning_flavor='hive',
+        existing_data_behavior='delete_matching',
+        basename_template='part-{i}.parquet',
+    )
+
+# パネルデータの読み込み（columns: 読み込むカラム、filters: 例 [('pref', '=', 13)]）
+# month, pref は分割のキーから復元される
+def read_panel(columns=None, filters=None):
+    return pd.read_parquet(os.path.join(PANEL_DIR, 'data'), columns=columns, filters=filters)
+
+# パネルデータへのデータ月の追加
+# 追加済みのデータ月より新しいデータ月は、過去の分割ファイルを作り直さずに追記する
+# 追加済みのデータ月の最終データセットが変わった場合や、追加済みのものより古いデータ月を加える場合は、
+# 対応づけの順序が変わるため、パネルデータ全体を作り直す
+def append_months(months, rebuild=False):
+    os.makedirs(PANEL_DIR, exist_ok=True)
+    manifest = Manifest(os.path.join(PANEL_DIR, 'manifest.json'))
+    config = config_hash({"fmt": INTERMEDIATE_FORMAT, "link_columns": LINK_COLUMNS})
+    digests = {m: file_hash(storage.path(os.path.join(m + 'merge', 'total2'), INTERMEDIATE_FORMAT)) for m in months}
+    done = sorted((m for m in manifest.entries), key=month_key)
+    known = set(done) | set(months)
+    stale = [m for m in done if m in digests and not manifest.is_current(m, digests[m], config)]
+    latest = month_key(done[-1]) if done else None
+    older = [m for m in months if m not in done and latest is not None and month_key(m) < latest]
+    if rebuild or stale or older:
+        if stale or older:
+            print(f"  追加済みのデータ月の変更（{', '.join(stale) or 'なし'}）または過去のデータ月の追加（{', '.join(older) or 'なし'}）があるため、パネルデータを作り直します")
+        missing = [m for m in done if m not in digests]
+        if missing:
+            raise FileNotFoundError(f"パネルデータの作り直しには、追加済みのすべてのデータ月を指定してください（不足: {', '.join(missing)}）")
+        shutil.rmtree(os.path.join(PANEL_DIR, 'data'), ignore_errors=True)
+        for p in [storage.path(os.path.join(PANEL_DIR, 'facilities'), INTERMEDIATE_FORMAT), manifest.path]:
+            if os.path.exists(p):
+                os.remove(p)
+        manifest = Manifest(manifest.path)
+        todo = sorted(known, key=month_key)
+    else:
+        todo = sorted((m for m in months if m not in done), key=month_key)
+
+    links = load_links()
+    for m in todo:
+        df = storage.read(os.path.join(m + 'merge', 'total2'), INTERMEDIATE_FORMAT)
+        fid, how, links = link(df, links, m)
+        df.insert(0, 'facility_id', fid)
+        df.insert(1, 'link', how)
+        write_month(df, m)
+        counts = pd.Series(how).value_counts()
+        print(f"  {m}: {len(df)} 件（コードで対応 {counts.get('code', 0)} / 名称・住所で対応 {counts.get('name_address', 0)} / 新規 {counts.get('new', 0)}）")
+        # 対応表と台帳は、データ月の書き出しが完了してから保存する
+        storage.write(links, os.path.join(PANEL_DIR, 'facilities'), INTERMEDIATE_FORMAT)
+        manifest.record(m, digests[m])
+        manifest.save(config)
+    return todo
+
+
+# ==============================================================================
+# 2. データ処理（スクリプトとして実行された場合のみ）
+# ==============================================================================
+if __name__ == '__main__':
+    # コマンドライン引数（Spyderなどから引数なしで実行した場合は上記の設定値を使用）
+    parser = argparse.ArgumentParser(description="複数のデータ月の医療機関 × データ月のパネルデータを出力")
+    parser.add_argument("months", nargs="*", default=MONTHS, help="パネルデータに含めるデータ月（例: r0512 r0603）")
+    parser.add_argument("--reprocess", action="store_true", help="最終データセットのあるデータ月も append.py を再実行する")
+    parser.add_argument("--force", action="store_true", help="append.py を --force 付きで実行する（--reprocess を含む）")
+    parser.add_argument("--rebuild", action="store_true", help="パネルデータ全体を作り直す")
+    args, _ = parser.parse_known_args()
+    months = sorted(dict.fromkeys(args.months), key=month_key)
+
+    # 作業ディレクトリの変更
+    try:
+        os.chdir(BASE_DIR)
+        print(f"作業ディレクトリ: {os.getcwd()}")
+    except FileNotFoundError:
+        print(f"エラー: 指定されたディレクトリ '{BASE_DIR}' が見つかりません。パスを確認してください。")
+
+    # 最終データセット（{month}merge/total2）のないデータ月について、append.py を並列に実行
+    run = [m for m in months if args.reprocess or args.force or not storage.exists(os.path.join(m + 'merge', 'total2'), INTERMEDIATE_FORMAT)]
+    print(f"データ月の処理: {len(run)} 件（{', '.join(run) or 'なし'}）")
+    failed = run_months(run, os.getcwd(), MONTH_WORKERS, args.force)
+    # 失敗したデータ月はパネルデータに追加しない（次回の実行時に追加される）
+    months = [m for m in months if m not in failed]
+
+    print("パネルデータへの追加:")
+    added = append_months(months, args.rebuild)
+    print(f"パネルデータ: {PANEL_DIR}/data（追加したデータ月: {', '.join(added) or 'なし'}）")
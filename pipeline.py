@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 03:05:47 2026
+
+@author: tkurihara827
+"""
+
+#pipeline.py
+#データ処理を名前のついた段階（ingest, merge, ..., geocode, geocode-join）に分け、段階ごとの出力を中間ファイルとして保存する
+#任意の段階から再開（--from-stage）し、任意の段階で停止（--to-stage）できる
+#段階ごとの処理時間・最大メモリ使用量・行数を MERGE_DIR/run_report.jsonl, run_report.csv に記録する
+
+# ==============================================================================
+# 1. 設定の外部化と作業ディレクトリの設定
+# ==============================================================================
+
+# ライブラリのインポート
+import os # オペレーティングシステムレベルの機能、特にファイルパス操作のために利用
+import time # 段階ごとの処理時間の表示
+import argparse # コマンドライン引数（データ月・ベースディレクトリ・開始/終了の段階）の解釈
+import storage # 段階の出力の列指向形式での保存・読み込み
+import instrument # 段階ごとの処理時間・メモリ使用量・行数の計測と実行記録
+from manifest import Manifest, file_hash # 保存した段階の出力のハッシュ値の台帳
+
+# 外部化された設定変数は append.py（ingest 〜 export）と gis.py（geocode, geocode-join）のものを用いる
+
+
+# --- 段階 ---
+class Stage:
+    # name: 段階名、func: 処理の関数 func(ctx, df)（df は前の段階の出力、最初の段階では None）
+    # inputs: 段階が読み込むファイル（Context の属性名、開始前に存在を確認する）
+    # outputs: 段階が出力データフレームのほかに書き出すファイル（Context の属性名）
+    # checkpoint: 出力データフレームの保存先（Context の属性名、None の場合は checkpoint_dir/{name}）
+    def __init__(self, name, func, inputs=(), outputs=(), checkpoint=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.checkpoint = checkpoint
+
+
+# --- 実行時の設定とパス ---
+class Context:
+    # month: データ月（例: r0512）、fmt: 中間ファイルの形式（storage.FORMATS）
+    # settings: 段階の関数が参照する設定（append.settings() など、属性として参照できる）
+    # パスはベースディレクトリからの相対パス（実行前にベースディレクトリへ移動する）
+    def __init__(self, month, fmt="parquet", **settings):
+        self.month = month
+        self.fmt = fmt
+        self.settings = settings
+        self.raw_dir = month + 'raw'
+        self.proc_dir = month
+        self.merge_dir = month + 'merge'
+        self.checkpoint_dir = os.path.join(self.merge_dir, 'checkpoints')
+        # 中間および最終的な統合データセットのファイルパス（中間ファイルは拡張子を除いたパス）
+        self.total_file = os.path.join(self.merge_dir, 'total')
+        self.total2_data = os.path.join(self.merge_dir, 'total2')
+        self.total2_file = os.path.join(self.merge_dir, 'total2.xlsx')
+        self.total3_data = os.path.join(self.merge_dir, 'total3')
+        self.total3_file = os.path.join(self.merge_dir, 'total3.xlsx')
+        # ジオコーディング処理に用いる外部連携ファイルのパス
+        self.address_csv = os.path.join(self.merge_dir, 'address.csv')
+        self.address_out_csv = os.path.join(self.merge_dir, 'address_out.csv')
+        # ジオコーディングサービスへの送信結果の記録（csis.py、中断後の再実行では記録済みの住所を送信しない）
+        self.geocode_journal = os.path.join(self.merge_dir, 'geocode_journal.jsonl')
+        # 最終データセットのカラムごとのメモリ使用量（型の適用前後）
+        self.memory_report = os.path.join(self.merge_dir, 'memory_report.csv')
+        # 段階ごとの計測結果の実行記録（拡張子を除いたパス）と、プロファイル結果の保存先
+        self.run_report = os.path.join(self.merge_dir, 'run_report')
+        self.profile_dir = os.path.join(self.merge_dir, 'profile')
+
+    def __getattr__(self, name):
+        settings = self.__dict__.get('settings', {})
+        if name in settings:
+            return settings[name]
+        raise AttributeError(name)
+
+    # 段階の出力の保存先（拡張子を除いたパス）
+    def checkpoint(self, stage):
+        if stage.checkpoint:
+            return getattr(self, stage.checkpoint)
+        return os.path.join(self.checkpoint_dir, stage.name)
+
+
+# --- 段階の実行 ---
+# 段階名の位置（存在しない段階名はエラー）
+def position(stages, name):
+    names = [s.name for s in stages]
+    if name not in names:
+        raise ValueError(f"段階 '{name}' はありません（{', '.join(names)} のいずれかを指定）")
+    return names.index(name)
+
+# ファイルまたは中間ファイル（拡張子を除いたパス）が存在するか
+def available(path, fmt):
+    return os.path.exists(path) or storage.exists(path, fmt)
+
+# 保存された段階の出力の読み込み（台帳のハッシュ値と一致しない場合はエラー）
+def load(stage, ctx, manifest):
+    path = storage.path(ctx.checkpoint(stage), ctx.fmt)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"段階 '{stage.name}' の出力（{path}）がありません。前の段階から実行してください。")
+    if stage.name not in manifest.entries:
+        raise ValueError(f"段階 '{stage.name}' の出力（{path}）は、その後に前の段階を実行し直したため古くなっています。前の段階から実行してください。")
+    if manifest.entries[stage.name] != file_hash(path):
+        raise ValueError(f"段階 '{stage.name}' の出力（{path}）が記録と異なります。前の段階から実行し直してください。")
+    return storage.read(ctx.checkpoint(stage), ctx.fmt)
+
+# stages のうち from_stage から to_stage まで（どちらも含む）を順に実行する
+# from_stage が最初の段階でない場合は、直前の段階の保存された出力から再開する
+# 各段階の出力は中間ファイルとして保存し、ハッシュ値を台帳（checkpoint_dir/manifest.json）に記録する
+# 段階ごとの計測結果は、途中で失敗した場合も含めて実行記録（ctx.run_report）に追記する
+# profile: プロファイルを取る段階名（None: 取らない）、profiler: 'cprofile' または 'pyinstrument'（instrument.profile()）
+# downstream: stages の後に続く段階（例: append.py から実行する場合の gis.STAGES）
+# 段階を実行すると、stages 内の後続の段階と downstream のすべての段階の記録を台帳から削除する
+# 戻り値: 最後に実行した段階の出力
+def run(stages, ctx, from_stage=None, to_stage=None, profile=None, profiler="cprofile", downstream=()):
+    start = position(stages, from_stage) if from_stage else 0
+    stop = position(stages, to_stage) if to_stage else len(stages) - 1
+    if start > stop:
+        raise ValueError(f"開始の段階 '{from_stage}' が終了の段階 '{to_stage}' より後にあります")
+    if profile:
+        position(stages, profile)
+    os.makedirs(ctx.checkpoint_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(ctx.checkpoint_dir, 'manifest.json'))
+    df = load(stages[start - 1], ctx, manifest) if start > 0 else None
+    report = instrument.RunReport(ctx.run_report, ctx.month, [s.name for s in stages[start:stop + 1]])
+    try:
+        for stage in stages[start:stop + 1]:
+            missing = [getattr(ctx, a) for a in stage.inputs if not available(getattr(ctx, a), ctx.fmt)]
+            if missing:
+                raise FileNotFoundError(f"段階 '{stage.name}' の入力がありません: {', '.join(missing)}")
+            rows_in = None if df is None else len(df)
+            s = instrument.start()
+            try:
+                if stage.name == profile:
+                    os.makedirs(ctx.profile_dir, exist_ok=True)
+                    out = instrument.profile(stage.func, (ctx, df), os.path.join(ctx.profile_dir, stage.name), profiler)
+                else:
+                    out = stage.func(ctx, df)
+                # 段階の間で受け渡すデータは、保存した出力から再開した場合と同じ型にそろえる
+                df = storage.typed(out)
+                del out
+            except BaseException:
+                report.add(stage.name, instrument.stop(s), rows_in, None, status="error")
+                raise
+            measures = instrument.stop(s)
+            t = time.perf_counter()
+            path = storage.write(df, ctx.checkpoint(stage), ctx.fmt)
+            manifest.record(stage.name, file_hash(path))
+            # 再開時に古い出力を読み込まないよう、後続の段階（この実行に含まれない段階も含む）の記録を削除する
+            for later in stages[stages.index(stage) + 1:] + list(downstream):
+                manifest.record(later.name, None)
+            manifest.save(None)
+            report.add(stage.name, measures, rows_in, len(df), checkpoint_s=round(time.perf_counter() - t, 3))
+            print(f"[{stage.name}] {len(df)} 行 {measures['wall_s']:.1f} 秒（{path}）")
+    finally:
+        report.save()
+        print("段階ごとの計測結果（" + ctx.run_report + ".csv）:\n" + report.summary())
+    return df
+
+
+# ==============================================================================
+# 2. データ処理（スクリプトとして実行された場合のみ）
+# ==============================================================================
+if __name__ == '__main__':
+    import append # 段階 ingest 〜 export と、その設定
+    import gis # 段階 geocode, geocode-join と、その設定
+    from sinks import SINKS # 最終データセットの出力形式
+    STAGES = append.STAGES + gis.STAGES
+
+    # コマンドライン引数（Spyderなどから引数なしで実行した場合は append.py の設定値を使用）
+    parser = argparse.ArgumentParser(description="段階を指定したデータ処理の実行（" + " -> ".join(s.name for s in STAGES) + "）")
+    parser.add_argument("--month", default=None, help="処理対象のデータ月（append.py の DATA_MONTH、例: r0603）")
+    parser.add_argument("--base-dir", default=None, help="ベースディレクトリ（append.py の BASE_DIR）")
+    parser.add_argument("--from-stage", default=None, help="この段階から実行する（直前の段階の保存された出力から再開）")
+    parser.add_argument("--to-stage", default=None, help="この段階まで実行する")
+    parser.add_argument("--workers", type=int, default=None, help="都道府県データの読み込みに用いるプロセス数（INGEST_WORKERS）")
+    parser.add_argument("--force", action="store_true", help="変更のない都道府県も含めてすべて再処理する")
+    parser.add_argument("--formats", nargs="+", default=None, choices=list(SINKS), help="最終データセット（total2 / total3）の出力形式（sinks.SINKS、append.py の TOTAL2_FORMATS と gis.py の TOTAL3_FORMATS）")
+    parser.add_argument("--endpoint", default=None, help="ジオコーディングサービス（CSV Geocoding Service 形式）のURL（gis.py の GEOCODE_ENDPOINT）")
+    parser.add_argument("--profile", default=None, help="プロファイルを取る段階（結果は MERGE_DIR/profile）")
+    parser.add_argument("--profiler", default="cprofile", choices=["cprofile", "pyinstrument"], help="プロファイラ")
+    args, _ = parser.parse_known_args()
+    append.FORCE = append.FORCE or args.force
+    if args.workers is not None:
+        append.INGEST_WORKERS = args.workers
+    if args.formats:
+        append.TOTAL2_FORMATS = args.formats
+        gis.TOTAL3_FORMATS = args.formats
+    gis.GEOCODE_ENDPOINT = args.endpoint or gis.GEOCODE_ENDPOINT
+    base_dir = args.base_dir or append.BASE_DIR
+
+    # 作業ディレクトリの変更
+    try:
+        os.chdir(base_dir)
+        print(f"作業ディレクトリ: {os.getcwd()}")
+    except FileNotFoundError:
+        print(f"エラー: 指定されたディレクトリ '{base_dir}' が見つかりません。パスを確認してください。")
+
+    ctx = Context(args.month or append.DATA_MONTH, append.INTERMEDIATE_FORMAT, **{**append.settings(), **gis.settings()})
+    run(STAGES, ctx, args.from_stage, args.to_stage, args.profile, args.profiler)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:26:14 2026
+
+@author: tkurihara827
+"""
+
+#readers.py
+#地方局のエクセルファイル（コード内容別医療機関一覧表）の読み込みエンジンの切り替え
+#どのエンジンでも pd.read_excel(..., skiprows=pre0, header=None, names=pre1) と同じデータフレームを返す
+
+# ライブラリのインポート
+import importlib.util # オプションの依存ライブラリがインストールされているかの確認
+import numpy as np # 欠損値（NaN）の表現に利用
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+
+# pd.read_excel が既定で欠損値とみなす文字列（pandas のドキュメントの na_values の既定値）
+# openpyxl 以外のエンジンで読み込んだ値にも同じ規則を適用し、どのエンジンでも同じデータフレームを返す
+STR_NA_VALUES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+    }
+
+# 読み込みエンジン（速い順）
+# 'calamine'       : Rust実装のcalamineによる読み込み（python-calamine が必要）
+# 'openpyxl_stream': openpyxl の read_only モードで行を逐次読み込み（セルのオブジェクトツリーを作らない）
+# 'openpyxl'       : pd.read_excel の既定の読み込み（従来の処理）
+ENGINES = ("calamine", "openpyxl_stream", "openpyxl")
+
+
+# エンジンが利用可能か
+def available(engine):
+    if engine == "calamine":
+        return importlib.util.find_spec("python_calamine") is not None
+    if engine in ("openpyxl_stream", "openpyxl"):
+        return importlib.util.find_spec("openpyxl") is not None
+    return False
+
+# 使用するエンジンの決定（'auto' の場合は利用可能なもののうち最も速いもの）
+def select(engine="auto"):
+    if engine == "auto":
+        for e in ENGINES:
+            if available(e):
+                return e
+        raise ImportError("エクセルファイルの読み込みには openpyxl または python-calamine が必要です")
+    if engine not in ENGINES:
+        raise ValueError(f"未対応の読み込みエンジンです: {engine}（auto, {', '.join(ENGINES)} のいずれかを指定）")
+    if not available(engine):
+        raise ImportError(f"読み込みエンジン {engine} に必要なライブラリがインストールされていません")
+    return engine
+
+# エクセルファイルの読み込み
+# skiprows: 読み飛ばす先頭の行（pre0）、names: カラム名（pre1）
+def read(path, skiprows, names, engine="auto"):
+    engine = select(engine)
+    if engine == "openpyxl_stream":
+        return read_stream(path, skiprows, names)
+    return pd.read_excel(path, skiprows=skiprows, header=None, names=names, engine=engine)
+
+# openpyxl の read_only モードによる逐次読み込み
+# pd.read_excel と同じく、先頭シートを対象とし、末尾の空の行を除き（途中の空の行は残す）、
+# 整数値の浮動小数点数を整数に、欠損値とみなす文字列（"" など）を NaN に変換する
+def read_stream(path, skiprows, names):
+    import openpyxl
+    skip = set(skiprows)
+    ncol = len(names)
+    rows = []
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        for i, row in enumerate(ws.iter_rows(max_col=ncol, values_only=True)):
+            if i in skip:
+                continue
+            rows.append([convert(v) for v in row] + [np.nan] * (ncol - len(row)))
+    finally:
+        wb.close()
+    # 末尾の空の行を除外
+    while rows and all(v is np.nan for v in rows[-1]):
+        rows.pop()
+    return pd.DataFrame(rows, columns=names) if rows else pd.DataFrame(columns=names)
+
+# セルの値の変換（pandas の openpyxl 読み込みと同じ規則）
+def convert(v):
+    if v is None:
+        return np.nan
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, str) and v in STR_NA_VALUES:
+        return np.nan
+    return v
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:31:14 2026
+
+@author: tkurihara827
+"""
+
+#schema.py
+#最終データセット（total2 / total3）のカラムの型の定義と、型の適用・メモリ使用量の報告
+#ダミー変数は int8、年は uint16、月・日は uint8、都道府県・開設者・経営主体はカテゴリ型、人数・病床数は欠損値を扱える整数型とする
+
+# ライブラリのインポート
+import numpy as np # 整数型の値の範囲の確認
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+from specialty import SUBJECT_COLUMNS, TYPE_FLAG_COLUMNS # 診療科目のダミー変数・施設種別フラグのカラム名
+from beds import BED_COLUMNS # 病床種別ごとの病床数のカラム名
+
+# 届出事由フラグのカラム名
+REASON_COLUMNS = ["r_other", "r_move", "r_new", "r_exch", "r_org", "r_estach", "r_update"]
+# 常勤・非常勤医師/歯科医師数のカラム名
+DOCTOR_COLUMNS = ["n_tenu", "n_tenu_dr", "n_tenu_den", "n_ntenu", "n_ntenu_dr", "n_ntenu_den"]
+
+# 出力の型（カラム名: 型、ここにないカラム（文字列・リストなど）は変換しない）
+SCHEMA = {
+    "id": "int32",
+    "pref": "category",
+    "city_code": "category",
+    "establisher": "category",
+    "owner": "category",
+    "register_year": "UInt16",
+    "register_month": "UInt8",
+    "register_day": "UInt8",
+    "start_year": "UInt16",
+    "start_month": "UInt8",
+    "start_day": "UInt8",
+    **{c: "Int16" for c in DOCTOR_COLUMNS},
+    **{c: "int8" for c in REASON_COLUMNS},
+    **{c: "int8" for c in TYPE_FLAG_COLUMNS},
+    **{c: "Int16" for c in BED_COLUMNS},
+    "n_bed_sum": "Int32",
+    **{c: "int8" for c in SUBJECT_COLUMNS},
+}
+
+
+# 整数の値がすべて型の範囲に収まるか（欠損値は除く）
+def fits(s, dtype):
+    info = np.iinfo(pd.api.types.pandas_dtype(dtype.lower()))
+    s = pd.to_numeric(s, errors="coerce")
+    if s.isna().all():
+        return True
+    return info.min <= s.min() and s.max() <= info.max
+
+# データフレームに出力の型を適用（存在するカラムのみ）
+# 整数型の範囲に収まらない値を含むカラムは変換せず、注意を表示する
+# 欠損値を含むカラムは、欠損値を扱えない型（int8 など）には変換しない
+def apply(df, schema=SCHEMA):
+    out = {}
+    for col, dtype in schema.items():
+        if col not in df or str(df[col].dtype) == dtype:
+            continue
+        s = df[col]
+        if dtype != "category":
+            if not fits(s, dtype):
+                print(f"注意: {col} に {dtype} の範囲外の値があるため、型を変換しません")
+                continue
+            if dtype.islower() and s.isna().any():
+                dtype = dtype.capitalize()
+        out[col] = s.astype(dtype)
+    if not out:
+        return df
+    df = df.copy()
+    for col, s in out.items():
+        df[col] = s
+    return df
+
+# カラムごとのメモリ使用量の比較（バイト数、文字列は中身を含む）
+def memory_report(before, after):
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "bytes_before": before.memory_usage(index=False, deep=True),
+        "dtype_after": after.dtypes.astype(str).reindex(before.columns),
+        "bytes_after": after.memory_usage(index=False, deep=True).reindex(before.columns),
+    })
+    report.index.name = "column"
+    report.loc["(total)"] = ["", report["bytes_before"].sum(), "", report["bytes_after"].sum()]
+    report["ratio"] = (report["bytes_after"] / report["bytes_before"]).round(3)
+    return report
+
+# メモリ使用量の比較の要約（1行）
+def summary(report):
+    total = report.loc["(total)"]
+    return f"メモリ使用量: {total['bytes_before'] / 2**20:.1f} MB -> {total['bytes_after'] / 2**20:.1f} MB（{total['ratio']:.1%}）"
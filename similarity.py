@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:02:41 2026
+
+@author: tkurihara827
+"""
+
+#similarity.py
+#自由回答の診療科目と63科目リファレンスとの類似度を一括計算し、診療科目ダミー変数を作成
+
+# ライブラリのインポート
+from itertools import chain # 施設ごとの科目リストを1本の配列に平坦化するために利用
+from difflib import SequenceMatcher # **文字列類似度計算アルゴリズム (Ratcliff/Obershelpアルゴリズム)** を利用
+import numpy as np # 類似度行列の計算とargmax判定をベクトル化するために利用
+import pandas as pd # 科目文字列の一意化（factorize）とダミー変数の出力に利用
+from match_cache import cref_hash # キャッシュのキーに含めるリファレンス辞書のハッシュ値
+
+try:
+    # 文字n-gramの出現行列を疎行列として扱う（未インストールの場合はNumPyの密行列で代替）
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+# 利用可能な類似度判定基準
+METHODS = ("ratcliff", "jaccard")
+
+
+# 類似度計算関数 SequenceMatcher
+# 文字列間の類似度を浮動小数点数（0.0〜1.0）で定量化する
+def similar(a, b):
+    return SequenceMatcher(None, a, b).ratio()
+
+# 診療科文字列をカンマ区切りで安全に分割する関数
+def split_subjects(s):
+    s = str(s).replace('，', ',')
+    # 先頭のダミーカンマを除去してから分割
+    if s.startswith(','):
+        s = s[1:]
+    parts = [p.strip() for p in s.split(',') if p.strip()]
+    return parts
+
+# 文字列を文字n-gramの集合に分解（n=1は文字集合、n=2は文字bigram集合）
+# n文字に満たない短い文字列は、文字列全体を1つのn-gramとして扱う
+def ngrams(s, n=1):
+    if len(s) < n:
+        return {s} if s else set()
+    return {s[i:i+n] for i in range(len(s) - n + 1)}
+
+# 文字列リストのn-gram出現行列（行: 文字列、列: n-gram語彙）を作成
+def incidence(strings, vocab, n=1):
+    rows, cols = [], []
+    for i, s in enumerate(strings):
+        for g in ngrams(s, n):
+            j = vocab.get(g)
+            if j is not None:
+                rows.append(i)
+                cols.append(j)
+    shape = (len(strings), len(vocab))
+    data = np.ones(len(rows), dtype=np.int32)
+    if sparse is not None:
+        return sparse.csr_matrix((data, (rows, cols)), shape=shape)
+    m = np.zeros(shape, dtype=np.int32)
+    m[rows, cols] = 1
+    return m
+
+# 科目文字列とリファレンス名の共通n-gram数の行列（行列積で一括計算）
+def overlap_matrix(subjects, refs, n=1):
+    vocab = {}
+    for s in chain(subjects, refs):
+        for g in ngrams(s, n):
+            vocab.setdefault(g, len(vocab))
+    a = incidence(subjects, vocab, n)
+    b = incidence(refs, vocab, n)
+    inter = a @ b.T
+    if sparse is not None:
+        inter = inter.toarray()
+        a_size = np.asarray(a.sum(axis=1)).ravel()
+        b_size = np.asarray(b.sum(axis=1)).ravel()
+    else:
+        a_size = a.sum(axis=1)
+        b_size = b.sum(axis=1)
+    return np.asarray(inter), a_size, b_size
+
+# Jaccard類似度指数の行列：|A∩B| / |A∪B|
+def jaccard_matrix(subjects, refs, ngram=1):
+    inter, a_size, b_size = overlap_matrix(subjects, refs, ngram)
+    union = a_size[:, None] + b_size[None, :] - inter
+    scores = np.zeros(inter.shape, dtype=float)
+    np.divide(inter, union, out=scores, where=union > 0)
+    return scores
+
+# Ratcliff/Obershelp類似度（SequenceMatcher.ratio）の行列
+# 共通文字を1つも持たない組の類似度は必ず0になるため、文字集合の行列積で候補を絞り込み、
+# 候補の組についてのみ SequenceMatcher を計算する（ループ版と同一の浮動小数点値を返す）
+def ratcliff_matrix(subjects, refs):
+    inter, _, _ = overlap_matrix(subjects, refs, 1)
+    scores = np.zeros(inter.shape, dtype=float)
+    sm = SequenceMatcher(None)
+    for j, ref in enumerate(refs):
+        # リファレンス側（seq2）の索引は1度だけ作成して使い回す
+        sm.set_seq2(ref)
+        for i in np.flatnonzero(inter[:, j]):
+            sm.set_seq1(subjects[i])
+            scores[i, j] = sm.ratio()
+    return scores
+
+# 類似度判定基準を指定して類似度行列（行: 科目文字列、列: リファレンス）を計算
+def score_matrix(subjects, refs, method="ratcliff", ngram=1):
+    if method == "ratcliff":
+        return ratcliff_matrix(subjects, refs)
+    if method == "jaccard":
+        return jaccard_matrix(subjects, refs, ngram)
+    raise ValueError(f"未対応の類似度判定基準です: {method}（{', '.join(METHODS)} のいずれかを指定）")
+
+# 各行について最大スコアと同点の列をすべて True とする（argmax、同点は複数可）
+# 最大スコアが0の行は、すべて False とする
+def best_match(scores):
+    if scores.shape[1] == 0:
+        return np.zeros(scores.shape, dtype=bool)
+    best = scores.max(axis=1, keepdims=True)
+    return (scores == best) & (best > 0)
+
+# 類似度判定基準ごとのパラメータ（キャッシュのキーに利用）
+def method_params(method, ngram=1):
+    return {"ngram": ngram} if method == "jaccard" else {}
+
+# 診療科目ダミー変数の一括作成
+# c: 施設ごとの診療科文字列（カンマ区切り）、cref: 診療科区分のリファレンス辞書
+# 同じ科目文字列は1度だけ類似度を計算し、施設ごとに論理和をとってダミー変数とする
+# cache（match_cache.MatchCache）を指定した場合、過去に分類済みの科目文字列は再計算しない
+def subject_dummies(c, cref, method="ratcliff", ngram=1, cache=None):
+    keys = list(cref)
+    names = [cref[k][0] for k in keys]
+    refs = [cref[k][1] for k in keys]
+    parts = [split_subjects(s) for s in c]
+    flat = list(chain.from_iterable(parts))
+    codes, uniques = pd.factorize(pd.Series(flat, dtype=object))
+    uniques = list(uniques)
+    if cache is None:
+        hit = best_match(score_matrix(uniques, refs, method, ngram))
+    else:
+        hit = cached_match(uniques, cref, method, ngram, cache)
+    # 科目ごとの判定結果を施設単位に集約
+    positions = np.repeat(np.arange(len(parts)), [len(p) for p in parts])
+    out = np.zeros((len(parts), len(keys)), dtype=np.int64)
+    np.maximum.at(out, positions, hit[codes].astype(np.int64))
+    return pd.DataFrame(out, index=c.index, columns=names)
+
+# キャッシュを参照しながら、科目文字列ごとの判定結果（行: 科目文字列、列: cref）を作成
+# キャッシュにない文字列についてのみ類似度行列を計算し、その結果をキャッシュに追加する
+def cached_match(subjects, cref, method, ngram, cache):
+    keys = list(cref)
+    col = {k: j for j, k in enumerate(keys)}
+    params = method_params(method, ngram)
+    h = cref_hash(cref)
+    found = cache.lookup(subjects, method, params, h)
+    hit = np.zeros((len(subjects), len(keys)), dtype=bool)
+    missing = []
+    for i, s in enumerate(subjects):
+        if s in found:
+            hit[i, [col[k] for k in found[s]]] = True
+        else:
+            missing.append(i)
+    if missing:
+        new = best_match(score_matrix([subjects[i] for i in missing], [cref[k][1] for k in keys], method, ngram))
+        hit[missing] = new
+        cache.store(
+            {subjects[i]: [keys[j] for j in np.flatnonzero(row)] for i, row in zip(missing, new)},
+            method, params, h,
+        )
+    return hit
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 06:20:44 2026
+
+@author: tkurihara827
+"""
+
+#sinks.py
+#最終データセット（total2 / total3）の出力形式（xlsx・gzip圧縮CSV・Parquet・GeoJSON・GeoPackage）ごとの書き出し
+#データフレームを一定の行数ずつ変換して書き出し、データセット全体の変換済みのコピー（Excelのセルなど）をメモリ上に作らない
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+import io # gzip圧縮ファイルへの文字列の書き込み
+import gzip # gzip圧縮CSVの書き出し
+import json # GeoJSONの書き出しと、GeoPackageのリスト型の値の文字列化
+import math # 経度・緯度の欠損値の判定
+import struct # GeoPackageのジオメトリ（WKB）のバイト列の作成
+import sqlite3 # GeoPackage（SQLiteデータベース）の書き出し
+import numpy as np # NumPy 配列（リスト型の値）の判定
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+import pyarrow as pa # 列指向形式のテーブルへの変換
+import pyarrow.parquet as pq # Parquetファイルの分割書き出し
+import openpyxl # エクセルファイルの書き出し（write_only モード）
+
+# 1回に変換して書き出す行数
+CHUNKSIZE = 50_000
+
+# Excelの1シートの最大行数（見出し行を含む）。超える場合は次のシート（Sheet2, ...）に続けて書き出す
+XLSX_MAX_ROWS = 1_048_576
+
+# 経度・緯度のカラム（GeoJSON・GeoPackage の点の座標、世界測地系）
+LON = 'lon'
+LAT = 'lat'
+# GeoJSON・GeoPackage の空間参照系（WGS84 の経度・緯度）
+SRS_ID = 4326
+WGS84 = ('GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,AUTHORITY["EPSG","7030"]],'
+         'AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,AUTHORITY["EPSG","8901"]],'
+         'UNIT["degree",0.0174532925199433,AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4326"]]')
+
+
+# --- 値の変換 ---
+# カラムの値を Python の値のリストに変換（欠損値は None、リスト型の値は listify で変換）
+def values(s, listify=None):
+    out = s.astype(object).where(s.notna(), None).tolist()
+    if listify is not None and s.dtype == object:
+        out = [listify(list(v)) if isinstance(v, (list, tuple, np.ndarray)) else v for v in out]
+    return out
+
+# データフレームの行（Python の値のタプル）
+def rows(chunk, listify=None):
+    return zip(*[values(chunk[c], listify) for c in chunk.columns])
+
+
+# --- 出力形式 ---
+class XlsxSink:
+    # openpyxl の write_only モードで1行ずつ書き出す（リスト型の値は pandas の to_excel と同じく文字列として書き出す）
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.n = 0
+        self.sheet = None
+        self.new_sheet()
+
+    def new_sheet(self):
+        self.sheet = self.wb.create_sheet(f"Sheet{len(self.wb.worksheets) + 1}")
+        self.sheet.append(self.columns)
+        self.n = 1
+
+    def write(self, chunk):
+        for row in rows(chunk, str):
+            if self.n >= XLSX_MAX_ROWS:
+                self.new_sheet()
+            self.sheet.append(row)
+            self.n += 1
+
+    def close(self):
+        self.wb.save(self.path)
+
+
+class CsvSink:
+    # gzip圧縮したBOM付きUTF-8のCSV（見出し行は最初の1回のみ）
+    def __init__(self, path, columns):
+        self.path = path
+        self.f = io.TextIOWrapper(gzip.open(path, "wb"), encoding="utf-8-sig", newline="")
+        self.header = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.f, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetSink:
+    # 行グループごとに追記する。型は最初の行グループで決め、欠損値のみのカラムは値のある行から型を決める
+    def __init__(self, path, columns):
+        self.path = path
+        self.writer = None
+        self.schema = None
+
+    # df の型（オブジェクト型のカラムは、値のある最初の行から推定する）
+    @staticmethod
+    def schema_of(df):
+        schema = pa.Schema.from_pandas(df.head(0), preserve_index=False)
+        for i, name in enumerate(schema.names):
+            if pa.types.is_null(schema.field(i).type):
+                sample = df[name].dropna().head(100)
+                if len(sample):
+                    schema = schema.set(i, pa.field(name, pa.array(sample.tolist()).type))
+        return schema
+
+    def write(self, chunk):
+        if self.writer is None:
+            self.schema = self.schema_of(chunk)
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class GeoJsonSink:
+    # 経度・緯度の点のフィーチャーコレクション（経度・緯度が欠損値の行はジオメトリを null とする）
+    def __init__(self, path, columns):
+        self.path = path
+        self.f = open(path, "w", encoding="utf-8")
+        self.f.write('{"type": "FeatureCollection", "features": [\n')
+        self.first = True
+
+    def write(self, chunk):
+        props = chunk.drop(columns=[LON, LAT])
+        names = list(props.columns)
+        for lon, lat, row in zip(values(chunk[LON]), values(chunk[LAT]), rows(props, list)):
+            geom = None if lon is None or lat is None or math.isnan(lon) or math.isnan(lat) else {"type": "Point", "coordinates": [lon, lat]}
+            feature = {"type": "Feature", "geometry": geom, "properties": dict(zip(names, row))}
+            self.f.write(("" if self.first else ",\n") + json.dumps(feature, ensure_ascii=False, default=str))
+            self.first = False
+
+    def close(self):
+        self.f.write("\n]}\n")
+        self.f.close()
+
+
+class GeoPackageSink:
+    # OGC GeoPackage 1.2（SQLite）の点のフィーチャーテーブル（テーブル名はファイル名）
+    # ジオメトリは GeoPackage のバイナリ形式（ヘッダ + WKB の点、経度・緯度が欠損値の行は空の点）
+    def __init__(self, path, columns):
+        self.path = path
+        self.table = os.path.splitext(os.path.basename(path))[0]
+        if os.path.exists(path):
+            os.remove(path)
+        self.con = sqlite3.connect(path)
+        self.columns = None
+        self.bounds = [math.inf, math.inf, -math.inf, -math.inf]
+        c = self.con
+        c.execute("PRAGMA application_id = 1196444487")  # 'GPKG'
+        c.execute("PRAGMA user_version = 10200")
+        c.execute("CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY, "
+                  "organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT)")
+        c.executemany("INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)", [
+            ("Undefined cartesian SRS", -1, "NONE", -1, "undefined", "undefined cartesian coordinate reference system"),
+            ("Undefined geographic SRS", 0, "NONE", 0, "undefined", "undefined geographic coordinate reference system"),
+            ("WGS 84 geodetic", SRS_ID, "EPSG", SRS_ID, WGS84, "longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid"),
+        ])
+        c.execute("CREATE TABLE gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE, "
+                  "description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')), "
+                  "min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER, "
+                  "CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id))")
+        c.execute("CREATE TABLE gpkg_geometry_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL, "
+                  "srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL, "
+                  "CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name), CONSTRAINT uk_gc_table_name UNIQUE (table_name), "
+                  "CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name), "
+                  "CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id))")
+
+    # カラムの SQLite の型
+    @staticmethod
+    def sql_type(s):
+        if pd.api.types.is_bool_dtype(s) or pd.api.types.is_integer_dtype(s):
+            return "INTEGER"
+        if pd.api.types.is_float_dtype(s):
+            return "DOUBLE"
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            return GeoPackageSink.sql_type(pd.Series(s.cat.categories))
+        return "TEXT"
+
+    # 点のジオメトリ（GeoPackage のヘッダ: マジック 'GP'、版 0、フラグ（リトルエンディアン、外接矩形なし、空の点）、空間参照系ID）
+    @staticmethod
+    def point(lon, lat):
+        empty = lon is None or lat is None or math.isnan(lon) or math.isnan(lat)
+        flags = 0x01 | (0x10 if empty else 0)
+        x, y = (math.nan, math.nan) if empty else (lon, lat)
+        return b"GP" + struct.pack("<BBi", 0, flags, SRS_ID) + struct.pack("<BIdd", 1, 1, x, y)
+
+    def create(self, chunk):
+        self.columns = [c for c in chunk.columns if c not in (LON, LAT)]
+        cols = ", ".join(f'"{c}" {self.sql_type(chunk[c])}' for c in self.columns)
+        self.con.execute(f'CREATE TABLE "{self.table}" (fid INTEGER PRIMARY KEY AUTOINCREMENT, geom POINT, {cols})')
+        self.con.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) VALUES (?, 'features', ?, ?)",
+                         (self.table, self.table, SRS_ID))
+        self.con.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', 'POINT', ?, 0, 0)", (self.table, SRS_ID))
+
+    def write(self, chunk):
+        if self.columns is None:
+            self.create(chunk)
+        lon = values(chunk[LON])
+        lat = values(chunk[LAT])
+        found = chunk[LON].notna() & chunk[LAT].notna()
+        if found.any():
+            b = self.bounds
+            self.bounds = [min(b[0], chunk.loc[found, LON].min()), min(b[1], chunk.loc[found, LAT].min()),
+                           max(b[2], chunk.loc[found, LON].max()), max(b[3], chunk.loc[found, LAT].max())]
+        props = rows(chunk[self.columns], json.dumps)
+        marks = ", ".join(["?"] * (len(self.columns) + 1))
+        names = ", ".join(f'"{c}"' for c in self.columns)
+        self.con.executemany(f'INSERT INTO "{self.table}" (geom, {names}) VALUES ({marks})',
+                             ((self.point(x, y), *row) for x, y, row in zip(lon, lat, props)))
+
+    def close(self):
+        if self.columns is not None and math.isfinite(self.bounds[0]):
+            self.con.execute("UPDATE gpkg_contents SET min_x = ?, min_y = ?, max_x = ?, max_y = ? WHERE table_name = ?",
+                             (*map(float, self.bounds), self.table))
+        self.con.commit()
+        self.con.close()
+
+
+# 出力形式と拡張子・書き出しのクラス（geo: 経度・緯度のカラムが必要な形式）
+SINKS = {
+    "xlsx":    (".xlsx", XlsxSink, False),
+    "csv.gz":  (".csv.gz", CsvSink, False),
+    "parquet": (".parquet", ParquetSink, False),
+    "geojson": (".geojson", GeoJsonSink, True),
+    "gpkg":    (".gpkg", GeoPackageSink, True),
+}
+
+
+# --- 書き出し ---
+# df を base（拡張子を除いたパス）に formats の形式で書き出す（chunksize 行ずつ変換し、すべての形式に順に渡す）
+# 経度・緯度のカラムがない場合、GeoJSON・GeoPackage は書き出さない
+# 戻り値: 書き出したファイルのパスのリスト
+def write(df, base, formats, chunksize=CHUNKSIZE):
+    unknown = [f for f in formats if f not in SINKS]
+    if unknown:
+        raise ValueError(f"未対応の出力形式です: {', '.join(unknown)}（{', '.join(SINKS)} のいずれかを指定）")
+    sinks = []
+    try:
+        for f in formats:
+            ext, cls, geo = SINKS[f]
+            if geo and not (LON in df and LAT in df):
+                print(f"経度・緯度のカラム（{LON}, {LAT}）がないため、{base}{ext} は書き出しません")
+                continue
+            sinks.append(cls(base + ext, df.columns))
+        # 行のないデータフレームも1回は渡す（見出し行・カラムの型のみのファイルになる）
+        for start in range(0, max(len(df), 1), chunksize):
+            chunk = df.iloc[start:start + chunksize]
+            for sink in sinks:
+                sink.write(chunk)
+    finally:
+        for sink in sinks:
+            sink.close()
+    return [s.path for s in sinks]
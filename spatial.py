@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:25:51 2026
+
+@author: tkurihara827
+"""
+
+#spatial.py
+#医療機関の経度・緯度（gis.pyの出力）に対する空間索引と、最近傍・半径内の一括検索
+#（例: 1kmメッシュごとの、特定の診療科目を持つ最寄りの医療機関までの距離、半径N km以内の医療機関数）
+
+# ライブラリのインポート
+import numpy as np # 経度・緯度の配列と距離の一括計算
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+import storage # gis.pyが出力した列指向形式のファイルの読み込み
+from specialty import SUBJECT_COLUMNS # 診療科目のダミー変数カラム名（63科目）
+try:
+    # SciPyがインストールされていればKD木（C実装）を用いる
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# 地球の平均半径（km）
+EARTH_RADIUS_KM = 6371.0088
+# 1度あたりの距離（km、子午線方向）
+KM_PER_DEG = np.pi * EARTH_RADIUS_KM / 180
+
+# 利用可能な索引の方式
+# 'kdtree': 単位球面上の3次元座標のKD木（SciPyが必要）、'grid': 経度・緯度の等間隔格子（NumPyのみ）
+METHODS = ("kdtree", "grid")
+
+
+# --- 距離の計算 ---
+# 2点間の大円距離（km、haversine公式、配列どうしの一括計算）
+def haversine(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+# 経度・緯度から単位球面上の3次元座標へ
+# 3次元座標の直線距離（弦の長さ）は大円距離の単調増加関数であるため、最近傍・半径内の判定はKD木の直線距離で行える
+def to_xyz(lon, lat):
+    lon = np.radians(np.asarray(lon, dtype=float))
+    lat = np.radians(np.asarray(lat, dtype=float))
+    c = np.cos(lat)
+    return np.column_stack([c * np.cos(lon), c * np.sin(lon), np.sin(lat)])
+
+# 大円距離（km）と弦の長さの相互変換
+def km_to_chord(km):
+    return 2 * np.sin(np.minimum(np.asarray(km, dtype=float), np.pi * EARTH_RADIUS_KM) / (2 * EARTH_RADIUS_KM))
+
+def chord_to_km(ch):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(ch, dtype=float) / 2, 0, 1))
+
+
+# --- 3次メッシュ（1kmメッシュ） ---
+# 3次メッシュコード（8桁）からメッシュの中心の経度・緯度へ
+# 緯度: 1次 2/3度、2次 1/12度、3次 1/120度、経度: 1次 1度、2次 1/8度、3次 1/80度
+def mesh3_centers(codes):
+    c = np.asarray(codes, dtype=np.int64)
+    p, u = c // 1000000, c // 10000 % 100
+    q, v = c // 1000 % 10, c // 100 % 10
+    r, w = c // 10 % 10, c % 10
+    lat = p / 1.5 + q / 12 + r / 120 + 1 / 240
+    lon = u + 100 + v / 8 + w / 80 + 1 / 160
+    return lon, lat
+
+
+class SpatialIndex:
+    # 点（経度・緯度）の集合に対する空間索引
+    # method: 'auto'（SciPyがあれば 'kdtree'、なければ 'grid'）、cell_deg: 'grid' の格子の大きさ（度）
+    def __init__(self, lon, lat, method="auto", cell_deg=0.1):
+        self.lon = np.asarray(lon, dtype=float)
+        self.lat = np.asarray(lat, dtype=float)
+        if method == "auto":
+            method = "kdtree" if cKDTree is not None else "grid"
+        if method not in METHODS:
+            raise ValueError(f"未対応の索引の方式です: {method}（auto, {', '.join(METHODS)} のいずれかを指定）")
+        if method == "kdtree" and cKDTree is None:
+            raise ImportError("索引の方式 kdtree にはSciPyが必要です")
+        self.method = method
+        self.n = len(self.lon)
+        if method == "kdtree":
+            self.tree = cKDTree(to_xyz(self.lon, self.lat)) if self.n else None
+        else:
+            self.cell = cell_deg
+            # 点を格子のセル番号の順に並べ、セルごとの開始位置を記録する
+            gx = np.floor(self.lon / cell_deg).astype(np.int64)
+            gy = np.floor(self.lat / cell_deg).astype(np.int64)
+            self.gx0, self.gy0 = (gx.min(), gy.min()) if self.n else (0, 0)
+            self.nx = int(gx.max() - self.gx0 + 1) if self.n else 1
+            self.ny = int(gy.max() - self.gy0 + 1) if self.n else 1
+            cid = (gy - self.gy0) * self.nx + (gx - self.gx0)
+            self.order = np.argsort(cid, kind="stable")
+            self.starts = np.searchsorted(cid[self.order], np.arange(self.nx * self.ny + 1))
+
+    # --- 最近傍検索 ---
+    # 各検索点から近い順に k 個の点までの距離（km）と点の位置（点が k 個に満たない場合は inf と -1）
+    def knn(self, lon, lat, k=1):
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        dist = np.full((len(lon), k), np.inf)
+        idx = np.full((len(lon), k), -1, dtype=np.int64)
+        if self.n == 0 or len(lon) == 0:
+            return dist, idx
+        if self.method == "kdtree":
+            d, i = self.tree.query(to_xyz(lon, lat), k=k)
+            d = d.reshape(len(lon), -1)
+            i = i.reshape(len(lon), -1)
+            ok = i < self.n
+            dist[ok] = chord_to_km(d[ok])
+            idx[ok] = i[ok]
+            return dist, idx
+        return self._grid_knn(lon, lat, k, dist, idx)
+
+    # --- 半径内の検索 ---
+    # 各検索点から半径 km 以内の点の数
+    def count_within(self, lon, lat, km):
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        if self.n == 0 or len(lon) == 0:
+            return np.zeros(len(lon), dtype=np.int64)
+        if self.method == "kdtree":
+            return np.asarray(self.tree.query_ball_point(to_xyz(lon, lat), km_to_chord(km), return_length=True), dtype=np.int64)
+        return np.array([len(i) for i in self._grid_within(lon, lat, km)], dtype=np.int64)
+
+    # 各検索点から半径 km 以内の点の位置（検索点ごとの配列のリスト）
+    def within(self, lon, lat, km):
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        if self.n == 0 or len(lon) == 0:
+            return [np.zeros(0, dtype=np.int64) for _ in range(len(lon))]
+        if self.method == "kdtree":
+            return [np.asarray(i, dtype=np.int64) for i in self.tree.query_ball_point(to_xyz(lon, lat), km_to_chord(km))]
+        return self._grid_within(lon, lat, km)
+
+    # --- 等間隔格子による検索（SciPyがない場合） ---
+    # 検索点のセルを中心とする (2r+1) x (2r+1) セルの範囲の点の位置
+    def _cells(self, cx, cy, r):
+        xs = np.arange(max(cx - r, 0), min(cx + r, self.nx - 1) + 1)
+        ys = np.arange(max(cy - r, 0), min(cy + r, self.ny - 1) + 1)
+        if len(xs) == 0 or len(ys) == 0:
+            return np.zeros(0, dtype=np.int64)
+        cells = (ys[:, None] * self.nx + xs[None, :]).ravel()
+        return np.concatenate([self.order[self.starts[c]:self.starts[c + 1]] for c in cells])
+
+    # 範囲の外側の点までの距離の下限（km）：中心のセルから r セル離れた格子線までの距離
+    # 経度方向の距離は範囲内で最も高緯度の位置で見積もり、大円距離と緯線に沿った距離の差を見込んで1%小さくとる
+    def _reach(self, cy, r):
+        lat_max = max(abs((cy + self.gy0 + r + 1) * self.cell), abs((cy + self.gy0 - r) * self.cell))
+        return 0.99 * r * self.cell * KM_PER_DEG * np.cos(np.radians(min(lat_max, 89.9)))
+
+    # 検索点の格子のセル（格子の範囲外も含む）ごとのまとまり
+    def _groups(self, lon, lat):
+        qx = np.floor(lon / self.cell).astype(np.int64) - self.gx0
+        qy = np.floor(lat / self.cell).astype(np.int64) - self.gy0
+        order = np.lexsort((qx, qy))
+        change = (np.diff(qx[order]) != 0) | (np.diff(qy[order]) != 0)
+        for group in np.split(order, np.flatnonzero(change) + 1):
+            yield group, qx[group[0]], qy[group[0]]
+
+    # 検索点のセルから格子全体を覆うまでの範囲（r がこれ以上ではすべての点が候補）
+    def _r_all(self, cx, cy):
+        return max(abs(cx), abs(cx - self.nx + 1), abs(cy), abs(cy - self.ny + 1))
+
+    # 検索点をセルごとにまとめ、セル単位で候補点との距離を一括計算する
+    # k 番目の距離が範囲の外側までの距離の下限以下になるまで、範囲を1セルずつ広げる
+    def _grid_knn(self, lon, lat, k, dist, idx):
+        kk = min(k, self.n)
+        for group, cx, cy in self._groups(lon, lat):
+            r_all = self._r_all(cx, cy)
+            r = 1
+            while True:
+                cand = self._cells(cx, cy, r) if r < r_all else np.arange(self.n)
+                if len(cand) >= kk:
+                    d = haversine(lon[group, None], lat[group, None], self.lon[cand][None, :], self.lat[cand][None, :])
+                    part = np.argpartition(d, kk - 1, axis=1)[:, :kk]
+                    dk = np.take_along_axis(d, part, axis=1)
+                    if r >= r_all or dk.max() <= self._reach(cy, r):
+                        s = np.argsort(dk, axis=1, kind="stable")
+                        dist[group, :kk] = np.take_along_axis(dk, s, axis=1)
+                        idx[group, :kk] = cand[np.take_along_axis(part, s, axis=1)]
+                        break
+                r += 1
+        return dist, idx
+
+    # 半径内の点：半径を覆うセルの範囲の候補点との距離を計算する
+    def _grid_within(self, lon, lat, km):
+        out = [None] * len(lon)
+        for group, cx, cy in self._groups(lon, lat):
+            r_all = self._r_all(cx, cy)
+            r = 1
+            while r < r_all and self._reach(cy, r) < km:
+                r += 1
+            cand = self._cells(cx, cy, r) if r < r_all else np.arange(self.n)
+            d = haversine(lon[group, None], lat[group, None], self.lon[cand][None, :], self.lat[cand][None, :])
+            for j, g in enumerate(group):
+                out[g] = cand[d[j] <= km]
+        return out
+
+
+class FacilityIndex:
+    # 医療機関の空間索引（全医療機関と、診療科目ごとの部分索引）
+    # df: id, lon, lat と診療科目のダミー変数カラムを含むデータフレーム（経度・緯度が欠損の医療機関は除く）
+    def __init__(self, df, method="auto"):
+        df = df[df["lon"].notna() & df["lat"].notna()].reset_index(drop=True)
+        self.df = df
+        self.ids = df["id"].to_numpy()
+        self.method = method
+        self.subsets = {}
+        self.index = {None: SpatialIndex(df["lon"], df["lat"], method)}
+
+    # gis.pyの出力（total3）から作成（必要なカラムのみ読み込む）
+    @classmethod
+    def load(cls, base, fmt="parquet", method="auto"):
+        return cls(storage.read(base, fmt, columns=["id", "lon", "lat"] + SUBJECT_COLUMNS), method)
+
+    # 診療科目ごとの部分索引（初めて使う際に作成し、以後は再利用する）
+    def sub(self, specialty=None):
+        if specialty not in self.index:
+            if specialty not in SUBJECT_COLUMNS:
+                raise KeyError(f"未知の診療科目です: {specialty}")
+            rows = np.flatnonzero(self.df[specialty].to_numpy() == 1)
+            self.subsets[specialty] = rows
+            self.index[specialty] = SpatialIndex(self.df["lon"].to_numpy()[rows], self.df["lat"].to_numpy()[rows], self.method)
+        return self.index[specialty]
+
+    # 部分索引の点の位置から医療機関の id へ（該当なし（-1）は -1 のまま）
+    def _ids(self, specialty, pos):
+        rows = pos if specialty is None else np.where(pos >= 0, self.subsets[specialty][np.maximum(pos, 0)], -1)
+        return np.where(rows >= 0, self.ids[np.maximum(rows, 0)], -1)
+
+    # 最寄りの k 医療機関（specialty: 診療科目のダミー変数カラム名、None: すべての医療機関）
+    # 戻り値: 距離（km）と医療機関の id の配列（検索点の数 x k）
+    def nearest(self, lon, lat, specialty=None, k=1):
+        dist, pos = self.sub(specialty).knn(lon, lat, k)
+        return dist, self._ids(specialty, pos)
+
+    # 半径 km 以内の医療機関の数
+    def count_within(self, lon, lat, km, specialty=None):
+        return self.sub(specialty).count_within(lon, lat, km)
+
+    # 1kmメッシュ（3次メッシュコード）ごとの、最寄りの医療機関までの距離と半径内の医療機関数
+    def mesh_access(self, codes, specialty=None, km=None):
+        lon, lat = mesh3_centers(codes)
+        dist, ids = self.nearest(lon, lat, specialty)
+        out = pd.DataFrame({"mesh": np.asarray(codes), "nearest_id": ids[:, 0], "nearest_km": dist[:, 0]})
+        if km is not None:
+            out[f"n_within_{km}km"] = self.count_within(lon, lat, km, specialty)
+        return out
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:31:45 2026
+
+@author: tkurihara827
+"""
+
+#specialty.py
+#診療科区分（63科目）と施設種別フラグのリファレンス辞書
+#append.py の診療科目の分類・施設種別フラグの作成と、それらのカラムを参照する処理（delta.py など）で共有する
+
+# 診療科区分（リファレンス辞書）
+# 番号: [ダミー変数のカラム名, 科目名]
+CREF = {
+    1: ["internalmedicine", "内科"], 
+    2: ["psychosomaticmedicine", "心療内科"], 
+    3: ["psychiatry", "精神科"], 
+    4: ["neurology", "神経科"], 
+    5: ["pulmonology", "呼吸器科"], 
+    6: ["gastroenterology", "消化器科"], 
+    7: ["cardiology", "循環器科"], 
+    8: ["allergy", "アレルギー科"], 
+    9: ["rheumatology", "リウマチ科"], 
+    10: ["pediatrics", "小児科"], 
+    11: ["surgery", "外科"], 
+    12: ["orthopedicsurgery", "整形外科"], 
+    13: ["plasticsurgery", "形成外科"], 
+    14: ["cosmeticsurgery", "美容外科"], 
+    15: ["neurosurgery", "脳神経外科"], 
+    16: ["thoracicsurgery", "呼吸器外科"], 
+    17: ["cardiovasculursurgery", "心臓血管外科"], 
+    18: ["pediatricsurgery", "小児外科"], 
+    19: ["dermatologyurology", "皮膚泌尿器科"], 
+    20: ["venereology", "性病科"], 
+    21: ["colorectalsurgery", "肛門科"], 
+    22: ["obstetricsgynecology", "産婦人科"], 
+    23: ["ophthalmology", "眼科"], 
+    24: ["otorhinolaryngology", "耳鼻咽喉科"], 
+    25: ["esophagogastricsurgery", "気管食道科"], 
+    26: ["rehabilitation", "ﾘﾊﾋﾞﾘﾃｰｼｮﾝ科"], 
+    27: ["radiology", "放射線科"], 
+    28: ["neurologyinternal", "神経内科"], 
+    29: ["gastroenterologyinternal", "胃腸科"], 
+    30: ["dermatology", "皮膚科"], 
+    31: ["urology", "泌尿器科"], 
+    32: ["obstetrics", "産科"], 
+    33: ["gynecology", "婦人科"], 
+    34: ["pulmonologyinternal", "呼吸器内科"], 
+    35: ["cardiologyinternal", "循環器内科"], 
+    36: ["dentistry", "歯科"], 
+    37: ["orthodontics", "歯科矯正科"], 
+    38: ["pedodontics", "小児歯科"], 
+    39: ["oralmaxillofacialsurgery", "歯科口腔外科"], 
+    40: ["diabetology", "糖尿病科"], 
+    41: ["nephrology", "腎臓内科"], 
+    42: ["renaltransplantation", "腎移植科"], 
+    43: ["hemodialysis", "血液透析科"], 
+    44: ["metabolism", "代謝内科"], 
+    45: ["endocrinology", "内分泌内科"], 
+    46: ["emergencymedicine", "救急医学科"], 
+    47: ["hematology", "血液科"], 
+    48: ["hematologyinternal", "血液内科"], 
+    49: ["anesthesiology", "麻酔科"], 
+    50: ["gastroenterologyinternal2", "消化器内科"], 
+    51: ["gastrointestinalsurgery", "消化器外科"], 
+    52: ["hepatobilipancsurgery", "肝胆膵外科"], 
+    53: ["diabetologyinternal", "糖尿内科"], 
+    54: ["colorectalsurgeryinternal", "大腸肛門科"], 
+    55: ["ophthalmicplasticorbitalsurgery", "眼形成眼窩外科"], 
+    56: ["endocrinologyinfertility", "不妊内分泌科"], 
+    57: ["rheumatologycollagendisease", "膠原病ﾘｳﾏﾁ内科"], 
+    58: ["stroke", "脳卒中科"], 
+    59: ["oncology", "腫瘍治療科"], 
+    60: ["generalmedicine", "総合診療科"], 
+    61: ["breastthyroidsurgery", "乳腺甲状腺外科"], 
+    62: ["neonatology", "新生児科"], 
+    63: ["pediatriccardiology", "小児循環器科"]
+}
+
+# 診療科目のダミー変数カラム名（total2 のカラム順）
+SUBJECT_COLUMNS = [v[0] for v in CREF.values()]
+
+# 施設種別フラグ（type_status に含まれるキーワード）
+# カラム名: キーワード
+TYPE_FLAGS = {
+    "defunct":  "休止", 
+    "yoryo":    "療養病床", 
+    "clinic":   "診療所",
+    "hospital": "病院", 
+    "sougou":   "総合", 
+    "locsup":   "地域支援",
+    "tokutei":  "特定機能"
+}
+
+# 施設種別フラグのカラム名（total2 のカラム順）
+TYPE_FLAG_COLUMNS = list(TYPE_FLAGS)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:02:36 2026
+
+@author: tkurihara827
+"""
+
+#storage.py
+#処理段階の間で受け渡す中間データを列指向形式（Parquet / Arrow IPC）で保存・読み込み
+#Excelへの書き出しは最終出力のみとし、中間ファイルでは型（リスト・整数など）を保持する
+
+# ライブラリのインポート
+import os # ファイルパス操作のために利用
+import numpy as np # NumPy 配列（リスト型の値）の判定に利用
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+import pyarrow as pa # 列指向形式のカラムの型の判定
+import pyarrow.parquet as pq # Parquetファイルの読み込み
+import pyarrow.feather as feather # Arrow IPCファイルの読み込み
+
+# 利用可能な中間データ形式と拡張子
+# 'parquet': 圧縮された列指向ファイル、'feather': Arrow IPC（非圧縮で読み書きが最も速い）
+FORMATS = {
+    "parquet": ".parquet",
+    "feather": ".arrow",
+}
+
+
+# 拡張子を除いたパス（base）と形式から、中間ファイルのパスを作成
+def path(base, fmt="parquet"):
+    if fmt not in FORMATS:
+        raise ValueError(f"未対応の中間データ形式です: {fmt}（{', '.join(FORMATS)} のいずれかを指定）")
+    return base + FORMATS[fmt]
+
+# 中間ファイルが存在するか
+def exists(base, fmt="parquet"):
+    return os.path.exists(path(base, fmt))
+
+# 処理段階の間で受け渡すデータフレームの型をそろえる
+# 列指向形式は1つのカラムに1つの型しか持てないため、文字列と数値が混在するカラムは文字列に、
+# 集合（set）はリストに変換する。メモリ上で受け渡す場合にも同じ変換を行い、
+# 中間ファイルを経由して再開した場合と同じ結果になるようにする
+def typed(df):
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        s = df[col]
+        kinds = set(s.dropna().map(type))
+        if not kinds or kinds == {str} or kinds == {list}:
+            continue
+        if kinds <= {list, set, tuple, np.ndarray}:
+            df[col] = s.map(lambda v: sorted(v) if isinstance(v, set) else list(v), na_action="ignore")
+        else:
+            df[col] = s.map(str, na_action="ignore")
+    return df
+
+# 中間ファイルの書き出し
+def write(df, base, fmt="parquet"):
+    df = typed(df).reset_index(drop=True)
+    p = path(base, fmt)
+    os.makedirs(os.path.dirname(p) or ".", exist_ok=True)
+    if fmt == "parquet":
+        df.to_parquet(p, index=False)
+    else:
+        df.to_feather(p)
+    return p
+
+# 中間ファイルのカラム名（データを読み込まずにファイルのスキーマから取り出す）
+def columns(base, fmt="parquet"):
+    p = path(base, fmt)
+    if fmt == "parquet":
+        return pq.read_schema(p).names
+    with pa.memory_map(p) as source:
+        return pa.ipc.open_file(source).schema.names
+
+# 中間ファイルの読み込み
+# リスト型のカラムは、NumPy 配列を経由せずに Arrow から直接 Python のリストとして取り出す
+def read(base, fmt="parquet", columns=None):
+    p = path(base, fmt)
+    if fmt == "parquet":
+        table = pq.read_table(p, columns=columns)
+    else:
+        table = feather.read_table(p, columns=columns)
+    names = table.column_names
+    lists = {f.name: table.column(f.name).to_pylist() for f in table.schema if pa.types.is_list(f.type) or pa.types.is_large_list(f.type)}
+    # 変換済みのカラムから Arrow 側のメモリを解放し、読み込み時の最大メモリ使用量を抑える
+    df = table.drop(list(lists)).to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    if lists:
+        df = pd.concat([df, pd.DataFrame({col: pd.Series(v, dtype=object) for col, v in lists.items()}, index=df.index)], axis=1)
+    return df[names]
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:05:12 2026
+
+@author: tkurihara827
+"""
+
+#utils.py
+#append.py と各処理モジュールで共通に利用する汎用関数
+
+
+# ライブラリのインポート
+import numpy as np # 行のずらし比較とマスク演算をベクトル化するために利用
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+
+
+# rdel() で除外した行数の記録（カラム, 条件, 行数）の組、instrument.py が段階ごとに集計する
+DROPPED = []
+
+
+#汎用関数
+# 縦方向のデータ繰り越し処理（特に、ヘッダ行を持たない非定型データ構造からの情報抽出に必須）
+def move(n,x,m,v1,v2,w):
+    # データフレーム内の隣接する行間（row_num: m）で同一の"id"を共有し、
+    # ターゲットカラム（v1）がプレースホルダ（"*"）である場合に、
+    # ソースカラム（v2）のデータを繰り越す処理。
+    for i in range(0,n):
+        if x.at[i+m,"id"] == x.at[i,"id"] and x.at[i,v1] == "*" and w in x.at[i+m,v2]:
+            x.at[i, v1] = x.at[i+m,v2]
+
+# move() のベクトル化版：繰り越し処理をカラム単位の一括演算で行う
+# params は (m, v1, v2, w) の組のリストで、m行下（row_num）の同一idの行のソースカラム（v2）が w を含み、
+# ターゲットカラム（v1）がプレースホルダ（"*"）である行に値を繰り越す。
+# 組は先頭から順に処理するため、前の組で埋めたカラム（例: reason）を後の組のソース（例: start）に使える。
+# x は位置インデックス（0, 1, 2, ...）を持つことを前提とし、move() と同一の結果を返す
+def carry_forward(x, params):
+    k = len(x)
+    ids = x["id"].to_numpy()
+    for m, v1, v2, w in params:
+        if m >= k:
+            continue
+        src = x[v2].to_numpy(dtype=object)
+        # m行下の値を同じ位置に並べる（末尾のm行は比較対象がないため対象外）
+        same = np.zeros(k, dtype=bool)
+        same[:k-m] = ids[m:] == ids[:k-m]
+        below = np.full(k, None, dtype=object)
+        below[:k-m] = src[m:]
+        has = pd.Series(below, dtype=object).str.contains(w, regex=False, na=False).to_numpy(dtype=bool)
+        target = x[v1].to_numpy(dtype=object).copy()
+        mask = same & (target == "*") & has
+        target[mask] = below[mask]
+        x[v1] = target
+            
+# 特定の条件（w）を満たす行をデータセットから除外
+def rdel(x,v,w):
+    n = len(x)
+    x.drop(x[x[v].str.contains(w)].index, inplace = True)
+    DROPPED.append((v, w, n - len(x)))
+
+# 文字列置換の汎用化
+def rep(x,var,w1,w2):
+    x[var] = x[var].str.replace(w1, w2)
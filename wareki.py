@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:31:27 2026
+
+@author: tkurihara827
+"""
+
+#wareki.py
+#和暦の日付文字列（例: 令 5. 4. 1、平成元年5月1日）を西暦の年・月・日に一括変換
+
+# ライブラリのインポート
+import re # 和暦日付の正規表現パターンのコンパイル
+from datetime import date # 元号の開始日・終了日の定義
+import pandas as pd # 構造化データ処理のための標準的なライブラリ（データフレーム操作）
+
+
+# 元号テーブル：元号名 -> (西暦年 = 基準年 + 和暦年, 開始日, 終了日)
+# 古い施設の開設年月日に現れる大正も含める
+ERAS = {
+    "大正": (1911, date(1912, 7, 30), date(1926, 12, 25)),
+    "昭和": (1925, date(1926, 12, 25), date(1989, 1, 7)),
+    "平成": (1988, date(1989, 1, 8), date(2019, 4, 30)),
+    "令和": (2018, date(2019, 5, 1), None),
+}
+
+# 元号の略記（1文字目・アルファベット）から元号名への対応
+ERA_ALIASES = {}
+for _name in ERAS:
+    ERA_ALIASES[_name] = _name
+    ERA_ALIASES[_name[0]] = _name
+for _alpha, _name in zip("TSHR", ERAS):
+    ERA_ALIASES[_alpha] = _name
+    ERA_ALIASES[_alpha.lower()] = _name
+
+# 元号名 -> 基準年・略記・開始日・終了日（yyyymmdd の整数）の対応（列単位の map に利用）
+ERA_BASE = {k: v[0] for k, v in ERAS.items()}
+ERA_SHORT = {k: k[0] for k in ERAS}
+ERA_START = {k: int(v[1].strftime("%Y%m%d")) for k, v in ERAS.items()}
+ERA_END = {k: int(v[2].strftime("%Y%m%d")) if v[2] else 99991231 for k, v in ERAS.items()}
+
+# 和暦日付のパターン（空白を除去した文字列に適用）
+# 元号 + 年（「元」は1年）+ 区切り（. 年 /）+ 月 + 区切り（. 月 /）+ 日
+WAREKI_PATTERN = re.compile(
+    r"^(?P<era>" + "|".join(sorted(ERA_ALIASES, key=len, reverse=True)) + r")\.?"
+    r"(?P<year>元|\d{1,2})[.年/](?P<month>\d{1,2})[.月/](?P<day>\d{1,2})日?$"
+)
+
+
+# 和暦日付の列を一括変換
+# 戻り値は text（空白を除去した「元号1文字 + 年2桁 + 月2桁 + 日」の文字列）と year, month, day（西暦、nullable int）
+# 解釈できないセルは year, month, day が欠損値（<NA>）となり、text には空白を除去した元の文字列が残る
+# strict=False: 元号の終了後の日付（例: 平成31年5月1日）も西暦に換算する
+# strict=True : 元号の期間外の日付（例: 平成31年5月1日、昭和64年1月8日）を欠損値とする
+# 同じ日付文字列は繰り返し現れるため、重複を除いた文字列についてのみ正規表現を適用する
+def parse(s, strict=False):
+    codes, uniques = pd.factorize(s.astype(object))
+    u = parse_unique(pd.Series(uniques, dtype="string"), strict)
+    # 欠損値（codes = -1）は空の行として復元する
+    out = u.reindex(codes)
+    out.index = s.index
+    return out
+
+# 重複のない日付文字列の変換（parse の本体）
+def parse_unique(s, strict=False):
+    s = s.str.replace(r"\s", "", regex=True)
+    parts = s.str.extract(WAREKI_PATTERN)
+    era = parts["era"].map(ERA_ALIASES)
+    year_in_era = parts["year"].replace("元", "1").astype("Int64")
+    month = parts["month"].astype("Int64")
+    day = parts["day"].astype("Int64")
+    year = era.map(ERA_BASE).astype("Int64") + year_in_era
+    # 存在しない月・日（例: 2月31日、平年の2月29日）、0年を欠損値とする
+    valid = month.between(1, 12) & (day >= 1) & (day <= month_days(year, month)) & (year_in_era >= 1)
+    if strict:
+        valid &= within_era(era, year, month, day)
+    valid = valid.fillna(False).astype(bool)
+    text = (
+        era.map(ERA_SHORT)
+        + year_in_era.astype("string").str.zfill(2)
+        + month.astype("string").str.zfill(2)
+        + parts["day"]
+    )
+    return pd.DataFrame({
+        "text": text.where(valid, s),
+        "year": year.where(valid),
+        "month": month.where(valid),
+        "day": day.where(valid),
+    })
+
+# 西暦の年・月の日数（閏年の2月は29日、月が1〜12でない場合は欠損値）
+MONTH_DAYS = {1: 31, 2: 28, 3: 31, 4: 30, 5: 31, 6: 30, 7: 31, 8: 31, 9: 30, 10: 31, 11: 30, 12: 31}
+def month_days(year, month):
+    leap = ((year % 4 == 0) & (year % 100 != 0)) | (year % 400 == 0)
+    return month.map(MONTH_DAYS).astype("Int64") + ((month == 2) & leap).astype("Int64")
+
+# 日付が元号の期間内にあるか（年月日を yyyymmdd の整数に変換して比較）
+def within_era(era, year, month, day):
+    ymd = year * 10000 + month * 100 + day
+    start = era.map(ERA_START).astype("Int64")
+    end = era.map(ERA_END).astype("Int64")
+    return (ymd >= start) & (ymd <= end)